@@ -0,0 +1,283 @@
+import contextlib
+import io
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+import types
+
+# ============================================================================
+# CURSED SWORD MOD - BENCHMARKS
+#
+#   python benchmark.py                  # run everything
+#   python benchmark.py import           # mod.py import time (-X importtime)
+#   python benchmark.py lookups          # per-call import vs bound reference
+#   python benchmark.py sim              # on_update ticks/sec, parry latency, messages
+#   python benchmark.py stress           # concurrent hits/network vs parries/expiries
+#   python benchmark.py patch            # regulation patch+verify time/memory vs file size
+#   python benchmark.py import --budget-ms 10
+#   python benchmark.py sim --players 1 100 --seconds 30
+# ============================================================================
+
+MOD_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+SIM_PLAYER_COUNTS = (1, 10, 100, 1000)
+
+PATCH_FILE_SIZES_MB = (8, 32, 128)
+
+
+def measure_import(runs=5):
+    """
+    Import mod.py in fresh interpreters with -X importtime
+    
+    Returns (best_cumulative_us, best_self_us, heaviest_dependencies) where
+    heaviest_dependencies is a list of (cumulative_us, name) for the
+    top-level modules mod.py pulled in on the fastest run.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = MOD_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    
+    best = None
+    
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import mod"],
+            cwd=MOD_DIR,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+        
+        if result.returncode != 0:
+            raise RuntimeError(f"import mod failed:\n{result.stderr}")
+        
+        entries = []
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                entries.append((int(self_us), int(cumulative_us), len(indent), name))
+        
+        mod_entries = [entry for entry in entries if entry[3] == "mod"]
+        if not mod_entries:
+            raise RuntimeError("mod not found in -X importtime output")
+        
+        mod_self_us, mod_cumulative_us, mod_indent, _ = mod_entries[-1]
+        
+        # Direct children of mod are listed just before it, one level deeper
+        dependencies = [
+            (cumulative_us, name)
+            for _, cumulative_us, indent, name in entries
+            if indent == mod_indent + 2
+        ]
+        
+        if best is None or mod_cumulative_us < best[0]:
+            best = (mod_cumulative_us, mod_self_us, sorted(dependencies, reverse=True))
+    
+    return best
+
+
+def measure_lookups(iterations=200000):
+    """
+    Compare a per-call `from x import Y` against a bound module reference
+    
+    Returns (per_call_import_ns, bound_reference_ns) per lookup.
+    """
+    fake_module = types.ModuleType("input_manager")
+    fake_module.InputManager = object()
+    previous = sys.modules.get("input_manager")
+    sys.modules["input_manager"] = fake_module
+    
+    namespace = {"InputManager": fake_module.InputManager}
+    
+    try:
+        per_call = timeit.timeit(
+            "from input_manager import InputManager",
+            number=iterations
+        )
+        bound = timeit.timeit(
+            "InputManager",
+            globals=namespace,
+            number=iterations
+        )
+    finally:
+        if previous is None:
+            del sys.modules["input_manager"]
+        else:
+            sys.modules["input_manager"] = previous
+    
+    return per_call / iterations * 1e9, bound / iterations * 1e9
+
+
+def run_import_benchmark(budget_ms=None):
+    cumulative_us, self_us, dependencies = measure_import()
+    
+    print(f"[Benchmark] import mod: {cumulative_us / 1000:.2f} ms cumulative, "
+          f"{self_us / 1000:.2f} ms self (best of 5)")
+    for dependency_us, name in dependencies[:5]:
+        print(f"  {name:<24} {dependency_us / 1000:.2f} ms")
+    
+    if budget_ms is not None and cumulative_us / 1000 > budget_ms:
+        print(f"[Benchmark] ✗ Import time over budget ({budget_ms} ms)")
+        return False
+    return True
+
+
+def run_lookup_benchmark():
+    per_call_ns, bound_ns = measure_lookups()
+    
+    print(f"[Benchmark] per-call 'from input_manager import InputManager': {per_call_ns:.0f} ns")
+    print(f"[Benchmark] bound module reference: {bound_ns:.0f} ns")
+    return True
+
+
+def run_simulation_benchmark(player_counts=SIM_PLAYER_COUNTS, seconds=10.0):
+    """Simulated session per player count (each with as many remote peers)"""
+    from simulation import run_scenario
+    
+    print(f"[Benchmark] simulation: {seconds:g}s at 60 ticks/s, one parry per player per second")
+    print(f"  {'players':>7} {'ticks/s':>9} {'parries':>8} {'hit->parry p99':>15} "
+          f"{'parry cost':>11} {'sent':>6} {'bytes':>7} {'syncs':>6} {'recv':>6}")
+    
+    for players in player_counts:
+        results = run_scenario(players, remote_players=players, seconds=seconds)
+        print(f"  {players:>7} {results['ticks_per_sec']:>9.0f} "
+              f"{results['parries_succeeded']:>8} "
+              f"{results['hit_to_parry_p99_ms']:>12.1f} ms "
+              f"{results['parry_cost_mean_us']:>8.1f} us "
+              f"{results['messages_sent']:>6} {results['bytes_sent']:>7} "
+              f"{results['sync_messages']:>6} {results['messages_received']:>6}")
+    
+    return True
+
+
+def run_stress_benchmark():
+    """Concurrent hit callbacks and network batches against parries and expiries"""
+    from simulation import run_stress
+    
+    results, problems = run_stress()
+    
+    print(f"[Benchmark] stress: {results['posted_async']} async posts, "
+          f"{results['commands_executed']} commands run, "
+          f"{results['parries_succeeded']} parries, {results['ticks_per_sec']:.0f} ticks/s")
+    
+    if problems:
+        print(f"[Benchmark] ✗ {len(problems)} lost or stale updates:")
+        for problem in problems[:10]:
+            print(f"  {problem}")
+        return False
+    
+    print("[Benchmark] ✓ No lost updates")
+    return True
+
+
+def measure_patch(path, use_mmap, index_cache_path, patch=True):
+    """
+    Patch + verify one regulation file (verify only when patch is False)
+    
+    Returns (seconds, peak_python_bytes, verified).
+    """
+    from regulation_patcher import RegulationPatcher
+    
+    patcher = RegulationPatcher(path, use_mmap=use_mmap, index_cache_path=index_cache_path)
+    
+    tracemalloc.start()
+    started = timeit.default_timer()
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        if patch:
+            patcher.patch_regulation()
+        verified = patcher.verify_patch()
+    
+    elapsed = timeit.default_timer() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return elapsed, peak, verified
+
+
+def run_patch_benchmark(sizes_mb=PATCH_FILE_SIZES_MB):
+    """mmap vs whole-file patching on synthetic regulation files"""
+    workdir = tempfile.mkdtemp(prefix="cursed_sword_patch_")
+    index_cache_path = os.path.join(workdir, "param_index.marshal")
+    ok = True
+    
+    print("[Benchmark] regulation patch + verify (backup already present)")
+    print("  cold:   first run on the file (hashes it, scans PARAM headers, writes)")
+    print("  verify: verify_patch alone on the patched file (reads every patched range)")
+    print("  warm:   cold run repeated (manifest fast path skips patching; verify still reads)")
+    print(f"  {'size':>7} {'mode':>6} {'cold':>10} {'peak':>9} {'verify':>10} {'peak':>9} {'warm':>10}")
+    
+    try:
+        for size_mb in sizes_mb:
+            for use_mmap in (True, False):
+                path = os.path.join(workdir, f"regulation_{size_mb}.bin")
+                for file_path in (path, path + ".backup"):
+                    with open(file_path, "wb") as f:
+                        f.truncate(size_mb << 20)
+                
+                cold, cold_peak, cold_verified = measure_patch(path, use_mmap, index_cache_path)
+                verify, verify_peak, verified = measure_patch(path, use_mmap, index_cache_path, patch=False)
+                warm, _, warm_verified = measure_patch(path, use_mmap, index_cache_path)
+                ok = ok and cold_verified and verified and warm_verified
+                
+                mode = "mmap" if use_mmap else "read"
+                print(f"  {size_mb:>5}MB {mode:>6} {cold * 1000:>7.1f} ms {cold_peak / 1024:>6.0f} KB "
+                      f"{verify * 1000:>7.1f} ms {verify_peak / 1024:>6.0f} KB {warm * 1000:>7.1f} ms")
+                
+                os.remove(path)
+                os.remove(path + ".backup")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    if not ok:
+        print("[Benchmark] ✗ Patch verification failed")
+    return ok
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Cursed Sword Mod benchmarks")
+    parser.add_argument("suite", nargs="?", default="all",
+                        choices=["all", "import", "lookups", "sim", "stress", "patch"])
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if importing mod.py takes longer than this")
+    parser.add_argument("--players", type=int, nargs="+", default=list(SIM_PLAYER_COUNTS),
+                        help="player counts for the sim suite")
+    parser.add_argument("--seconds", type=float, default=10.0,
+                        help="simulated seconds per sim run")
+    options = parser.parse_args()
+    
+    # The simulation reads config.json / keybind_config.json like the game does
+    os.chdir(MOD_DIR)
+    
+    print("=" * 70)
+    print("Cursed Sword Mod - Benchmarks")
+    print("=" * 70)
+    
+    ok = True
+    
+    if options.suite in ("all", "import"):
+        ok = run_import_benchmark(options.budget_ms) and ok
+    
+    if options.suite in ("all", "lookups"):
+        ok = run_lookup_benchmark() and ok
+    
+    if options.suite in ("all", "sim"):
+        ok = run_simulation_benchmark(options.players, options.seconds) and ok
+    
+    if options.suite in ("all", "stress"):
+        ok = run_stress_benchmark() and ok
+    
+    if options.suite in ("all", "patch"):
+        ok = run_patch_benchmark() and ok
+    
+    print("=" * 70)
+    sys.exit(0 if ok else 1)
@@ -1,46 +1,1626 @@
+import heapq
+import os
 import struct
-import time
 import threading
-from seamless_coop_integration import seamless_hook
+import time
+import weakref
+from collections import OrderedDict, deque
+
+# ============================================================================
+# CURSED SWORD MOD v2.2 - Auto-Parry Swap with Stacking Buffs & UI Counter
+# Compatible with Seamless Co-op (Latest Version)
+# ============================================================================
+
+MOD_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ============================================================================
+# LOGGING (leveled, buffered, rate-limited)
+# ============================================================================
+
+LOG_DEBUG = 10
+LOG_INFO = 20
+LOG_WARNING = 30
+LOG_ERROR = 40
+
+LOG_LEVEL_NAMES = {
+    LOG_DEBUG: "DEBUG",
+    LOG_INFO: "INFO",
+    LOG_WARNING: "WARNING",
+    LOG_ERROR: "ERROR",
+}
+
+class ModLogger:
+    """
+    Mod logger that keeps console I/O off the frame thread
+    
+    - Messages below `level` return before any formatting work
+    - Records are stored unformatted (%-style message + args) in a ring
+      buffer; formatting happens only when printed or dumped
+    - Console output is queued and printed by a background flusher thread
+    - Messages logged with a `key` are rate-limited per key
+    """
+    
+    def __init__(self, prefix="[CursedSword]", level=LOG_INFO, capacity=256,
+                 flush_interval=0.25, rate_limit=1.0):
+        self.prefix = prefix
+        self.level = level
+        self.console_level = LOG_INFO
+        self.flush_interval = flush_interval
+        self.rate_limit = rate_limit  # default seconds between messages per key
+        self.recent = deque(maxlen=capacity)
+        self.suppressed = 0
+        self._pending = deque(maxlen=capacity * 4)
+        self._last_emit = {}
+        self._wakeup = threading.Event()
+        self._flusher = None
+    
+    def is_enabled_for(self, level):
+        return level >= self.level
+    
+    def log(self, level, message, *args, key=None, interval=None):
+        """Record a message (formatted lazily with `message % args`)"""
+        if level < self.level:
+            return
+        
+        now = time.time()
+        
+        if key is not None:
+            last = self._last_emit.get(key)
+            limit = self.rate_limit if interval is None else interval
+            
+            if last is not None and now - last < limit:
+                self.suppressed += 1
+                return
+            
+            self._last_emit[key] = now
+        
+        record = (now, level, message, args)
+        self.recent.append(record)
+        
+        if level >= self.console_level:
+            self._pending.append(record)
+    
+    def debug(self, message, *args, **kwargs):
+        self.log(LOG_DEBUG, message, *args, **kwargs)
+    
+    def info(self, message, *args, **kwargs):
+        self.log(LOG_INFO, message, *args, **kwargs)
+    
+    def warning(self, message, *args, **kwargs):
+        self.log(LOG_WARNING, message, *args, **kwargs)
+    
+    def error(self, message, *args, **kwargs):
+        self.log(LOG_ERROR, message, *args, **kwargs)
+    
+    def format_record(self, record):
+        """Format a stored record into a console line"""
+        timestamp, level, message, args = record
+        
+        try:
+            text = message % args if args else message
+        except (TypeError, ValueError):
+            text = f"{message} {args}"
+        
+        if level >= LOG_WARNING:
+            return f"{self.prefix} {LOG_LEVEL_NAMES[level]}: {text}"
+        return f"{self.prefix} {text}"
+    
+    def flush(self):
+        """Print all queued console records"""
+        pending = self._pending
+        
+        while pending:
+            try:
+                record = pending.popleft()
+            except IndexError:
+                break
+            print(self.format_record(record))
+    
+    def dump(self, count=20):
+        """Return the most recent records as formatted lines"""
+        records = list(self.recent)[-count:] if count else list(self.recent)
+        lines = []
+        
+        for record in records:
+            clock = time.strftime("%H:%M:%S", time.localtime(record[0]))
+            lines.append(f"{clock} {self.format_record(record)}")
+        
+        return lines
+    
+    def start(self):
+        """Start the background flusher thread"""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        
+        self._wakeup.clear()
+        self._flusher = threading.Thread(
+            target=self._flush_loop,
+            name="CursedSwordLogFlusher",
+            daemon=True
+        )
+        self._flusher.start()
+    
+    def stop(self):
+        """Stop the flusher thread and print anything still queued"""
+        self._wakeup.set()
+        
+        if self._flusher is not None:
+            self._flusher.join(timeout=1.0)
+            self._flusher = None
+        
+        self.flush()
+    
+    def _flush_loop(self):
+        while not self._wakeup.wait(self.flush_interval):
+            self.flush()
+
+
+log = ModLogger()
+
+# Parry state machine phases (advanced once per on_update tick)
+PARRY_IDLE = "idle"
+PARRY_SWAPPING = "swapping"
+PARRY_WINDOW_OPEN = "window_open"
+PARRY_RESOLVED = "resolved"
+
+# Expiry scheduler key of the periodic idle-player sweep (player ids are ints)
+PLAYER_SWEEP_KEY = "player_sweep"
+
+# ============================================================================
+# EXPIRY SCHEDULER (single min-heap, run from on_update)
+# ============================================================================
+
+class ExpiryScheduler:
+    """
+    Min-heap of expiry callbacks keyed by player id
+    
+    Scheduling a key that already has a pending entry replaces it, so each
+    player has at most one live expiry. Cancelled entries are dropped lazily
+    when they reach the top of the heap (or on compaction).
+    """
+    
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = 0
+        self._cancelled = 0
+    
+    def schedule(self, key, when, callback):
+        """Schedule (or reschedule) callback for key at time `when`"""
+        self.cancel(key)
+        
+        self._counter += 1
+        entry = [when, self._counter, key, callback]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+    
+    def cancel(self, key):
+        """Cancel the pending expiry for key, if any"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        
+        entry[3] = None
+        self._cancelled += 1
+        
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+            self._compact()
+        return True
+    
+    def next_expiry(self, key):
+        """Return the scheduled time for key, or None"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+    
+    def run_due(self, now):
+        """Run every callback due at or before `now`, returns count run"""
+        heap = self._heap
+        ran = 0
+        
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            callback = entry[3]
+            
+            if callback is None:
+                self._cancelled -= 1
+                continue
+            
+            del self._entries[entry[2]]
+            callback()
+            ran += 1
+        
+        return ran
+    
+    def _compact(self):
+        """Drop cancelled entries from the heap"""
+        self._heap = [entry for entry in self._heap if entry[3] is not None]
+        heapq.heapify(self._heap)
+        self._cancelled = 0
+    
+    def __len__(self):
+        return len(self._entries)
+
+
+# ============================================================================
+# COMMAND QUEUE (async sources -> on_update, single-threaded state)
+# ============================================================================
+
+class CommandQueue:
+    """
+    Hand-off from asynchronous callers to the update thread
+    
+    Network handlers, hit callbacks and console commands post() from
+    whatever thread they run on; on_update drains the queue once per tick,
+    so mod state is only ever mutated on the update thread. deque append
+    and popleft are atomic, so posting never takes a lock.
+    """
+    
+    def __init__(self):
+        self._commands = deque()
+        self.executed = 0
+        self.failed = 0
+    
+    def post(self, callback, *args):
+        """Queue callback(*args) for the next drain (any thread)"""
+        self._commands.append((callback, args))
+    
+    def drain(self):
+        """Run the commands queued so far, returns count run (update thread)"""
+        commands = self._commands
+        ran = 0
+        
+        # Commands posted while draining wait for the next tick
+        for _ in range(len(commands)):
+            callback, args = commands.popleft()
+            
+            try:
+                callback(*args)
+            except Exception as e:
+                self.failed += 1
+                name = getattr(callback, "__name__", "command")
+                log.error("Command %s failed: %s", name, e, key="command_failed")
+            ran += 1
+        
+        self.executed += ran
+        return ran
+    
+    def __len__(self):
+        return len(self._commands)
+
+
+# ============================================================================
+# PERF MONITOR (perf_counter_ns spans, fixed-bucket histograms per phase)
+# ============================================================================
+
+# Phase -> CursedSwordMod methods timed for it (spans are inclusive)
+PERF_PHASES = {
+    "frame": ("on_update",),
+    "input": ("process_local_input",),
+    "swap": ("swap_to_cursed_sword", "return_to_original_weapon"),
+    "parry_resolve": ("update_parries",),
+    "buffs": ("apply_stacking_buffs",),
+    "effects": ("apply_orange_glow_effect", "update_ui_counter", "play_queued_effects"),
+    "network": ("flush_outbox", "prepare_sync_snapshots", "handle_remote_parry"),
+}
+
+PERF_FRAME_BUDGET_NS = 16666667  # one frame at 60 FPS
+
+# Buckets: [0, 64ns), then 4 per power of two up to 2^28 ns (~268ms), then overflow
+PERF_MIN_BITS = 7
+PERF_SUB_BUCKETS = 4
+PERF_BUCKETS = 1 + PERF_SUB_BUCKETS * (28 - PERF_MIN_BITS + 1) + 1
+
+
+def perf_bucket_index(ns):
+    """Histogram bucket for a duration in nanoseconds"""
+    bits = ns.bit_length()
+    
+    if bits < PERF_MIN_BITS:
+        return 0
+    
+    sub = (ns >> (bits - 3)) & 3
+    return min(1 + (bits - PERF_MIN_BITS) * PERF_SUB_BUCKETS + sub, PERF_BUCKETS - 1)
+
+
+def perf_bucket_upper_ns(index):
+    """Exclusive upper bound of a bucket (None for the overflow bucket)"""
+    if index == 0:
+        return 1 << (PERF_MIN_BITS - 1)
+    if index == PERF_BUCKETS - 1:
+        return None
+    
+    bits, sub = divmod(index - 1, PERF_SUB_BUCKETS)
+    bits += PERF_MIN_BITS
+    return (5 + sub) << (bits - 3)
+
+
+class PerfHistogram:
+    """Fixed-size duration histogram (4 buckets per power of two)"""
+    
+    __slots__ = ("counts", "count", "total_ns", "max_ns")
+    
+    def __init__(self):
+        self.counts = [0] * PERF_BUCKETS
+        self.clear()
+    
+    def clear(self):
+        counts = self.counts
+        for index in range(PERF_BUCKETS):
+            counts[index] = 0
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+    
+    def add(self, ns):
+        self.counts[perf_bucket_index(ns)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+    
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction (ns, capped at max)"""
+        if not self.count:
+            return 0
+        
+        target = max(1, int(self.count * fraction + 0.5))
+        seen = 0
+        
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                upper = perf_bucket_upper_ns(index)
+                return self.max_ns if upper is None else min(upper, self.max_ns)
+        
+        return self.max_ns
+    
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ns": self.total_ns // self.count if self.count else 0,
+            "p50_ns": self.percentile(0.50),
+            "p99_ns": self.percentile(0.99),
+            "max_ns": self.max_ns,
+        }
+
+
+class PerfMonitor:
+    """
+    Per-phase timing of CursedSwordMod hot paths
+    
+    Disabled, it costs nothing: enable() shadows the PERF_PHASES methods on
+    the instance with timing wrappers, disable() removes them again.
+    Histograms survive on/off and are only cleared by reset().
+    """
+    
+    def __init__(self, phases=PERF_PHASES):
+        self.phases = phases
+        self.histograms = {phase: PerfHistogram() for phase in phases}
+        self.enabled = False
+        self._target = None
+    
+    def enable(self, target):
+        if self.enabled:
+            return
+        
+        for phase, method_names in self.phases.items():
+            histogram = self.histograms[phase]
+            for name in method_names:
+                setattr(target, name, self._timed(getattr(target, name), histogram))
+        
+        self._target = target
+        self.enabled = True
+    
+    def disable(self):
+        if not self.enabled:
+            return
+        
+        for method_names in self.phases.values():
+            for name in method_names:
+                self._target.__dict__.pop(name, None)
+        
+        self._target = None
+        self.enabled = False
+    
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.clear()
+    
+    @staticmethod
+    def _timed(method, histogram):
+        perf_counter_ns = time.perf_counter_ns
+        add = histogram.add
+        
+        def timed(*args, **kwargs):
+            started = perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                add(perf_counter_ns() - started)
+        
+        timed.__name__ = method.__name__
+        return timed
+    
+    def summary(self):
+        return {phase: histogram.summary() for phase, histogram in self.histograms.items()}
+    
+    def report(self):
+        """Console lines: p50/p99/max per phase in microseconds"""
+        lines = [f"  {'phase':<14} {'count':>8} {'p50':>9} {'p99':>9} {'max':>9}  (us)"]
+        
+        for phase, stats in self.summary().items():
+            lines.append(
+                f"  {phase:<14} {stats['count']:>8} {stats['p50_ns'] / 1000:>9.1f} "
+                f"{stats['p99_ns'] / 1000:>9.1f} {stats['max_ns'] / 1000:>9.1f}"
+            )
+        
+        frame = self.histograms.get("frame")
+        if frame is not None and frame.count:
+            lines.append(
+                f"  frame p99 = {frame.percentile(0.99) / PERF_FRAME_BUDGET_NS:.2%} of a 60 FPS frame"
+            )
+        
+        return lines
+    
+    def dump(self, path):
+        """Write summaries and raw bucket counts as JSON"""
+        import json
+        
+        data = {
+            "enabled": self.enabled,
+            "frame_budget_ns": PERF_FRAME_BUDGET_NS,
+            "phases": {},
+        }
+        
+        for phase, histogram in self.histograms.items():
+            stats = histogram.summary()
+            stats["buckets"] = [
+                [perf_bucket_upper_ns(index), bucket_count]
+                for index, bucket_count in enumerate(histogram.counts)
+                if bucket_count
+            ]
+            data["phases"][phase] = stats
+        
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+
+# ============================================================================
+# WIRE FORMAT (compact binary CursedSword sync messages)
+# ============================================================================
+#
+# Batch:   u8 version | u8 channel | u16 epoch | u16 sequence
+#          | u32 base time (ms, wrapping) | varint sender_id | varint count | messages
+# Message: u8 action | varint player_id | u8 value | u16 ms delta from base
+#          [| varint weapon_id]  (weapon_swap only)
+#
+# `value` is the stack count for parry actions and 0/1 for mod_toggle.
+# `sequence` increments per batch per sender (wrapping) so receivers can
+# drop stale and duplicate batches. `epoch` is picked at random when the
+# sender's mod starts; a new epoch means the sender restarted and its
+# sequence starts over. Per-tick batches and sync snapshots travel over
+# different Seamless paths, so each `channel` has its own sequence.
+
+WIRE_VERSION = 4
+
+CHANNEL_BATCH = 0   # SessionOutbox per-tick batches (broadcast_to_session)
+CHANNEL_SYNC = 1    # sync_parry_state snapshots (Seamless sync cycle)
+
+ACTION_WEAPON_SWAP = 1
+ACTION_PARRY_SUCCESS = 2
+ACTION_MOD_TOGGLE = 3
+ACTION_PARRY_EXECUTED = 4
+
+ACTION_NAMES = {
+    ACTION_WEAPON_SWAP: "weapon_swap",
+    ACTION_PARRY_SUCCESS: "parry_success",
+    ACTION_MOD_TOGGLE: "mod_toggle",
+    ACTION_PARRY_EXECUTED: "parry_executed",
+}
+ACTION_CODES = {name: code for code, name in ACTION_NAMES.items()}
+
+_BATCH_HEADER = struct.Struct("<BBHHI")
+_MESSAGE_TAIL = struct.Struct("<BH")
+
+def encode_varint(value, out):
+    """Append an unsigned LEB128 varint to bytearray `out`"""
+    if value < 0:
+        raise ValueError(f"varint must be non-negative: {value}")
+    
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(data, offset):
+    """Read an unsigned LEB128 varint, returns (value, new_offset)"""
+    value = 0
+    shift = 0
+    
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def sequence_is_newer(sequence, last_sequence):
+    """Wrapping u16 comparison: True if sequence comes after last_sequence"""
+    return 0 < ((sequence - last_sequence) & 0xFFFF) < 0x8000
+
+def timestamp_is_older(timestamp_ms, last_ms):
+    """Wrapping u32 comparison: True if timestamp_ms comes before last_ms"""
+    return 0 < ((last_ms - timestamp_ms) & 0xFFFFFFFF) < 0x80000000
+
+def encode_messages(messages, sender_id=0, sequence=0, epoch=0, channel=CHANNEL_BATCH):
+    """
+    Encode a batch of messages
+    
+    Args:
+        messages: iterable of (action_code, player_id, value, timestamp, weapon_id)
+                  tuples; timestamp is time.time() seconds, weapon_id is only
+                  written for ACTION_WEAPON_SWAP
+        sender_id: id of the sending player
+        sequence: per-sender, per-channel sequence number (wraps at 16 bits)
+        epoch: sender session id (16 bits), changes when the sender restarts
+        channel: CHANNEL_BATCH or CHANNEL_SYNC
+    """
+    messages = list(messages)
+    base_time = min(message[3] for message in messages) if messages else time.time()
+    base_ms = int(base_time * 1000)
+    
+    out = bytearray(_BATCH_HEADER.pack(
+        WIRE_VERSION,
+        channel,
+        epoch & 0xFFFF,
+        sequence & 0xFFFF,
+        base_ms & 0xFFFFFFFF
+    ))
+    encode_varint(sender_id, out)
+    encode_varint(len(messages), out)
+    
+    for action, player_id, value, timestamp, weapon_id in messages:
+        out.append(action)
+        encode_varint(player_id, out)
+        delta_ms = min(int(timestamp * 1000) - base_ms, 0xFFFF)
+        out += _MESSAGE_TAIL.pack(min(int(value), 0xFF), delta_ms)
+        
+        if action == ACTION_WEAPON_SWAP:
+            encode_varint(weapon_id, out)
+    
+    return bytes(out)
+
+def decode_batch(data):
+    """
+    Decode a batch produced by encode_messages
+    
+    Returns (sender_id, channel, epoch, sequence, messages) where messages is a list of dicts
+    (action, player_id, timestamp_ms and the action's fields). Raises
+    ValueError on unknown versions or bad data.
+    """
+    if len(data) < 1:
+        raise ValueError("CursedSword payload too short")
+    
+    if data[0] != WIRE_VERSION:
+        raise ValueError(f"Unsupported CursedSword wire version {data[0]}")
+    
+    if len(data) < _BATCH_HEADER.size:
+        raise ValueError("CursedSword payload too short")
+    
+    _, channel, epoch, sequence, base_ms = _BATCH_HEADER.unpack_from(data, 0)
+    
+    try:
+        sender_id, offset = decode_varint(data, _BATCH_HEADER.size)
+        count, offset = decode_varint(data, offset)
+        messages = []
+        
+        for _ in range(count):
+            action = data[offset]
+            player_id, offset = decode_varint(data, offset + 1)
+            value, delta_ms = _MESSAGE_TAIL.unpack_from(data, offset)
+            offset += _MESSAGE_TAIL.size
+            
+            message = {
+                "action": ACTION_NAMES.get(action, action),
+                "player_id": player_id,
+                "timestamp_ms": (base_ms + delta_ms) & 0xFFFFFFFF,
+            }
+            
+            if action == ACTION_WEAPON_SWAP:
+                message["weapon_id"], offset = decode_varint(data, offset)
+            elif action == ACTION_MOD_TOGGLE:
+                message["enabled"] = bool(value)
+            else:
+                message["stack_count"] = value
+            
+            messages.append(message)
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"Truncated CursedSword payload: {e}")
+    
+    return sender_id, channel, epoch, sequence, messages
+
+
+def decode_messages(data):
+    """Decode a batch and return only its messages"""
+    return decode_batch(data)[4]
+
+
+# ============================================================================
+# PER-STACK EFFECT TABLE (built once from config.json)
+# ============================================================================
+
+def parse_percent(value, default):
+    """Parse a config percentage ("0.3%" or 0.3) into a fraction (0.003)"""
+    try:
+        if isinstance(value, str):
+            value = value.strip().rstrip("%")
+        return float(value) / 100.0
+    except (TypeError, ValueError):
+        return default
+
+
+# Engine buff names, in StackEffects multiplier order
+BUFF_NAMES = ("physical_damage", "stamina_regen", "poise_damage")
+
+HUD_COUNTER_ELEMENT_ID = "cursed_sword_stack_counter"
+
+
+class StackEffects:
+    """Precomputed buff, glow, HUD and particle values for one stack count"""
+    
+    __slots__ = (
+        "stack_count",
+        "damage_multiplier",
+        "stamina_multiplier",
+        "stance_break_multiplier",
+        "damage_percent",
+        "stamina_percent",
+        "stance_break_percent",
+        "glow_intensity",
+        "glow_color",
+        "hud_text",
+        "particle_scale",
+        "particle_color",
+        "sound_milestone",
+        "particle_milestone",
+    )
+
+
+def resolve_milestones(milestone_config, default_keys):
+    """
+    {stack_count: "stack_N"} from a config "stack_milestones" section
+    
+    The section's stack_N entries replace default_keys when it has any;
+    the section's and each entry's "enabled" flags are honoured.
+    """
+    if not isinstance(milestone_config, dict):
+        milestone_config = {}
+    
+    if not milestone_config.get("enabled", True):
+        return {}
+    
+    keys = [key for key in milestone_config if key.startswith("stack_") and key[6:].isdigit()]
+    milestones = {}
+    
+    for key in keys or default_keys:
+        if not key.startswith("stack_") or not key[6:].isdigit():
+            continue
+        
+        entry = milestone_config.get(key)
+        if isinstance(entry, dict) and not entry.get("enabled", True):
+            continue
+        
+        milestones[int(key[6:])] = key
+    
+    return milestones
+
+
+def build_stack_table(max_stacks, buff_config, visual_config, sound_milestones, particle_milestones):
+    """
+    Build StackEffects for stacks 0..max_stacks
+    
+    Args:
+        max_stacks: Highest stack count
+        buff_config: config.json "buff_config" section
+        visual_config: config.json "visual_effects" section
+        sound_milestones: {stack_count: sound key} for milestone sounds
+        particle_milestones: {stack_count: particle key} for milestone particles
+    """
+    per_stack = buff_config.get("stacking_system", {}).get("per_stack_buffs", {})
+    damage_per_stack = parse_percent(per_stack.get("physical_damage"), 0.003)
+    stamina_per_stack = parse_percent(per_stack.get("stamina_regen"), 0.005)
+    stance_per_stack = parse_percent(per_stack.get("stance_break_damage"), 0.002)
+    
+    glow_config = visual_config.get("orange_glow", {})
+    base_intensity = glow_config.get("base_intensity", 0.3)
+    max_intensity = glow_config.get("max_intensity", 1.0)
+    color = glow_config.get("color", {})
+    r = color.get("r", 1.0)
+    g = color.get("g", 0.55)
+    b = color.get("b", 0.0)
+    
+    table = []
+    
+    for stack_count in range(max_stacks + 1):
+        ratio = stack_count / max_stacks if max_stacks else 0.0
+        effects = StackEffects()
+        
+        effects.stack_count = stack_count
+        effects.damage_multiplier = 1.0 + stack_count * damage_per_stack
+        effects.stamina_multiplier = 1.0 + stack_count * stamina_per_stack
+        effects.stance_break_multiplier = 1.0 + stack_count * stance_per_stack
+        effects.damage_percent = stack_count * damage_per_stack * 100
+        effects.stamina_percent = stack_count * stamina_per_stack * 100
+        effects.stance_break_percent = stack_count * stance_per_stack * 100
+        
+        effects.glow_intensity = base_intensity + ratio * (max_intensity - base_intensity)
+        effects.glow_color = {"r": r, "g": g, "b": b, "intensity": effects.glow_intensity}
+        
+        effects.hud_text = f"CURSE: [{stack_count:2d}/{max_stacks}]"
+        
+        effects.particle_scale = 0.5 + ratio * 1.0
+        effects.particle_color = {"r": r, "g": g, "b": b, "intensity": effects.particle_scale}
+        
+        effects.sound_milestone = sound_milestones.get(stack_count)
+        effects.particle_milestone = particle_milestones.get(stack_count)
+        table.append(effects)
+    
+    return table
+
+
+# ============================================================================
+# EFFECT QUEUE (pooled, per-frame budgeted sounds and particles)
+# ============================================================================
+
+EFFECT_SOUND = 0
+EFFECT_PARTICLE = 1           # spawn_particle_effect_at_location
+EFFECT_ATTACHED_PARTICLE = 2  # spawn_particle_effect on the player
+
+EFFECT_PRIORITY_BASE = 0
+EFFECT_PRIORITY_MILESTONE = 1
+
+# Estimated on-screen lifetime per effect kind (seconds), used for caps
+EFFECT_LIFETIMES = {
+    EFFECT_SOUND: 1.0,
+    EFFECT_PARTICLE: 1.5,
+    EFFECT_ATTACHED_PARTICLE: 1.5,
+}
+
+# A milestone parry queues 5 effects: attached burst, base + milestone
+# sound, base + milestone particle
+EFFECTS_PER_PARRY = 5
+
+
+class EffectRequest:
+    """Reusable effect request (pooled by EffectQueue)"""
+    
+    __slots__ = ("kind", "player", "player_id", "effect_key", "stack_count", "priority")
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        self.kind = None
+        self.player = None
+        self.player_id = None
+        self.effect_key = None
+        self.stack_count = 0
+        self.priority = EFFECT_PRIORITY_BASE
+
+
+class EffectQueue:
+    """
+    Per-frame queue of sound and particle requests
+    
+    - Identical requests (kind, player, effect) within a frame are deduped
+    - Live effects are capped globally, and per player once more than one
+      player has effects live or queued (a solo player is never throttled
+      below the global cap); requests are played in priority order so
+      milestone effects win the budget
+    - Request objects come from a preallocated pool
+    """
+    
+    def __init__(self, max_live_per_player=2 * EFFECTS_PER_PARRY, max_live_total=24, pool_size=64):
+        self.max_live_per_player = max_live_per_player
+        self.max_live_total = max_live_total
+        self._pool = [EffectRequest() for _ in range(pool_size)]
+        self._pending = []
+        self._pending_keys = set()
+        self._live = []            # heap of (end_time, player_id)
+        self._live_per_player = {}
+        self.deduped = 0
+        self.dropped = 0
+        self.played = 0
+    
+    def __len__(self):
+        return len(self._pending)
+    
+    def push(self, kind, player, player_id, effect_key, stack_count=0,
+             priority=EFFECT_PRIORITY_BASE):
+        """Queue an effect for this frame, returns False if deduped"""
+        key = (kind, player_id, effect_key)
+        
+        if key in self._pending_keys:
+            self.deduped += 1
+            return False
+        self._pending_keys.add(key)
+        
+        request = self._pool.pop() if self._pool else EffectRequest()
+        request.kind = kind
+        request.player = player
+        request.player_id = player_id
+        request.effect_key = effect_key
+        request.stack_count = stack_count
+        request.priority = priority
+        self._pending.append(request)
+        return True
+    
+    def live_count(self, player_id):
+        """Number of effects still playing for a player"""
+        return self._live_per_player.get(player_id, 0)
+    
+    def drain(self, play, now):
+        """Play queued effects within budget through play(request)"""
+        self._expire(now)
+        
+        pending = self._pending
+        if not pending:
+            return 0
+        
+        if len(pending) > 1:
+            pending.sort(key=lambda request: request.priority, reverse=True)
+        
+        live_per_player = self._live_per_player
+        played = 0
+        
+        # The per-player cap only shares the budget between players
+        player_ids = set(live_per_player)
+        player_ids.update(request.player_id for request in pending)
+        player_cap = self.max_live_per_player if len(player_ids) > 1 else self.max_live_total
+        
+        for request in pending:
+            player_live = live_per_player.get(request.player_id, 0)
+            
+            if len(self._live) >= self.max_live_total or player_live >= player_cap:
+                self.dropped += 1
+            else:
+                play(request)
+                live_per_player[request.player_id] = player_live + 1
+                heapq.heappush(self._live, (now + EFFECT_LIFETIMES[request.kind], request.player_id))
+                played += 1
+            
+            request.clear()
+            self._pool.append(request)
+        
+        pending.clear()
+        self._pending_keys.clear()
+        self.played += played
+        return played
+    
+    def _expire(self, now):
+        live = self._live
+        live_per_player = self._live_per_player
+        
+        while live and live[0][0] <= now:
+            _, player_id = heapq.heappop(live)
+            remaining = live_per_player[player_id] - 1
+            
+            if remaining:
+                live_per_player[player_id] = remaining
+            else:
+                del live_per_player[player_id]
+
+
+# ============================================================================
+# SOUND BANK (preloaded handles, bounded LRU)
+# ============================================================================
+
+class SoundHandle:
+    """Resolved sound with precomputed volume and pitch"""
+    
+    __slots__ = ("sound_type", "file", "volume", "pitch", "engine_handle")
+    
+    def __init__(self, sound_type, file, volume, pitch, engine_handle):
+        self.sound_type = sound_type
+        self.file = file
+        self.volume = volume
+        self.pitch = pitch
+        self.engine_handle = engine_handle
+
+
+def resolve_sound_entries(sound_effects, sound_config):
+    """
+    Resolve {sound_type: (file, volume, pitch)} from config.json "sound_effects"
+    
+    Per-sound volume/pitch are multiplied by the global values. Disabled
+    sounds (globally, per group or per entry) are left out. Milestones
+    come from the config's stack_milestones when it lists any (files
+    default to stack_milestone_N.wem).
+    """
+    if not sound_config.get("enabled", True):
+        return {}
+    
+    global_volume = sound_config.get("volume", 1.0)
+    global_pitch = sound_config.get("pitch", 1.0)
+    milestones = sound_config.get("stack_milestones", {})
+    
+    default_milestones = [key for key in sound_effects if key.startswith("stack_")]
+    sound_types = {key: file for key, file in sound_effects.items() if not key.startswith("stack_")}
+    
+    for key in resolve_milestones(milestones, default_milestones).values():
+        sound_types[key] = sound_effects.get(key, f"stack_milestone_{key[6:]}.wem")
+    
+    entries = {}
+    
+    for sound_type, default_file in sound_types.items():
+        if sound_type.startswith("stack_"):
+            entry = milestones.get(sound_type, {})
+        else:
+            entry = sound_config.get(sound_type, {})
+        
+        if not isinstance(entry, dict):
+            entry = {}
+        
+        if not entry.get("enabled", True):
+            continue
+        
+        entries[sound_type] = (
+            entry.get("file", default_file),
+            global_volume * entry.get("volume", 1.0),
+            global_pitch * entry.get("pitch", 1.0),
+        )
+    
+    return entries
+
+
+class SoundBank:
+    """
+    Bounded LRU cache of sound handles
+    
+    `loader(path, file)` turns a sound file into whatever the engine plays;
+    by default the file name itself, which is what play_sound_effect takes.
+    Missing files are reported once when loaded and never played. Files
+    are looked up in the mod's sounds/ folder, whatever the working directory.
+    """
+    
+    def __init__(self, entries, sound_dir=os.path.join(MOD_DIR, "sounds"), capacity=16, loader=None):
+        self.entries = entries
+        self.sound_dir = sound_dir
+        self.capacity = capacity
+        self.loader = loader
+        self.missing = set()
+        self.loads = 0
+        self._handles = OrderedDict()
+    
+    def preload(self):
+        """Load every configured sound (up to capacity), returns count loaded"""
+        for sound_type in list(self.entries)[:self.capacity]:
+            self.get(sound_type)
+        
+        if self.missing:
+            log.warning(
+                "Missing sound files in %s/: %s",
+                self.sound_dir, ", ".join(sorted(self.missing))
+            )
+        
+        return len(self._handles)
+    
+    def get(self, sound_type):
+        """Cached handle for sound_type, or None if unknown/missing"""
+        handles = self._handles
+        handle = handles.get(sound_type)
+        
+        if handle is not None:
+            handles.move_to_end(sound_type)
+            return handle
+        
+        entry = self.entries.get(sound_type)
+        if entry is None:
+            return None
+        
+        file, volume, pitch = entry
+        if file in self.missing:
+            return None
+        
+        handle = self._load(sound_type, file, volume, pitch)
+        if handle is None:
+            return None
+        
+        handles[sound_type] = handle
+        if len(handles) > self.capacity:
+            handles.popitem(last=False)
+        
+        return handle
+    
+    def _load(self, sound_type, file, volume, pitch):
+        path = os.path.join(self.sound_dir, file)
+        
+        if not os.path.exists(path):
+            self.missing.add(file)
+            return None
+        
+        engine_handle = self.loader(path, file) if self.loader is not None else file
+        self.loads += 1
+        return SoundHandle(sound_type, file, volume, pitch, engine_handle)
+
+
+# ============================================================================
+# SESSION OUTBOX (per-tick batching for Seamless Co-op messages)
+# ============================================================================
+
+# Returned by sync_parry_state when the player's state has not changed since
+# the last sync, so the Seamless sync cycle has nothing to send
+SYNC_UNCHANGED = None
+
+
+class SessionOutbox:
+    """
+    Collects outbound sync messages during a tick and coalesces them per player
+    
+    - weapon_swap: only the latest weapon is sent; dropped entirely if the
+      player ends the tick holding the weapon they started it with
+    - parry_success: the latest stack count wins
+    - mod_toggle: the latest state wins; dropped if toggled back
+    
+    flush() sends at most one encoded batch per delivery mode.
+    """
+    
+    def __init__(self):
+        self._swaps = {}    # player_id -> [weapon_before_tick, latest_weapon, timestamp]
+        self._parries = {}  # player_id -> (stack_count, timestamp)
+        self._toggles = {}  # player_id -> [enabled_before_tick, latest_enabled, timestamp]
+        self.batches_sent = 0
+        self.messages_sent = 0
+        self.messages_coalesced = 0
+        self.bytes_sent = 0
+        self.sender_id = 0
+        self.epoch = int.from_bytes(os.urandom(2), "little")
+        self.sequence = 0
+        self.sync_sequence = 0
+    
+    def __bool__(self):
+        return bool(self._swaps or self._parries or self._toggles)
+    
+    def queue_weapon_swap(self, player_id, weapon_id, previous_weapon_id=None):
+        entry = self._swaps.get(player_id)
+        
+        if entry is None:
+            self._swaps[player_id] = [previous_weapon_id, weapon_id, time.time()]
+        else:
+            entry[1] = weapon_id
+            entry[2] = time.time()
+            self.messages_coalesced += 1
+    
+    def queue_parry_success(self, player_id, stack_count):
+        if player_id in self._parries:
+            self.messages_coalesced += 1
+        self._parries[player_id] = (stack_count, time.time())
+    
+    def queue_mod_toggle(self, player_id, enabled):
+        entry = self._toggles.get(player_id)
+        
+        if entry is None:
+            self._toggles[player_id] = [not enabled, enabled, time.time()]
+        else:
+            entry[1] = enabled
+            entry[2] = time.time()
+            self.messages_coalesced += 1
+    
+    def flush(self, send):
+        """Send coalesced messages through send(payload, exclude_self)"""
+        messages = []
+        
+        for player_id, (previous_weapon_id, weapon_id, timestamp) in self._swaps.items():
+            if weapon_id == previous_weapon_id:
+                self.messages_coalesced += 2
+                continue
+            messages.append((ACTION_WEAPON_SWAP, player_id, 0, timestamp, weapon_id))
+        
+        for player_id, (stack_count, timestamp) in self._parries.items():
+            messages.append((ACTION_PARRY_SUCCESS, player_id, stack_count, timestamp, None))
+        
+        # Toggles are also delivered to the sender (exclude_self=False)
+        toggles = []
+        
+        for player_id, (previous_enabled, enabled, timestamp) in self._toggles.items():
+            if enabled == previous_enabled:
+                self.messages_coalesced += 2
+                continue
+            toggles.append((ACTION_MOD_TOGGLE, player_id, enabled, timestamp, None))
+        
+        self._swaps.clear()
+        self._parries.clear()
+        self._toggles.clear()
+        
+        if messages:
+            send(self._batch(messages), True)
+        if toggles:
+            send(self._batch(toggles), False)
+    
+    def next_sequence(self):
+        """Next per-sender batch sequence number"""
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        return self.sequence
+    
+    def snapshot(self, player_id, stack_count):
+        """Encode a sync snapshot (CHANNEL_SYNC, sequenced apart from batches)"""
+        self.sync_sequence = (self.sync_sequence + 1) & 0xFFFF
+        return encode_messages(
+            ((ACTION_PARRY_EXECUTED, player_id, stack_count, time.time(), None),),
+            self.sender_id,
+            self.sync_sequence,
+            self.epoch,
+            CHANNEL_SYNC
+        )
+    
+    def _batch(self, messages):
+        payload = encode_messages(messages, self.sender_id, self.next_sequence(), self.epoch)
+        
+        self.batches_sent += 1
+        self.messages_sent += len(messages)
+        self.bytes_sent += len(payload)
+        return payload
+
+
+# ============================================================================
+# PER-PLAYER STATE
+# ============================================================================
+
+# Replica field each remote action updates (ordered per field by timestamp)
+REMOTE_ACTION_FIELDS = {
+    "weapon_swap": "weapon_id",
+    "parry_success": "stack_count",
+    "parry_executed": "stack_count",
+    "mod_toggle": "enabled",
+}
+
+
+class RemotePlayerReplica:
+    """Last known state of a remote player, updated from sync messages"""
+    
+    __slots__ = ("stack_count", "weapon_id", "enabled", "last_update_ms", "last_seen",
+                 "sender_id", "field_ms")
+    
+    def __init__(self):
+        self.stack_count = 0
+        self.weapon_id = None
+        self.enabled = True
+        self.last_update_ms = None
+        self.last_seen = 0  # local time.time() of the last message
+        self.sender_id = None
+        self.field_ms = {}  # field -> timestamp_ms of the message that set it
+
+
+class PlayerState:
+    """Compact per-player record (one lookup per player per parry)"""
+    
+    __slots__ = (
+        "enabled",
+        "stack_count",
+        "buff_expiry_time",
+        "glow_active",
+        "ui_counter_visible",
+        # Parry state machine
+        "original_weapon_id",
+        "last_parry_time",
+        "is_parrying",
+        "parry_phase",
+        "parry_armed_at",
+        "parry_window_end",
+        "parry_hit_time",
+        "last_parry_result",
+        # Seamless sync change detection
+        "synced_stack_count",
+        "sync_dirty",
+        # Last values pushed to the engine (diff-based effect application)
+        "applied_buffs",
+        "applied_glow_intensity",
+        "applied_hud_text",
+    )
+    
+    def __init__(self, enabled=True, current_time=0):
+        self.enabled = enabled
+        self.stack_count = 0
+        self.buff_expiry_time = current_time
+        self.glow_active = False
+        self.ui_counter_visible = False
+        
+        self.original_weapon_id = None
+        self.last_parry_time = 0
+        self.is_parrying = False
+        self.parry_phase = PARRY_IDLE
+        self.parry_armed_at = 0
+        self.parry_window_end = 0
+        self.parry_hit_time = None
+        self.last_parry_result = None
+        
+        self.synced_stack_count = 0
+        self.sync_dirty = False
+        
+        self.applied_buffs = None
+        self.applied_glow_intensity = None
+        self.applied_hud_text = None
+
+
+class PlayerHandleCache:
+    """
+    Engine player handles keyed by player id, held by weak reference
+    
+    Handles are remembered as players pass through the update loop, so
+    despawned players are released with the engine's last reference. A
+    miss falls back to GameManager.get_player and caches the result.
+    """
+    
+    def __init__(self):
+        self._handles = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+    
+    def remember(self, player_id, player):
+        """Cache the handle for player_id (no-op if already cached)"""
+        handles = self._handles
+        
+        if handles.get(player_id) is player:
+            return
+        
+        try:
+            handles[player_id] = player
+        except TypeError:
+            pass  # handle type does not support weak references
+    
+    def get(self, player_id):
+        """Handle for player_id, or None if the engine has no such player"""
+        player = self._handles.get(player_id)
+        
+        if player is not None:
+            self.hits += 1
+            return player
+        
+        self.misses += 1
+        player = GameManager.get_instance().get_player(player_id)
+        
+        if player:
+            self.remember(player_id, player)
+        
+        return player
+    
+    def forget(self, player_id):
+        self._handles.pop(player_id, None)
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self._handles),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": f"{self.hits / lookups:.0%}" if lookups else "n/a",
+        }
+
+
+# ============================================================================
+# CONFIG (config.json + keybind_config.json: validated, cached, hot-reloaded)
+# ============================================================================
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_positive_number(value):
+    return _is_number(value) and value > 0
+
+def _is_non_negative_number(value):
+    return _is_number(value) and value >= 0
+
+def _is_positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+def _is_string(value):
+    return isinstance(value, str) and value != ""
+
+def _is_dict(value):
+    return isinstance(value, dict)
+
+def _is_button_list(value):
+    return isinstance(value, list) and len(value) > 0 and all(_is_string(v) for v in value)
+
+# (path, check) per file; invalid values are dropped so defaults apply
+CONFIG_SCHEMA = {
+    "config": (
+        (("parry_config", "parry_window_duration"), _is_positive_number),
+        (("parry_config", "cooldown"), _is_non_negative_number),
+        (("buff_config", "stacking_system", "max_stacks"), _is_positive_int),
+        (("buff_config", "stacking_system", "buff_duration"), _is_positive_number),
+        (("buff_config", "stacking_system", "per_stack_buffs"), _is_dict),
+        (("visual_effects", "orange_glow", "base_intensity"), _is_number),
+        (("visual_effects", "orange_glow", "max_intensity"), _is_number),
+        (("visual_effects", "orange_glow", "color"), _is_dict),
+        (("sound_effects", "volume"), _is_non_negative_number),
+        (("sound_effects", "pitch"), _is_positive_number),
+        (("sound_effects", "stack_milestones"), _is_dict),
+        (("visual_effects", "particle_effects"), _is_dict),
+        (("visual_effects", "particle_effects", "stack_milestones"), _is_dict),
+    ),
+    "keybinds": (
+        (("controller", "parry_input"), _is_button_list),
+        (("keyboard", "parry_input"), _is_string),
+        (("input_buffer_ms",), _is_non_negative_number),
+    ),
+}
+
+CONFIG_SNAPSHOT_VERSION = 2
+
+def validate_config(data, schema):
+    """Drop values that fail the schema, returns a list of error strings"""
+    errors = []
+    
+    for path, check in schema:
+        parent = data
+        
+        for depth, key in enumerate(path[:-1]):
+            child = parent.get(key)
+            
+            if child is None:
+                parent = None
+                break
+            
+            if not isinstance(child, dict):
+                errors.append(f"{'.'.join(path[:depth + 1])}: expected an object")
+                del parent[key]
+                parent = None
+                break
+            
+            parent = child
+        
+        if parent is None or path[-1] not in parent:
+            continue
+        
+        if not check(parent[path[-1]]):
+            errors.append(f"{'.'.join(path)}: invalid value {parent[path[-1]]!r}")
+            del parent[path[-1]]
+    
+    return errors
+
+
+class ModConfig:
+    """
+    Single loader for config.json and keybind_config.json
+    
+    - Both files are parsed once and validated against CONFIG_SCHEMA
+    - The validated result is cached as a marshal snapshot keyed by the
+      files' SHA-256, so unchanged files skip JSON parsing and validation
+    - check_for_changes() polls file mtimes at most every reload_interval
+      seconds and reloads when either file changed
+    - A file that fails to load (bad JSON, half-saved, missing) falls back
+      to defaults only until it has loaded once; after that the last good
+      data for that file is kept
+    """
+    
+    def __init__(self, config_path="config.json", keybind_path="keybind_config.json",
+                 snapshot_path=os.path.join(".cursed_sword_cache", "config.marshal"),
+                 reload_interval=1.0):
+        self.paths = {"config": config_path, "keybinds": keybind_path}
+        self.snapshot_path = snapshot_path
+        self.reload_interval = reload_interval
+        self.data = {"config": {}, "keybinds": {}}
+        self.errors = []
+        self.loaded = set()  # files that have parsed successfully at least once
+        self.from_snapshot = False
+        self.reloads = 0
+        self._mtimes = {}
+        self._next_check = 0
+    
+    @property
+    def config(self):
+        return self.data["config"]
+    
+    @property
+    def keybinds(self):
+        return self.data["keybinds"]
+    
+    def load(self):
+        """(Re)load both files, using the snapshot when they are unchanged"""
+        import hashlib
+        
+        raw = {}
+        mtimes = {}
+        digest = hashlib.sha256(b"v%d" % CONFIG_SNAPSHOT_VERSION)
+        
+        for name, path in self.paths.items():
+            try:
+                mtimes[name] = os.stat(path).st_mtime_ns
+                with open(path, 'rb') as f:
+                    raw[name] = f.read()
+            except OSError:
+                mtimes[name] = None
+                raw[name] = None
+            
+            digest.update(name.encode())
+            digest.update(raw[name] if raw[name] is not None else b"<missing>")
+        
+        self._mtimes = mtimes
+        key = digest.hexdigest()
+        snapshot = self._read_snapshot(key)
+        
+        if snapshot is not None:
+            self.data, self.errors, loaded = snapshot
+            self.loaded.update(loaded)
+            self.from_snapshot = True
+        else:
+            self.data, self.errors, kept = self._parse(raw)
+            self.from_snapshot = False
+            
+            # A snapshot of kept data would outlive this session's last good config
+            if not kept:
+                self._write_snapshot(key)
+        
+        for error in self.errors:
+            log.warning("Config: %s", error)
+    
+    def check_for_changes(self, now):
+        """Reload if a file changed (rate-limited), returns True on reload"""
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.reload_interval
+        
+        for name, path in self.paths.items():
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+            
+            if mtime != self._mtimes.get(name):
+                self.load()
+                self.reloads += 1
+                return True
+        
+        return False
+    
+    def _parse(self, raw):
+        """Returns (data, errors, kept) - kept is True if any file kept its last good data"""
+        import json
+        
+        data = {}
+        errors = []
+        kept = False
+        
+        for name, path in self.paths.items():
+            parsed = None
+            
+            if raw[name] is None:
+                error = f"{path} not found"
+            else:
+                try:
+                    parsed = json.loads(raw[name].decode("utf-8"))
+                except ValueError as e:
+                    error = f"{path} is not valid JSON ({e})"
+                else:
+                    if not isinstance(parsed, dict):
+                        error = f"{path}: expected an object at top level"
+                        parsed = None
+            
+            if parsed is None:
+                if name in self.loaded:
+                    errors.append(f"{error}, keeping the last good {name}")
+                    data[name] = self.data[name]
+                    kept = True
+                else:
+                    errors.append(f"{error}, using defaults")
+                    data[name] = {}
+                continue
+            
+            errors.extend(f"{path}: {error}" for error in validate_config(parsed, CONFIG_SCHEMA[name]))
+            data[name] = parsed
+            self.loaded.add(name)
+        
+        return data, errors, kept
+    
+    def _read_snapshot(self, key):
+        import marshal
+        
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        
+        if not isinstance(snapshot, dict) or snapshot.get("key") != key:
+            return None
+        return snapshot["data"], snapshot["errors"], snapshot["loaded"]
+    
+    def _write_snapshot(self, key):
+        import marshal
+        
+        snapshot = {"key": key, "data": self.data, "errors": self.errors, "loaded": sorted(self.loaded)}
+        
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            temp_path = self.snapshot_path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                marshal.dump(snapshot, f)
+            os.replace(temp_path, self.snapshot_path)
+        except (OSError, ValueError) as e:
+            log.debug("Config snapshot not written: %s", e)
+
 
 # ============================================================================
-# CURSED SWORD MOD v2.2 - Auto-Parry Swap with Stacking Buffs & UI Counter
-# Compatible with Seamless Co-op (Latest Version)
+# ENGINE MODULES (bound once by bind_engine_modules, not imported per call)
 # ============================================================================
 
+seamless_hook = None
+InputManager = None
+GameManager = None
+
+def bind_engine_modules():
+    """Import the in-engine modules and bind them to module-level references"""
+    global seamless_hook, InputManager, GameManager
+    
+    if seamless_hook is None:
+        from seamless_coop_integration import seamless_hook
+    if InputManager is None:
+        from input_manager import InputManager
+    if GameManager is None:
+        from game_manager import GameManager
+
+
 class CursedSwordMod:
     def __init__(self):
         self.cursed_sword_weapon_id = 32  # Hand of Malenia weapon ID
         self.cursed_sword_ash_id = 100    # Custom Ash of War ID
-        self.is_parrying = False
-        self.original_weapon_id = None
         self.parry_cooldown = 0.5  # seconds
-        self.last_parry_time = 0
+        
+        # ====== Parry State Machine (per-player phases live in PlayerState) ======
+        self.parry_window_duration = 0.6  # seconds
+        self.swap_delay = 0.1  # seconds between swap and parry
+        self.active_parries = {}  # player_id -> player with a parry in progress
+        
+        # ====== Command Queue (async callbacks post, on_update drains) ======
+        self.commands = CommandQueue()
         
         # ====== Input Mapping (from keybind config) ======
         self.CONTROLLER_PARRY_INPUT = ("Y", "LT")
         self.PC_PARRY_INPUT = "E"
-        self.load_keybinds_from_config()
+        self.input_buffer_window = 0.15  # seconds a press is held while busy
+        
+        # Edge detection state (local player)
+        self.parry_input_held = False
+        self.buffered_parry_at = None
         
         # Seamless Co-op sync
         self.seamless_enabled = True
         self.player_session_id = None
+        self.outbox = SessionOutbox()
+        self.sync_payloads = {}  # player_id -> snapshot waiting for the sync cycle
+        
+        # Replica store of remote players, fed by handle_remote_parry
+        self.remote_players = {}     # player_id -> RemotePlayerReplica
+        self.remote_sequences = {}   # (sender_id, channel) -> (epoch, last accepted sequence, local time seen)
+        self.remote_batches_dropped = 0
+        self.remote_messages_dropped = 0
+        self.remote_handlers = {
+            "weapon_swap": self.on_remote_weapon_swap,
+            "parry_success": self.on_remote_parry_success,
+            "parry_executed": self.on_remote_parry_executed,
+            "mod_toggle": self.on_remote_mod_toggle,
+        }
         
-        # ====== Per-Player Settings ======
-        self.mod_enabled_per_player = {}
+        # ====== Per-Player State (player_id -> PlayerState) ======
+        self.players = {}
+        self.player_handles = PlayerHandleCache()
         self.default_enabled = True
         
+        # Idle sweep (runs on the expiry scheduler; the Seamless leave hook,
+        # where it exists, only evicts sooner)
+        self.player_sweep_interval = 5.0  # seconds between sweeps
+        self.player_idle_timeout = 60.0   # seconds without parries/remote messages
+        
         # ====== Stacking Buff System (RESETS PER PARRY) ======
-        self.parry_stack_count = {}
         self.max_stacks = 10
         self.buff_duration = 15
-        self.active_buff_timers = {}
-        self.buff_expiry_time = {}
+        self.expiry_scheduler = ExpiryScheduler()
         
         # ====== Visual Effects ======
         self.glow_effect_id = "cursed_sword_orange_glow"
-        self.glow_active = {}
-        self.ui_counter_visible = {}
         
         # ====== NEW: Sound Effects ======
         self.sound_effects = {
@@ -50,7 +1630,8 @@ class CursedSwordMod:
             "stack_10": "stack_milestone_10.wem",
         }
         self.sound_config = {}
-        self.load_sound_config()
+        self.buff_config = {}
+        self.visual_config = {}
         
         # ====== NEW: Particle Effects ======
         self.particle_effects = {
@@ -59,50 +1640,134 @@ class CursedSwordMod:
             "stack_5": "cursed_sword_stack_5",
             "stack_10": "cursed_sword_stack_10_burst",
         }
-        self.particle_active = {}
-        
-    def load_keybinds_from_config(self):
-        """Load keybinds from keybind_config.json"""
-        import json
+        self.particle_effect_ids = dict(self.particle_effects)
+        self.particles_enabled = True
+        self.parry_burst_enabled = True
+        self.effect_queue = EffectQueue()
+        
+        # ====== Perf Monitor (off by default; `perf on` in the console) ======
+        self.perf = PerfMonitor()
+        
+        # ====== Config (keybinds, buffs, visuals, sounds; hot-reloaded) ======
+        self.config = ModConfig()
+        self.config.load()
+        self.apply_config()
+    
+    def apply_config(self):
+        """Apply the loaded config and rebuild everything derived from it"""
+        self.apply_keybind_config(self.config.keybinds)
+        self.compile_keybinds()
+        
+        config = self.config.config
+        parry_config = config.get("parry_config", {})
+        self.parry_window_duration = parry_config.get("parry_window_duration", self.parry_window_duration)
+        self.parry_cooldown = parry_config.get("cooldown", self.parry_cooldown)
+        
+        self.sound_config = config.get("sound_effects", {})
+        self.buff_config = config.get("buff_config", {})
+        self.visual_config = config.get("visual_effects", {})
+        
+        stacking = self.buff_config.get("stacking_system", {})
+        self.max_stacks = stacking.get("max_stacks", self.max_stacks)
+        self.buff_duration = stacking.get("buff_duration", self.buff_duration)
+        
+        # Stacks above a lowered max would index past the new table
+        for state in self.players.values():
+            if state.stack_count > self.max_stacks:
+                state.stack_count = self.max_stacks
+        
+        # ====== Per-Stack Lookup Table ======
+        self.build_effect_tables()
+        
+        self.sound_bank = SoundBank(
+            resolve_sound_entries(self.sound_effects, self.sound_config)
+        )
         
-        try:
-            with open("keybind_config.json", 'r') as f:
-                keybind_config = json.load(f)
-                
-                # Load controller binds
-                controller_config = keybind_config.get("controller", {})
-                parry_input = controller_config.get("parry_input", ["Y", "LT"])
-                self.CONTROLLER_PARRY_INPUT = tuple(parry_input)
-                
-                # Load keyboard binds
-                keyboard_config = keybind_config.get("keyboard", {})
-                self.PC_PARRY_INPUT = keyboard_config.get("parry_input", "E")
-                
-                print(f"[CursedSword] Keybinds loaded:")
-                print(f"  Controller: {self.CONTROLLER_PARRY_INPUT[0]} + {self.CONTROLLER_PARRY_INPUT[1]}")
-                print(f"  Keyboard: {self.PC_PARRY_INPUT}")
-                
-        except FileNotFoundError:
-            print("[CursedSword] keybind_config.json not found, using defaults")
-        except Exception as e:
-            print(f"[CursedSword] Error loading keybinds: {e}, using defaults")
+        source = "snapshot" if self.config.from_snapshot else "parsed"
+        log.info("Configuration loaded (%s)", source)
     
-    def load_sound_config(self):
-        """Load sound settings from config"""
-        import json
+    def check_config_reload(self, now):
+        """Hot-reload config files when they change on disk"""
+        if self.config.check_for_changes(now):
+            self.apply_config()
+            self.sound_bank.preload()
+            log.info("Configuration reloaded")
+    
+    def apply_keybind_config(self, keybind_config):
+        """Apply keybinds from keybind_config.json"""
+        # Load controller binds
+        controller_config = keybind_config.get("controller", {})
+        parry_input = controller_config.get("parry_input", ["Y", "LT"])
+        self.CONTROLLER_PARRY_INPUT = tuple(parry_input)
+        
+        # Load keyboard binds
+        keyboard_config = keybind_config.get("keyboard", {})
+        self.PC_PARRY_INPUT = keyboard_config.get("parry_input", "E")
+        
+        # Optional input buffering (0 disables)
+        buffer_ms = keybind_config.get("input_buffer_ms", 150)
+        self.input_buffer_window = buffer_ms / 1000.0
+        
+        log.info(
+            "Keybinds loaded: Controller %s, Keyboard %s",
+            " + ".join(self.CONTROLLER_PARRY_INPUT),
+            self.PC_PARRY_INPUT
+        )
+    
+    def build_effect_tables(self):
+        """Precompute per-stack effect values for stacks 0..max_stacks"""
+        sound_milestones = {}
+        if self.sound_config.get("enabled", True):
+            sound_milestones = resolve_milestones(
+                self.sound_config.get("stack_milestones"),
+                [key for key in self.sound_effects if key.startswith("stack_")]
+            )
         
-        try:
-            with open("config.json", 'r') as f:
-                config = json.load(f)
-                self.sound_config = config.get("sound_effects", {})
-                print("[CursedSword] Sound configuration loaded")
-        except Exception as e:
-            print(f"[CursedSword] Error loading sound config: {e}")
+        particle_config = self.visual_config.get("particle_effects", {})
+        self.particles_enabled = particle_config.get("enabled", True)
+        self.parry_burst_enabled = (self.particles_enabled and
+                                    particle_config.get("parry_burst", {}).get("enabled", True))
+        
+        self.particle_effect_ids = dict(self.particle_effects)
+        particle_milestones = {}
+        if self.particles_enabled:
+            milestone_config = particle_config.get("stack_milestones")
+            particle_milestones = resolve_milestones(
+                milestone_config,
+                [key for key in self.particle_effects if key.startswith("stack_")]
+            )
+            
+            # Effect ids: config "effect_id", then the built-in ids, then a derived name
+            for key in particle_milestones.values():
+                entry = (milestone_config or {}).get(key)
+                effect_id = entry.get("effect_id") if isinstance(entry, dict) else None
+                self.particle_effect_ids[key] = (
+                    effect_id or self.particle_effects.get(key) or f"cursed_sword_{key}"
+                )
+        
+        color = self.visual_config.get("orange_glow", {}).get("color", {})
+        self.hud_icon_color = {
+            "r": color.get("r", 1.0),
+            "g": color.get("g", 0.55),
+            "b": color.get("b", 0.0),
+        }
+        
+        self.stack_table = build_stack_table(
+            self.max_stacks,
+            self.buff_config,
+            self.visual_config,
+            sound_milestones,
+            particle_milestones
+        )
     
     def initialize(self):
         """Initialize mod with Seamless Co-op hook"""
-        print("[CursedSword] Initializing enhanced mod v2.2...")
-        print("[CursedSword] Features: Stacking buffs, Sound effects, Particles, Custom keybinds")
+        log.start()
+        log.info("Initializing enhanced mod v2.2...")
+        log.info("Features: Stacking buffs, Sound effects, Particles, Custom keybinds")
+        
+        loaded = self.sound_bank.preload()
+        log.info("Sound bank: %d sounds preloaded", loaded)
         
         if self.seamless_enabled:
             seamless_hook.register_custom_sync(
@@ -113,10 +1778,126 @@ class CursedSwordMod:
             
             seamless_hook.register_network_handler(
                 mod_name="CursedSword",
-                handler=self.handle_remote_parry
+                handler=self.queue_remote_parry
             )
+            
+            # Optional fast path: evict as soon as a participant leaves
+            # (otherwise the idle sweep catches them)
+            register_leave = getattr(seamless_hook, "register_player_leave_handler", None)
+            if register_leave is not None:
+                register_leave(
+                    mod_name="CursedSword",
+                    handler=self.queue_player_left
+                )
+            
+            # New participants need a full state sync
+            register_join = getattr(seamless_hook, "register_player_join_handler", None)
+            if register_join is not None:
+                register_join(
+                    mod_name="CursedSword",
+                    handler=self.queue_player_joined
+                )
+        
+        self.schedule_player_sweep()
+        
+        log.info("✓ Mod initialized!")
+    
+    # ========================================================================
+    # PER-PLAYER STATE
+    # ========================================================================
+    
+    def get_player_state(self, player_id):
+        """Get (or create) the state record for a player"""
+        state = self.players.get(player_id)
+        
+        if state is None:
+            state = PlayerState(self.default_enabled, time.time())
+            self.players[player_id] = state
+        
+        return state
+    
+    def remove_player(self, player_id):
+        """Evict all state held for a player"""
+        self.expiry_scheduler.cancel(player_id)
+        self.active_parries.pop(player_id, None)
+        self.player_handles.forget(player_id)
+        
+        had_remote_state = self.remote_players.pop(player_id, None) is not None
+        self.remote_sequences.pop((player_id, CHANNEL_BATCH), None)
+        self.remote_sequences.pop((player_id, CHANNEL_SYNC), None)
+        self.sync_payloads.pop(player_id, None)
+        
+        return self.players.pop(player_id, None) is not None or had_remote_state
+    
+    def schedule_player_sweep(self):
+        self.expiry_scheduler.schedule(
+            PLAYER_SWEEP_KEY,
+            time.time() + self.player_sweep_interval,
+            self.sweep_idle_players
+        )
+    
+    def sweep_idle_players(self):
+        """
+        Evict players who left or went idle (runs every player_sweep_interval)
+        
+        Local state goes once the player has no parry in progress, no buff
+        left and either the engine no longer returns them or they have been
+        idle for player_idle_timeout with nothing but default settings.
+        Remote replicas and sender sequences go after player_idle_timeout
+        without a message; that never touches local state or expiries.
+        """
+        now = time.time()
+        idle_before = now - self.player_idle_timeout
+        evicted = []
+        
+        for player_id, state in self.players.items():
+            if (player_id in self.active_parries
+                    or self.expiry_scheduler.next_expiry(player_id) is not None
+                    or state.buff_expiry_time > now):
+                continue
+            
+            idle = (max(state.last_parry_time, state.buff_expiry_time) < idle_before
+                    and state.enabled == self.default_enabled)
+            
+            if idle or not self.player_handles.get(player_id):
+                evicted.append(player_id)
+        
+        for player_id in evicted:
+            self.remove_player(player_id)
+        
+        # Remote-only: a stale replica says nothing about local state (our own
+        # toggles echo back as replicas, host-driven players send their own)
+        stale = [player_id for player_id, replica in self.remote_players.items()
+                 if replica.last_seen < idle_before]
         
-        print("[CursedSword] ✓ Mod initialized!")
+        for player_id in stale:
+            del self.remote_players[player_id]
+        
+        for sender_key, (_, _, seen_at) in list(self.remote_sequences.items()):
+            if seen_at < idle_before:
+                del self.remote_sequences[sender_key]
+        
+        if evicted or stale:
+            log.debug("Idle sweep evicted %d players, %d remote replicas", len(evicted), len(stale))
+        
+        self.schedule_player_sweep()
+    
+    def queue_player_joined(self, player_id):
+        """Seamless Co-op hook (any thread): handled on the next tick"""
+        self.commands.post(self.on_player_joined, player_id)
+    
+    def queue_player_left(self, player_id):
+        """Seamless Co-op hook (any thread): handled on the next tick"""
+        self.commands.post(self.on_player_left, player_id)
+    
+    def on_player_joined(self, player_id):
+        """Player joined, resend full state next sync"""
+        self.mark_sync_dirty()
+    
+    def on_player_left(self, player_id):
+        """Player left the session"""
+        if self.remove_player(player_id):
+            log.info("Player %s left, state evicted", player_id)
     
     # ========================================================================
     # PER-PLAYER MOD TOGGLE
@@ -124,12 +1905,12 @@ class CursedSwordMod:
     
     def toggle_mod_for_player(self, player_id):
         """Toggle mod on/off for individual player"""
-        current_state = self.mod_enabled_per_player.get(player_id, self.default_enabled)
-        new_state = not current_state
-        self.mod_enabled_per_player[player_id] = new_state
+        state = self.get_player_state(player_id)
+        new_state = not state.enabled
+        state.enabled = new_state
         
         status = "ENABLED" if new_state else "DISABLED"
-        print(f"[CursedSword] Mod {status} for player {player_id}")
+        log.info("Mod %s for player %s", status, player_id)
         
         self.broadcast_mod_toggle(player_id, new_state)
         
@@ -140,114 +1921,240 @@ class CursedSwordMod:
     
     def is_mod_enabled_for_player(self, player_id):
         """Check if mod is enabled for specific player"""
-        return self.mod_enabled_per_player.get(player_id, self.default_enabled)
+        state = self.players.get(player_id)
+        return state.enabled if state is not None else self.default_enabled
     
     def broadcast_mod_toggle(self, player_id, enabled):
-        """Inform other players of mod status change"""
+        """Inform other players of mod status change (sent with the next batch)"""
         if not self.seamless_enabled:
             return
         
-        sync_data = {
-            "mod": "CursedSword",
-            "action": "mod_toggle",
-            "player_id": player_id,
-            "enabled": enabled,
-            "timestamp": time.time(),
-        }
-        
-        seamless_hook.broadcast_to_session(sync_data, exclude_self=False)
+        self.outbox.queue_mod_toggle(player_id, enabled)
     
     # ========================================================================
     # INPUT DETECTION (USES KEYBIND CONFIG)
     # ========================================================================
     
-    def detect_input(self, input_type):
-        """Detect parry input based on device type and keybind config"""
-        if input_type == "controller":
-            return self.check_controller_combo()
-        elif input_type == "keyboard":
-            return self.check_keyboard_input()
-        return False
+    def compile_keybinds(self):
+        """Compile the loaded keybinds into bitmasks (once per config load)"""
+        self.controller_buttons = tuple(self.CONTROLLER_PARRY_INPUT)
+        self.controller_combo_mask = (1 << len(self.controller_buttons)) - 1
+        self.keyboard_combo_mask = 1
     
-    def check_controller_combo(self):
-        """Check for configured controller combo"""
-        from input_manager import InputManager
+    def read_input_mask(self, input_type):
+        """
+        Read the pressed state of the bound inputs as a bitmask
+        
+        Returns (mask, combo_mask); the parry input is held when they match.
+        Controller polling stops at the first released button since the
+        combo can no longer complete this frame.
+        """
+        input_manager = InputManager
+        
+        if input_type == "controller":
+            mask = 0
+            bit = 1
+            
+            for button in self.controller_buttons:
+                if not input_manager.is_button_pressed(button):
+                    break
+                mask |= bit
+                bit <<= 1
+            
+            return mask, self.controller_combo_mask
         
-        button1 = InputManager.is_button_pressed(self.CONTROLLER_PARRY_INPUT[0])
-        button2 = InputManager.is_button_pressed(self.CONTROLLER_PARRY_INPUT[1])
+        if input_type == "keyboard":
+            pressed = input_manager.is_key_pressed(self.PC_PARRY_INPUT)
+            return (1 if pressed else 0), self.keyboard_combo_mask
         
-        return button1 and button2
+        return 0, -1
     
-    def check_keyboard_input(self):
-        """Check for configured keyboard input"""
-        from input_manager import InputManager
-        return InputManager.is_key_pressed(self.PC_PARRY_INPUT)
+    def detect_input(self, input_type):
+        """Detect parry input (level) based on device type and keybind config"""
+        mask, combo_mask = self.read_input_mask(input_type)
+        return mask == combo_mask
+    
+    def poll_parry_press(self, now):
+        """
+        Take this frame's input snapshot and return True on a parry press
+        
+        Edge-triggered: holding the combo fires once. A press that arrives
+        while a parry is still in progress is buffered for
+        input_buffer_window seconds.
+        """
+        held = self.detect_input(self.detect_input_type())
+        
+        if held and not self.parry_input_held:
+            self.buffered_parry_at = now
+        self.parry_input_held = held
+        
+        return self.buffered_parry_at is not None
     
     # ========================================================================
     # WEAPON SWAPPING
     # ========================================================================
     
     def swap_to_cursed_sword(self, player):
-        """Instantly swap to Hand of Malenia"""
+        """Instantly swap to Hand of Malenia (no-op if already equipped)"""
         player_id = player.get_id()
-        self.original_weapon_id = player.get_equipped_weapon_id()
+        equipped_weapon_id = player.get_equipped_weapon_id()
+        
+        if equipped_weapon_id == self.cursed_sword_weapon_id:
+            return False
+        
+        self.get_player_state(player_id).original_weapon_id = equipped_weapon_id
         
         player.set_equipped_weapon(self.cursed_sword_weapon_id)
         player.set_ash_of_war(self.cursed_sword_ash_id)
         
-        print(f"[CursedSword] Player {player_id} swapped to Cursed Sword")
+        log.debug("Player %s swapped to Cursed Sword", player_id)
         
         if self.seamless_enabled:
-            self.broadcast_weapon_swap(player, self.cursed_sword_weapon_id)
+            self.broadcast_weapon_swap(player, self.cursed_sword_weapon_id, equipped_weapon_id)
+        
+        return True
     
     def return_to_original_weapon(self, player):
         """Swap back to original weapon"""
-        player_id = player.get_id()
+        state = self.players.get(player.get_id())
         
-        if self.original_weapon_id is None:
+        if state is None or state.original_weapon_id is None:
             return
         
-        player.set_equipped_weapon(self.original_weapon_id)
+        previous_weapon_id = player.get_equipped_weapon_id()
+        player.set_equipped_weapon(state.original_weapon_id)
         
         if self.seamless_enabled:
-            self.broadcast_weapon_swap(player, self.original_weapon_id)
+            self.broadcast_weapon_swap(player, state.original_weapon_id, previous_weapon_id)
     
     # ========================================================================
-    # PARRY EXECUTION
+    # PARRY EXECUTION (PER-PLAYER STATE MACHINE)
     # ========================================================================
     
-    def execute_parry(self, player):
-        """Execute parry animation"""
+    def request_parry(self, player):
+        """
+        Start a parry for any player handled by this instance
+        
+        Returns False if the mod is disabled for the player or a parry is
+        already in progress for them.
+        """
+        state = self.get_player_state(player.get_id())
+        
+        if not state.enabled or state.parry_phase != PARRY_IDLE:
+            return False
+        
+        self.begin_parry(player)
+        return True
+    
+    def begin_parry(self, player):
+        """Issue the weapon swap and arm the parry for a later tick"""
         player_id = player.get_id()
+        self.swap_to_cursed_sword(player)
+        
+        state = self.get_player_state(player_id)
+        state.parry_phase = PARRY_SWAPPING
+        state.parry_armed_at = time.time() + self.swap_delay
+        self.active_parries[player_id] = player
+    
+    def execute_parry(self, player):
+        """Start parry animation and open the parry window (non-blocking)"""
+        state = self.get_player_state(player.get_id())
         current_time = time.time()
         
-        if current_time - self.last_parry_time < self.parry_cooldown:
+        if current_time - state.last_parry_time < self.parry_cooldown:
             return False
         
-        self.last_parry_time = current_time
-        self.is_parrying = True
+        state.last_parry_time = current_time
+        state.is_parrying = True
         
         player.trigger_parry_animation()
         
-        parry_window_duration = 0.6
-        parry_success = self.listen_for_parry_success(player, parry_window_duration)
+        state.parry_phase = PARRY_WINDOW_OPEN
+        state.parry_window_end = current_time + self.parry_window_duration
+        state.parry_hit_time = None
+        return True
+    
+    def on_parry_hit(self, player_id, hit_time=None):
+        """
+        Hit callback (any thread) - timestamps the hit and queues it
         
-        if parry_success:
-            self.handle_successful_parry(player)
+        The hit is recorded when the command queue drains at the start of
+        the next tick, before the parry window is advanced.
+        """
+        if hit_time is None:
+            hit_time = time.time()
         
-        self.is_parrying = False
-        return parry_success
+        self.commands.post(self.record_parry_hit, player_id, hit_time)
     
-    def listen_for_parry_success(self, player, window_duration):
-        """Listen for enemy hit during parry window"""
-        start_time = time.time()
+    def record_parry_hit(self, player_id, hit_time):
+        """Latch a hit landing inside the open parry window"""
+        state = self.players.get(player_id)
         
-        while time.time() - start_time < window_duration:
-            if player.did_parry_hit():
-                return True
-            time.sleep(0.01)
+        if state is None or state.parry_phase != PARRY_WINDOW_OPEN:
+            return
         
-        return False
+        if hit_time <= state.parry_window_end and state.parry_hit_time is None:
+            state.parry_hit_time = hit_time
+    
+    def update_parries(self):
+        """Advance every in-progress parry by one tick"""
+        for player_id, player in list(self.active_parries.items()):
+            self.update_parry_window(player)
+            
+            state = self.players.get(player_id)
+            if state is None or state.parry_phase == PARRY_IDLE:
+                del self.active_parries[player_id]
+    
+    def update_parry_window(self, player):
+        """
+        Advance one player's parry state machine by one tick
+        
+        Returns True/False when the parry resolves this tick, None otherwise.
+        """
+        state = self.players.get(player.get_id())
+        
+        if state is None:
+            return None
+        
+        phase = state.parry_phase
+        
+        if phase == PARRY_RESOLVED:
+            state.parry_phase = PARRY_IDLE
+            return None
+        
+        if phase == PARRY_SWAPPING:
+            if time.time() >= state.parry_armed_at:
+                if not self.execute_parry(player):
+                    state.parry_phase = PARRY_IDLE
+            return None
+        
+        if phase != PARRY_WINDOW_OPEN:
+            return None
+        
+        if state.parry_hit_time is None and player.did_parry_hit():
+            state.parry_hit_time = time.time()
+        
+        if state.parry_hit_time is not None:
+            self.resolve_parry(player, True)
+            return True
+        
+        if time.time() >= state.parry_window_end:
+            self.resolve_parry(player, False)
+            return False
+        
+        return None
+    
+    def resolve_parry(self, player, parry_success):
+        """Close the parry window and apply the result"""
+        state = self.get_player_state(player.get_id())
+        state.parry_phase = PARRY_RESOLVED
+        state.parry_hit_time = None
+        state.last_parry_result = parry_success
+        
+        if parry_success:
+            self.handle_successful_parry(player)
+        
+        state.is_parrying = False
     
     # ========================================================================
     # STACKING BUFF SYSTEM WITH SOUND & PARTICLES
@@ -257,33 +2164,28 @@ class CursedSwordMod:
         """Handle successful parry with all effects"""
         player_id = player.get_id()
         current_time = time.time()
+        self.player_handles.remember(player_id, player)
         
-        if player_id not in self.parry_stack_count:
-            self.parry_stack_count[player_id] = 0
-            self.buff_expiry_time[player_id] = current_time
-            self.active_buff_timers[player_id] = None
+        state = self.players.get(player_id)
+        
+        if state is None:
+            state = PlayerState(self.default_enabled, current_time)
+            self.players[player_id] = state
         else:
-            time_since_last_parry = current_time - self.buff_expiry_time[player_id]
+            time_since_last_parry = current_time - state.buff_expiry_time
             
             if time_since_last_parry > self.buff_duration:
-                self.parry_stack_count[player_id] = 0
-                print(f"[CursedSword] Player {player_id}: Buff expired, stacks reset")
-            
-            if self.active_buff_timers[player_id] is not None:
-                self.active_buff_timers[player_id].cancel()
+                state.stack_count = 0
+                log.debug("Player %s: Buff expired, stacks reset", player_id)
         
         # Increment stack
-        self.parry_stack_count[player_id] = min(
-            self.parry_stack_count[player_id] + 1,
-            self.max_stacks
-        )
+        stack_count = min(state.stack_count + 1, self.max_stacks)
+        state.stack_count = stack_count
         
         new_expiry_time = current_time + self.buff_duration
-        self.buff_expiry_time[player_id] = new_expiry_time
-        
-        stack_count = self.parry_stack_count[player_id]
+        state.buff_expiry_time = new_expiry_time
         
-        print(f"[CursedSword] Player {player_id}: Successful parry! Stack {stack_count}/{self.max_stacks}")
+        log.debug("Player %s: Successful parry! Stack %d/%d", player_id, stack_count, self.max_stacks)
         
         # Apply all effects
         self.apply_stacking_buffs(player, stack_count)
@@ -296,53 +2198,66 @@ class CursedSwordMod:
         # ====== NEW: Spawn Particles ======
         self.spawn_parry_particles(player, stack_count)
         
-        self.schedule_buff_expiry(player, self.buff_duration)
+        self.schedule_buff_expiry(player_id, new_expiry_time)
         
         if self.seamless_enabled:
             self.broadcast_parry_success(player, stack_count)
     
     def apply_stacking_buffs(self, player, stack_count):
         """Apply buffs that scale with stack count"""
-        player_id = player.get_id()
-        
-        damage_multiplier = 1.0 + (stack_count * 0.003)
-        stamina_multiplier = 1.0 + (stack_count * 0.005)
-        stance_break_multiplier = 1.0 + (stack_count * 0.002)
-        
+        effects = self.stack_table[stack_count]
+        state = self.get_player_state(player.get_id())
         buff_duration = self.buff_duration
         
-        player.apply_buff("physical_damage", damage_multiplier, buff_duration)
-        player.apply_buff("stamina_regen", stamina_multiplier, buff_duration)
-        player.apply_buff("poise_damage", stance_break_multiplier, buff_duration)
+        values = (
+            effects.damage_multiplier,
+            effects.stamina_multiplier,
+            effects.stance_break_multiplier,
+        )
+        applied = state.applied_buffs
         
-        damage_increase = (stack_count * 0.3)
-        stamina_increase = (stack_count * 0.5)
-        stance_increase = (stack_count * 0.2)
+        # Only push multipliers that changed; unchanged ones just get their
+        # duration refreshed (full re-apply if the engine has no refresh call)
+        refresh_buff = getattr(player, "refresh_buff_duration", None)
         
-        buff_info = {
-            "stack_count": stack_count,
-            "physical_damage": f"+{damage_increase:.1f}%",
-            "stamina": f"+{stamina_increase:.1f}%",
-            "stance_break": f"+{stance_increase:.1f}%",
-        }
+        for index, buff_name in enumerate(BUFF_NAMES):
+            value = values[index]
+            
+            if applied is not None and applied[index] == value and refresh_buff is not None:
+                refresh_buff(buff_name, buff_duration)
+            else:
+                player.apply_buff(buff_name, value, buff_duration)
+        
+        state.applied_buffs = values
         
-        print(f"[CursedSword] Player {player_id} Buffs: {buff_info}")
+        log.debug(
+            "Player %s Buffs: stack %d, physical_damage +%.1f%%, stamina +%.1f%%, stance_break +%.1f%%",
+            player.get_id(), stack_count, effects.damage_percent,
+            effects.stamina_percent, effects.stance_break_percent
+        )
         
-        player.spawn_particle_effect("parry_success")
+        if self.particles_enabled:
+            self.effect_queue.push(
+                EFFECT_ATTACHED_PARTICLE, player, player.get_id(), "parry_success"
+            )
     
-    def schedule_buff_expiry(self, player, duration):
-        """Schedule buff expiry"""
-        player_id = player.get_id()
+    def schedule_buff_expiry(self, player_id, expiry_time):
+        """
+        Schedule (or reschedule) buff expiry on the shared scheduler
         
+        Only the id is captured; the handle is looked up when the window
+        closes, so pending expiries don't keep despawned players alive.
+        """
         def on_buff_expire():
-            print(f"[CursedSword] Player {player_id}: Buff window closing")
+            log.debug("Player %s: Buff window closing", player_id)
             self.hide_ui_counter(player_id)
-            self.remove_orange_glow(player)
+            self.remove_orange_glow(player_id)
+            
+            state = self.players.get(player_id)
+            if state is not None:
+                state.applied_buffs = None
         
-        timer = threading.Timer(duration, on_buff_expire)
-        timer.daemon = True
-        self.active_buff_timers[player_id] = timer
-        timer.start()
+        self.expiry_scheduler.schedule(player_id, expiry_time, on_buff_expire)
     
     # ========================================================================
     # SOUND EFFECTS SYSTEM
@@ -356,25 +2271,23 @@ class CursedSwordMod:
         - Every parry: Base parry sound
         - Stack 5: Special milestone sound
         - Stack 10: Victory/max stack sound
+        
+        Sounds are queued and played by the effect queue at the end of the tick.
         """
         player_id = player.get_id()
         
         # Always play base parry sound
-        self.play_sound(player, "parry_success")
-        print(f"[CursedSword] Player {player_id}: Parry sound played")
+        self.effect_queue.push(EFFECT_SOUND, player, player_id, "parry_success")
         
         # Play milestone sounds
-        if stack_count == 1:
-            self.play_sound(player, "stack_1")
-            print(f"[CursedSword] Player {player_id}: Stack 1 milestone sound")
-            
-        elif stack_count == 5:
-            self.play_sound(player, "stack_5")
-            print(f"[CursedSword] Player {player_id}: Stack 5 milestone sound!")
-            
-        elif stack_count == 10:
-            self.play_sound(player, "stack_10")
-            print(f"[CursedSword] Player {player_id}: MAX STACK 10 sound!")
+        milestone = self.stack_table[stack_count].sound_milestone
+        if milestone is not None:
+            self.effect_queue.push(
+                EFFECT_SOUND, player, player_id, milestone,
+                priority=EFFECT_PRIORITY_MILESTONE
+            )
+        
+        log.debug("Player %s: Parry sound queued (milestone: %s)", player_id, milestone)
     
     def play_sound(self, player, sound_type):
         """
@@ -384,23 +2297,37 @@ class CursedSwordMod:
             player: Player game object
             sound_type: Type of sound (parry_success, stack_1, stack_5, stack_10)
         """
+        # Missing/disabled sounds were reported at load
+        handle = self.sound_bank.get(sound_type)
+        if handle is None:
+            return
+        
         try:
-            sound_file = self.sound_effects.get(sound_type, "parry_success.wem")
-            
-            # Get sound settings
-            volume = self.sound_config.get("volume", 1.0)
-            pitch = self.sound_config.get("pitch", 1.0)
-            
             # Play sound at player position
             player.play_sound_effect(
-                sound_file=sound_file,
-                volume=volume,
-                pitch=pitch,
+                sound_file=handle.engine_handle,
+                volume=handle.volume,
+                pitch=handle.pitch,
                 follow_player=True
             )
             
         except Exception as e:
-            print(f"[CursedSword] Error playing sound: {e}")
+            log.warning("Error playing sound: %s", e, key="play_sound_error")
+    
+    def play_queued_effects(self):
+        """Play this tick's queued sounds/particles within the effect budget"""
+        self.effect_queue.drain(self.play_effect, time.time())
+    
+    def play_effect(self, request):
+        """Effect queue callback: play one queued sound or particle"""
+        kind = request.kind
+        
+        if kind == EFFECT_SOUND:
+            self.play_sound(request.player, request.effect_key)
+        elif kind == EFFECT_PARTICLE:
+            self.spawn_particles(request.player, request.effect_key, request.stack_count)
+        else:
+            request.player.spawn_particle_effect(request.effect_key)
     
     # ========================================================================
     # PARTICLE EFFECTS SYSTEM
@@ -414,25 +2341,24 @@ class CursedSwordMod:
         - Every parry: Base parry burst
         - Stack 5: Special 5-stack effect
         - Stack 10: Epic max stack burst
+        
+        Particles are queued and spawned by the effect queue at the end of the tick.
         """
         player_id = player.get_id()
         
-        # Always spawn base parry burst
-        self.spawn_particles(player, "parry_success", stack_count)
-        print(f"[CursedSword] Player {player_id}: Parry burst particles spawned")
+        # Base parry burst (unless disabled in config)
+        if self.parry_burst_enabled:
+            self.effect_queue.push(EFFECT_PARTICLE, player, player_id, "parry_success", stack_count)
         
         # Spawn milestone particles
-        if stack_count == 1:
-            self.spawn_particles(player, "stack_1", stack_count)
-            print(f"[CursedSword] Player {player_id}: Stack 1 particle effect")
-            
-        elif stack_count == 5:
-            self.spawn_particles(player, "stack_5", stack_count)
-            print(f"[CursedSword] Player {player_id}: Stack 5 milestone particles!")
-            
-        elif stack_count == 10:
-            self.spawn_particles(player, "stack_10", stack_count)
-            print(f"[CursedSword] Player {player_id}: MAX STACK 10 particle burst!")
+        milestone = self.stack_table[stack_count].particle_milestone
+        if milestone is not None:
+            self.effect_queue.push(
+                EFFECT_PARTICLE, player, player_id, milestone, stack_count,
+                priority=EFFECT_PRIORITY_MILESTONE
+            )
+        
+        log.debug("Player %s: Parry particles queued (milestone: %s)", player_id, milestone)
     
     def spawn_particles(self, player, effect_type, stack_count):
         """
@@ -444,10 +2370,10 @@ class CursedSwordMod:
             stack_count: Current stack count (affects particle scale/intensity)
         """
         try:
-            effect_id = self.particle_effects.get(effect_type, "cursed_sword_parry_burst")
+            effect_id = self.particle_effect_ids.get(effect_type, "cursed_sword_parry_burst")
             
-            # Scale particle intensity with stack count
-            particle_scale = 0.5 + (stack_count / self.max_stacks) * 1.0
+            # Scale and color come from the per-stack table
+            effects = self.stack_table[stack_count]
             
             # Get player position and spawn particles
             player_pos = player.get_position()
@@ -455,20 +2381,13 @@ class CursedSwordMod:
             player.spawn_particle_effect_at_location(
                 effect_id=effect_id,
                 location=player_pos,
-                scale=particle_scale,
-                lifetime=1.5,  # Duration in seconds
-                color_override={
-                    "r": 1.0,      # Orange
-                    "g": 0.55,
-                    "b": 0.0,
-                    "intensity": particle_scale
-                }
+                scale=effects.particle_scale,
+                lifetime=EFFECT_LIFETIMES[EFFECT_PARTICLE],  # Duration in seconds
+                color_override=effects.particle_color
             )
             
-            self.particle_active[player.get_id()] = True
-            
         except Exception as e:
-            print(f"[CursedSword] Error spawning particles: {e}")
+            log.warning("Error spawning particles: %s", e, key="spawn_particles_error")
     
     # ========================================================================
     # VISUAL EFFECTS - ORANGE GLOW
@@ -477,34 +2396,40 @@ class CursedSwordMod:
     def apply_orange_glow_effect(self, player, stack_count):
         """Apply orange glow to weapon"""
         player_id = player.get_id()
+        effects = self.stack_table[stack_count]
+        state = self.get_player_state(player_id)
         
-        glow_intensity = 0.3 + (stack_count / self.max_stacks) * 0.7
+        refresh_glow = getattr(player, "refresh_weapon_glow", None)
         
-        glow_color = {
-            "r": 1.0,
-            "g": 0.55,
-            "b": 0.0,
-            "intensity": glow_intensity
-        }
+        if (state.glow_active and refresh_glow is not None
+                and state.applied_glow_intensity == effects.glow_intensity):
+            refresh_glow(self.glow_effect_id, self.buff_duration)
+            return
         
         player.apply_weapon_glow(
             weapon_id=self.cursed_sword_weapon_id,
-            color=glow_color,
+            color=effects.glow_color,
             effect_id=self.glow_effect_id,
             duration=self.buff_duration
         )
         
-        self.glow_active[player_id] = True
+        state.glow_active = True
+        state.applied_glow_intensity = effects.glow_intensity
         
-        print(f"[CursedSword] Player {player_id}: Glow applied ({glow_intensity * 100:.0f}%)")
+        log.debug("Player %s: Glow applied (%.0f%%)", player_id, effects.glow_intensity * 100)
     
-    def remove_orange_glow(self, player):
+    def remove_orange_glow(self, player_id):
         """Remove glow effect"""
-        player_id = player.get_id()
+        state = self.players.get(player_id)
         
-        if self.glow_active.get(player_id, False):
-            player.remove_weapon_glow(self.glow_effect_id)
-            self.glow_active[player_id] = False
+        if state is not None and state.glow_active:
+            player = self.player_handles.get(player_id)
+            
+            if player:
+                player.remove_weapon_glow(self.glow_effect_id)
+            
+            state.glow_active = False
+            state.applied_glow_intensity = None
     
     # ========================================================================
     # UI COUNTER (POSITIONED WITH STATUS EFFECT ICONS)
@@ -517,106 +2442,200 @@ class CursedSwordMod:
         Position: Top-right area where buff icons display
         """
         player_id = player.get_id()
+        hud_text = self.stack_table[stack_count].hud_text
+        state = self.get_player_state(player_id)
         
-        damage_increase = (stack_count * 0.3)
-        stamina_increase = (stack_count * 0.5)
-        stance_increase = (stack_count * 0.2)
+        refresh_hud = getattr(player, "refresh_hud_element", None)
         
-        # Simple format for status icon area
-        ui_text = f"CURSE: [{stack_count:2d}/10]"
+        if (state.ui_counter_visible and refresh_hud is not None
+                and state.applied_hud_text == hud_text):
+            refresh_hud(HUD_COUNTER_ELEMENT_ID, self.buff_duration)
+            return
         
-        # Display as buff icon overlay
+        # Display as buff icon overlay (text preformatted per stack)
         player.display_hud_element(
-            text=ui_text,
+            text=hud_text,
             position="top_right_with_buffs",  # Positions with other buff icons
             duration=self.buff_duration,
             priority=100,
-            element_id="cursed_sword_stack_counter",
+            element_id=HUD_COUNTER_ELEMENT_ID,
             element_type="buff_counter",
-            icon_color={
-                "r": 1.0,
-                "g": 0.55,
-                "b": 0.0
-            }
+            icon_color=self.hud_icon_color
         )
         
-        self.ui_counter_visible[player_id] = True
+        state.ui_counter_visible = True
+        state.applied_hud_text = hud_text
         
-        print(f"[CursedSword] Player {player_id}: UI counter updated - [{stack_count}/10]")
+        log.debug("Player %s: UI counter updated - [%d/%d]", player_id, stack_count, self.max_stacks)
     
     def hide_ui_counter(self, player_id):
         """Hide the UI counter"""
-        if self.ui_counter_visible.get(player_id, False):
-            from game_manager import GameManager
-            game_manager = GameManager.get_instance()
-            player = game_manager.get_player(player_id)
+        state = self.players.get(player_id)
+        
+        if state is not None and state.ui_counter_visible:
+            player = self.player_handles.get(player_id)
             
             if player:
-                player.remove_hud_element("cursed_sword_stack_counter")
+                player.remove_hud_element(HUD_COUNTER_ELEMENT_ID)
             
-            self.ui_counter_visible[player_id] = False
+            state.ui_counter_visible = False
+            state.applied_hud_text = None
     
     # ========================================================================
     # SEAMLESS CO-OP INTEGRATION
     # ========================================================================
     
     def sync_parry_state(self, player_data):
-        """Sync parry state"""
-        player_id = player_data["id"]
-        stack_count = self.parry_stack_count.get(player_id, 0)
+        """
+        Seamless sync callback (any thread): the player's pending snapshot
         
-        return {
-            "mod": "CursedSword",
-            "action": "parry_executed",
-            "player_id": player_id,
-            "weapon_id": self.cursed_sword_weapon_id,
-            "stack_count": stack_count,
-            "buff_duration": self.buff_duration,
-            "timestamp": time.time(),
-        }
+        Returns SYNC_UNCHANGED if nothing changed since the last sync.
+        Snapshots are built on the update thread by prepare_sync_snapshots,
+        so this only hands one over.
+        """
+        return self.sync_payloads.pop(player_data["id"], SYNC_UNCHANGED)
     
-    def broadcast_weapon_swap(self, player, weapon_id):
-        """Broadcast weapon swap"""
-        sync_data = {
-            "mod": "CursedSword",
-            "action": "weapon_swap",
-            "player_id": player.get_id(),
-            "weapon_id": weapon_id,
-            "timestamp": time.time(),
-        }
+    def prepare_sync_snapshots(self):
+        """Encode a snapshot for every player whose stack count changed"""
+        sync_payloads = self.sync_payloads
         
-        seamless_hook.broadcast_to_session(sync_data)
+        for player_id, state in self.players.items():
+            stack_count = state.stack_count
+            
+            if stack_count == state.synced_stack_count and not state.sync_dirty:
+                continue
+            
+            state.synced_stack_count = stack_count
+            state.sync_dirty = False
+            sync_payloads[player_id] = self.outbox.snapshot(player_id, stack_count)
+    
+    def mark_sync_dirty(self, player_id=None):
+        """Force the next sync to resend (all players if None)"""
+        if player_id is not None:
+            state = self.players.get(player_id)
+            if state is not None:
+                state.sync_dirty = True
+            return
+        
+        for state in self.players.values():
+            state.sync_dirty = True
+    
+    def broadcast_weapon_swap(self, player, weapon_id, previous_weapon_id=None):
+        """Broadcast weapon swap (sent with the next batch)"""
+        self.outbox.queue_weapon_swap(player.get_id(), weapon_id, previous_weapon_id)
     
     def broadcast_parry_success(self, player, stack_count):
-        """Broadcast successful parry"""
-        sync_data = {
-            "mod": "CursedSword",
-            "action": "parry_success",
-            "player_id": player.get_id(),
-            "stack_count": stack_count,
-            "weapon_id": self.cursed_sword_weapon_id,
-            "buff_duration": self.buff_duration,
-            "timestamp": time.time(),
-        }
+        """Broadcast successful parry (sent with the next batch)"""
+        self.outbox.queue_parry_success(player.get_id(), stack_count)
+    
+    def flush_outbox(self):
+        """Send this tick's coalesced messages as one batch"""
+        if self.outbox:
+            self.outbox.flush(self.send_to_session)
+    
+    def send_to_session(self, payload, exclude_self=True):
+        seamless_hook.broadcast_to_session(payload, exclude_self=exclude_self)
+    
+    def queue_remote_parry(self, sync_data):
+        """Seamless Co-op network handler (any thread): handled on the next tick"""
+        # The hook may reuse its receive buffer once we return
+        if isinstance(sync_data, (bytearray, memoryview)):
+            sync_data = bytes(sync_data)
         
-        seamless_hook.broadcast_to_session(sync_data)
+        self.commands.post(self.handle_remote_parry, sync_data)
     
     def handle_remote_parry(self, sync_data):
-        """Handle remote parry events"""
-        remote_player_id = sync_data["player_id"]
-        action = sync_data["action"]
+        """Handle remote parry events (encoded batches or v2.2 dict messages)"""
+        if isinstance(sync_data, (bytes, bytearray, memoryview)):
+            try:
+                sender_id, channel, epoch, sequence, messages = decode_batch(sync_data)
+            except ValueError as e:
+                log.warning("Dropped CursedSword payload: %s", e, key="bad_payload")
+                return
+            
+            # Drop stale or duplicate batches per sender and channel; a new
+            # epoch means the sender restarted, so its sequence starts over
+            sender_key = (sender_id, channel)
+            last = self.remote_sequences.get(sender_key)
+            if last is not None and last[0] == epoch and not sequence_is_newer(sequence, last[1]):
+                self.remote_batches_dropped += 1
+                return
+            
+            if last is not None and last[0] != epoch:
+                log.debug("Sender %s restarted (epoch %d -> %d)", sender_id, last[0], epoch)
+            self.remote_sequences[sender_key] = (epoch, sequence, time.time())
+            
+            for message in messages:
+                self.handle_remote_message(message, sender_id)
+            return
+        
+        self.handle_remote_message(sync_data)
+    
+    def handle_remote_message(self, sync_data, sender_id=None):
+        """
+        Dispatch a single remote CursedSword message by action
+        
+        Batches and sync snapshots arrive over different paths, so a message
+        older than the one that last set the same replica field (same sender
+        clock) is skipped.
+        """
+        action = sync_data.get("action")
+        handler = self.remote_handlers.get(action)
+        
+        if handler is None:
+            return
+        
+        player_id = sync_data["player_id"]
+        replica = self.remote_players.get(player_id)
+        
+        if replica is None:
+            replica = RemotePlayerReplica()
+            self.remote_players[player_id] = replica
+        
+        replica.last_seen = time.time()
+        timestamp_ms = sync_data.get("timestamp_ms")
         
-        if action == "weapon_swap":
-            print(f"[CursedSword] Remote player {remote_player_id} swapped weapon")
+        if timestamp_ms is not None and sender_id is not None:
+            # Timestamps from different senders are on different clocks
+            if replica.sender_id != sender_id:
+                replica.sender_id = sender_id
+                replica.field_ms.clear()
+                replica.last_update_ms = None
             
-        elif action == "parry_success":
-            stack_count = sync_data.get("stack_count", 0)
-            print(f"[CursedSword] Remote player {remote_player_id} executed parry (Stack {stack_count})")
+            field = REMOTE_ACTION_FIELDS[action]
+            last_ms = replica.field_ms.get(field)
             
-        elif action == "mod_toggle":
-            enabled = sync_data.get("enabled", True)
-            status = "ENABLED" if enabled else "DISABLED"
-            print(f"[CursedSword] Remote player {remote_player_id} mod {status}")
+            if last_ms is not None and timestamp_is_older(timestamp_ms, last_ms):
+                self.remote_messages_dropped += 1
+                return
+            
+            replica.field_ms[field] = timestamp_ms
+        
+        last_update_ms = replica.last_update_ms
+        if timestamp_ms is None or last_update_ms is None or not timestamp_is_older(timestamp_ms, last_update_ms):
+            replica.last_update_ms = timestamp_ms
+        
+        handler(player_id, replica, sync_data)
+    
+    def on_remote_weapon_swap(self, player_id, replica, sync_data):
+        replica.weapon_id = sync_data.get("weapon_id")
+        log.debug("Remote player %s swapped weapon", player_id)
+    
+    def on_remote_parry_success(self, player_id, replica, sync_data):
+        replica.stack_count = sync_data.get("stack_count", 0)
+        log.debug("Remote player %s executed parry (Stack %d)", player_id, replica.stack_count)
+    
+    def on_remote_parry_executed(self, player_id, replica, sync_data):
+        replica.stack_count = sync_data.get("stack_count", 0)
+    
+    def on_remote_mod_toggle(self, player_id, replica, sync_data):
+        replica.enabled = sync_data.get("enabled", True)
+        status = "ENABLED" if replica.enabled else "DISABLED"
+        log.info("Remote player %s mod %s", player_id, status)
+    
+    def get_remote_state(self, player_id):
+        """Locally replicated state of a remote player, or None"""
+        return self.remote_players.get(player_id)
     
     # ========================================================================
     # MAIN LOOP
@@ -624,26 +2643,68 @@ class CursedSwordMod:
     
     def on_update(self, game_state):
         """Main update loop"""
+        now = time.time()
+        self.check_config_reload(now)
+        
+        # Network messages, hits and console commands posted since last tick
+        if self.commands:
+            self.commands.drain()
+        
+        self.expiry_scheduler.run_due(now)
+        
+        # Advance every in-progress swap/parry window, local or host-driven
+        if self.active_parries:
+            self.update_parries()
+        
+        self.process_local_input(game_state)
+        
+        # Sounds/particles requested this tick, within budget
+        self.play_queued_effects()
+        
+        # One batched network payload per tick
+        self.flush_outbox()
+        
+        # Snapshots for the Seamless sync cycle (picked up by sync_parry_state)
+        if self.seamless_enabled:
+            self.prepare_sync_snapshots()
+    
+    def process_local_input(self, game_state):
+        """Start a parry for the local player on parry input"""
         player = game_state.get_player()
         
         if player is None:
             return
         
         player_id = player.get_id()
+        self.player_handles.remember(player_id, player)
+        
+        if self.player_session_id is None:
+            self.player_session_id = player_id
+            self.outbox.sender_id = player_id
         
         if not self.is_mod_enabled_for_player(player_id):
+            self.buffered_parry_at = None
+            return
+        
+        now = time.time()
+        
+        if not self.poll_parry_press(now):
+            return
+        
+        # Drop buffered presses that are too old to act on
+        if now - self.buffered_parry_at > self.input_buffer_window:
+            self.buffered_parry_at = None
             return
         
-        input_type = self.detect_input_type()
+        # Parry still in progress for the local player: keep the press buffered
+        if player_id in self.active_parries:
+            return
         
-        if self.detect_input(input_type):
-            self.swap_to_cursed_sword(player)
-            time.sleep(0.1)
-            self.execute_parry(player)
+        self.buffered_parry_at = None
+        self.begin_parry(player)
     
     def detect_input_type(self):
         """Detect input type"""
-        from input_manager import InputManager
         return InputManager.get_active_input_type()
     
     # ========================================================================
@@ -652,31 +2713,37 @@ class CursedSwordMod:
     
     def get_player_stats(self, player_id):
         """Get player stats"""
-        stack_count = self.parry_stack_count.get(player_id, 0)
-        time_until_expiry = max(0, self.buff_expiry_time.get(player_id, 0) - time.time())
+        state = self.players.get(player_id)
+        
+        if state is None:
+            state = PlayerState(self.default_enabled)
+        
+        time_until_expiry = max(0, state.buff_expiry_time - time.time())
         
         return {
-            "mod_enabled": self.is_mod_enabled_for_player(player_id),
-            "parry_stacks": stack_count,
+            "mod_enabled": state.enabled,
+            "parry_stacks": state.stack_count,
             "max_stacks": self.max_stacks,
-            "glow_active": self.glow_active.get(player_id, False),
+            "glow_active": state.glow_active,
             "time_until_expiry": f"{time_until_expiry:.1f}s",
-            "ui_counter_visible": self.ui_counter_visible.get(player_id, False),
-            "particle_effects_active": self.particle_active.get(player_id, False),
+            "ui_counter_visible": state.ui_counter_visible,
+            "particle_effects_active": self.effect_queue.live_count(player_id) > 0,
         }
     
     def reset_player_stacks(self, player_id):
         """Reset stacks for a player"""
-        self.parry_stack_count[player_id] = 0
+        self.get_player_state(player_id).stack_count = 0
         self.hide_ui_counter(player_id)
+        self.remove_orange_glow(player_id)
         
-        from game_manager import GameManager
-        game_manager = GameManager.get_instance()
-        player = game_manager.get_player(player_id)
-        if player:
-            self.remove_orange_glow(player)
-        
-        print(f"[CursedSword] Player {player_id}: Stacks reset to 0")
+        log.info("Player %s: Stacks reset to 0", player_id)
+    
+    def set_perf_enabled(self, enabled):
+        """Turn hot-path timing on/off (no overhead while off)"""
+        if enabled:
+            self.perf.enable(self)
+        else:
+            self.perf.disable()
     
     def get_mod_info(self):
         """Get mod information"""
@@ -702,24 +2769,38 @@ class CursedSwordMod:
 # INITIALIZATION
 # ============================================================================
 
-cursed_sword_mod = CursedSwordMod()
+# Created by mod_init so importing this module does no I/O
+cursed_sword_mod = None
 
 def mod_init():
     """Entry point for Mod Engine 2"""
+    global cursed_sword_mod
+    
+    bind_engine_modules()
+    
+    if cursed_sword_mod is None:
+        cursed_sword_mod = CursedSwordMod()
+    
     cursed_sword_mod.initialize()
     print(cursed_sword_mod.get_mod_info())
 
 def mod_update(game_state):
     """Update hook"""
-    cursed_sword_mod.on_update(game_state)
+    if cursed_sword_mod is not None:
+        cursed_sword_mod.on_update(game_state)
 
 def mod_command(command, args):
     """Handle console commands"""
+    if cursed_sword_mod is None:
+        print("[CursedSword] Mod not initialized yet")
+        return
+    
     player = args.get("player")
     
+    # State changes are applied on the update thread (next tick)
     if command == "toggle":
         player_id = player.get_id()
-        cursed_sword_mod.toggle_mod_for_player(player_id)
+        cursed_sword_mod.commands.post(cursed_sword_mod.toggle_mod_for_player, player_id)
         
     elif command == "stats":
         player_id = player.get_id()
@@ -728,9 +2809,13 @@ def mod_command(command, args):
         for key, value in stats.items():
             print(f"  {key}: {value}")
         
+        cache = cursed_sword_mod.player_handles.stats()
+        print(f"  player_handle_cache: {cache['cached']} cached, {cache['hits']} hits, "
+              f"{cache['misses']} misses ({cache['hit_rate']})")
+        
     elif command == "reset":
         player_id = player.get_id()
-        cursed_sword_mod.reset_player_stacks(player_id)
+        cursed_sword_mod.commands.post(cursed_sword_mod.reset_player_stacks, player_id)
         
     elif command == "info":
         info = cursed_sword_mod.get_mod_info()
@@ -742,3 +2827,38 @@ def mod_command(command, args):
                     print(f"    - {item}")
             else:
                 print(f"  {key}: {value}")
+    
+    elif command == "log":
+        level_name = args.get("level")
+        if level_name:
+            levels = {name.lower(): level for level, name in LOG_LEVEL_NAMES.items()}
+            level = levels.get(str(level_name).lower())
+            if level is not None:
+                log.level = level
+                log.console_level = max(level, LOG_INFO)
+        
+        log.flush()
+        lines = log.dump(args.get("count", 20))
+        print(f"\n[CursedSword] Recent log ({LOG_LEVEL_NAMES[log.level]}, {log.suppressed} rate-limited):")
+        for line in lines:
+            print(f"  {line}")
+    
+    elif command == "perf":
+        action = args.get("action", "show")
+        perf = cursed_sword_mod.perf
+        
+        if action in ("on", "off"):
+            cursed_sword_mod.commands.post(cursed_sword_mod.set_perf_enabled, action == "on")
+            print(f"[CursedSword] Perf monitor {action}")
+        elif action == "reset":
+            cursed_sword_mod.commands.post(perf.reset)
+            print("[CursedSword] Perf histograms reset")
+        elif action == "dump":
+            path = args.get("path", "cursed_sword_perf.json")
+            perf.dump(path)
+            print(f"[CursedSword] Perf histograms written to {path}")
+        else:
+            state = "on" if perf.enabled else "off"
+            print(f"\n[CursedSword] Perf ({state}):")
+            for line in perf.report():
+                print(line)
@@ -1,3 +1,8 @@
+import bisect
+import hashlib
+import json
+import marshal
+import mmap
 import struct
 import shutil
 import os
@@ -6,162 +11,735 @@ import os
 # REGULATION.BIN PATCHER v2.2
 # ============================================================================
 
-class RegulationPatcher:
-    def __init__(self, regulation_path):
-        self.regulation_path = regulation_path
-        self.backup_path = regulation_path + ".backup"
-        
-    def patch_regulation(self):
-        """Patch regulation.bin"""
-        print("[Regulation] Creating backup...")
+# mmap.flush offsets must be aligned to this (a multiple of the page size)
+FLUSH_ALIGNMENT = mmap.ALLOCATIONGRANULARITY
+
+MOD_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(MOD_DIR, "config.json")
+INDEX_CACHE_PATH = os.path.join(MOD_DIR, ".cursed_sword_cache", "param_index.marshal")
+
+
+def page_ranges(ranges, alignment=FLUSH_ALIGNMENT):
+    """Merge (offset, size) byte ranges into sorted, aligned (offset, size) page spans"""
+    spans = []
+    
+    for offset, size in sorted(ranges):
+        start = offset - offset % alignment
+        end = offset + size
         
-        if not os.path.exists(self.backup_path):
-            shutil.copy(self.regulation_path, self.backup_path)
-            print(f"[Regulation] Backup created: {self.backup_path}")
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
         else:
-            print(f"[Regulation] Backup already exists")
+            spans.append([start, end])
+    
+    return [(start, end - start) for start, end in spans]
+
+
+# ============================================================================
+# PATCH SPEC (one table; overridable via "regulation_patches" in config.json)
+# ============================================================================
+
+# Param table -> (base offset, row size)
+PARAM_TABLES = {
+    "weapon": (0x2A0000, 0x100),
+    "ash_of_war": (0x450000, 0x80),
+    "vfx": (0x600000, 0x40),
+    "ui": (0x700000, 0x20),
+}
+
+# Field type -> struct format character (all little-endian)
+FIELD_TYPES = {
+    "u8": "B",
+    "i8": "b",
+    "u16": "H",
+    "i16": "h",
+    "u32": "I",
+    "i32": "i",
+    "f32": "f",
+}
+
+# (param, row id, field offset, type, value)
+DEFAULT_PATCH_SPEC = (
+    # Hand of Malenia: S-tier DEX scaling, 20 DEX requirement
+    ("weapon", 32, 0x34, "u8", 75),
+    ("weapon", 32, 0x2E, "u8", 20),
+    
+    # Parry Ash of War: type, no FP/HP cost, 5 stamina, parry animation
+    ("ash_of_war", 100, 0x00, "u8", 5),
+    ("ash_of_war", 100, 0x04, "u32", 0),
+    ("ash_of_war", 100, 0x08, "u32", 0),
+    ("ash_of_war", 100, 0x0C, "u32", 5),
+    ("ash_of_war", 100, 0x10, "u32", 0x00000001),
+    
+    # Orange glow: RGB + intensity
+    ("vfx", 200, 0x00, "f32", 1.0),
+    ("vfx", 200, 0x04, "f32", 0.55),
+    ("vfx", 200, 0x08, "f32", 0.0),
+    ("vfx", 200, 0x0C, "f32", 0.5),
+    
+    # UI counter: enabled, RGB text color, screen position
+    ("ui", 300, 0x00, "u8", 1),
+    ("ui", 300, 0x04, "f32", 1.0),
+    ("ui", 300, 0x08, "f32", 0.55),
+    ("ui", 300, 0x0C, "f32", 0.0),
+    ("ui", 300, 0x10, "f32", 0.75),
+    ("ui", 300, 0x14, "f32", 0.05),
+)
+
+PATCH_ROW_LABELS = {
+    ("weapon", 32): "Hand of Malenia",
+    ("ash_of_war", 100): "Parry Ash of War",
+    ("vfx", 200): "Orange glow",
+    ("ui", 300): "UI counter",
+}
+
+
+class PatchOp:
+    """One precompiled write: adjacent fields of a row packed by a single Struct"""
+    
+    __slots__ = ("param", "row_id", "offset", "struct", "values", "packed", "fields")
+    
+    def __init__(self, param, row_id, offset, fmt, values):
+        self.param = param
+        self.row_id = row_id
+        self.offset = offset
+        self.struct = struct.Struct("<" + fmt)
+        self.values = tuple(values)
+        self.packed = self.struct.pack(*self.values)
+        self.fields = len(self.values)
+    
+    @property
+    def size(self):
+        return self.struct.size
+    
+    @property
+    def label(self):
+        return PATCH_ROW_LABELS.get((self.param, self.row_id), f"{self.param} row {self.row_id}")
+
+
+def stride_row_offset(tables):
+    """Row locator for flat tables: base + row_id * row_size"""
+    def row_offset(param, row_id):
+        base_offset, row_size = tables[param]
+        return base_offset + row_id * row_size
+    return row_offset
+
+
+def compile_patch_spec(spec, tables=PARAM_TABLES, row_offset=None):
+    """
+    Compile spec rows into PatchOps sorted by file offset
+    
+    row_offset(param, row_id) locates a row's data (default: fixed stride
+    from PARAM_TABLES, see ParamLayout for header-indexed tables). Runs of
+    adjacent fields in the same row are merged into one Struct, so
+    applying or verifying a run is a single pack_into / compare. Raises
+    ValueError for unknown params/types, fields outside their row,
+    overlapping fields and values that do not fit their type.
+    """
+    if row_offset is None:
+        row_offset = stride_row_offset(tables)
+    
+    fields = []
+    
+    for param, row_id, field_offset, field_type, value in spec:
+        if param not in tables:
+            raise ValueError(f"unknown param table {param!r}")
+        if field_type not in FIELD_TYPES:
+            raise ValueError(f"{param} row {row_id}: unknown field type {field_type!r}")
         
-        with open(self.regulation_path, 'r+b') as f:
-            data = bytearray(f.read())
-            
-            print("[Regulation] Modifying Hand of Malenia...")
-            self.modify_hand_of_malenia(data)
-            
-            print("[Regulation] Creating parry Ash of War...")
-            self.create_parry_ash(data)
-            
-            print("[Regulation] Setting up orange glow...")
-            self.setup_glow_effect(data)
-            
-            print("[Regulation] Configuring UI counter...")
-            self.setup_ui_counter_effect(data)
-            
-            f.seek(0)
-            f.write(data)
+        row_size = tables[param][1]
+        fmt = FIELD_TYPES[field_type]
+        size = struct.calcsize("<" + fmt)
         
-        print("[Regulation] ✓ Patching complete!")
+        if field_offset < 0 or field_offset + size > row_size:
+            raise ValueError(f"{param} row {row_id}: field 0x{field_offset:X} outside row size 0x{row_size:X}")
+        
+        try:
+            struct.pack("<" + fmt, value)
+        except struct.error as e:
+            raise ValueError(f"{param} row {row_id} field 0x{field_offset:X}: {e}") from None
+        
+        offset = row_offset(param, row_id) + field_offset
+        fields.append((offset, size, param, row_id, fmt, value))
     
-    def modify_hand_of_malenia(self, data):
-        """Modify Hand of Malenia stats"""
-        WEAPON_BASE_OFFSET = 0x2A0000
-        weapon_size = 0x100
-        weapon_offset = WEAPON_BASE_OFFSET + (32 * weapon_size)
+    fields.sort(key=lambda field: field[0])
+    
+    ops = []
+    run = None
+    
+    for offset, size, param, row_id, fmt, value in fields:
+        if run is not None and offset < run["end"]:
+            raise ValueError(f"{param} row {row_id}: field at 0x{offset:X} overlaps another field")
         
-        DEX_SCALING_OFFSET = weapon_offset + 0x34
-        data[DEX_SCALING_OFFSET] = 75
+        if run is not None and offset == run["end"] and (param, row_id) == run["row"]:
+            run["fmt"] += fmt
+            run["values"].append(value)
+            run["end"] += size
+            continue
         
-        MIN_DEX_OFFSET = weapon_offset + 0x2E
-        data[MIN_DEX_OFFSET] = 20
+        if run is not None:
+            ops.append(PatchOp(*run["row"], run["offset"], run["fmt"], run["values"]))
         
-        print("[Regulation] ✓ Hand of Malenia: S-tier DEX, 20 dex requirement")
+        run = {"row": (param, row_id), "offset": offset, "end": offset + size,
+               "fmt": fmt, "values": [value]}
+    
+    if run is not None:
+        ops.append(PatchOp(*run["row"], run["offset"], run["fmt"], run["values"]))
+    
+    return ops
+
+
+# ============================================================================
+# PARAM ROW INDEX (row id -> offset from the table's PARAM header)
+# ============================================================================
+#
+# PARAM header (0x30 bytes, 0x40 when format2D has data-offset flags):
+#   0x0A u16 row count | 0x2C u8 0xFF if big-endian | 0x2D u8 format2D
+# Followed by one entry per row, sorted by id:
+#   format2D & 0x04: u32 id | u32 pad | u64 data offset | u64 name offset
+#   otherwise:       u32 id | u32 data offset | u32 name offset
+# Data offsets are relative to the start of the table.
+
+PARAM_HEADER_SIZE = 0x40
+PARAM_LONG_OFFSETS = 0x04
+PARAM_MAX_ROWS = 0x10000
+
+
+def parse_param_index(read, base_offset, row_size, file_size):
+    """
+    Parse the PARAM header at base_offset into (ids, data_offsets)
+    
+    Returns None when the bytes there are not a plausible PARAM table
+    (no rows, entries out of range or ids not strictly ascending).
+    """
+    header = read(base_offset, PARAM_HEADER_SIZE)
+    if len(header) < PARAM_HEADER_SIZE:
+        return None
+    
+    endian = ">" if header[0x2C] == 0xFF else "<"
+    format2d = header[0x2D]
+    row_count = struct.unpack_from(endian + "H", header, 0x0A)[0]
+    
+    if not 0 < row_count <= PARAM_MAX_ROWS:
+        return None
+    
+    if format2d & PARAM_LONG_OFFSETS:
+        entry = struct.Struct(endian + "I4xQ8x")
+        entries_start = 0x40
+    else:
+        entry = struct.Struct(endian + "II4x")
+        entries_start = 0x40 if format2d & 0x03 == 0x03 else 0x30
+    
+    entries_end = base_offset + entries_start + row_count * entry.size
+    if entries_end > file_size:
+        return None
+    
+    table = read(base_offset + entries_start, row_count * entry.size)
+    ids = []
+    offsets = []
+    
+    for row_id, data_offset in entry.iter_unpack(table):
+        if ids and row_id <= ids[-1]:
+            return None
+        if data_offset < entries_end - base_offset or base_offset + data_offset + row_size > file_size:
+            return None
+        ids.append(row_id)
+        offsets.append(data_offset)
+    
+    return tuple(ids), tuple(offsets)
+
+
+class ParamLayout:
+    """
+    Locates rows in regulation.bin
+    
+    Each table's PARAM header is parsed on first use (or taken from the
+    on-disk cache) and searched by row id; tables without a header fall
+    back to base + row_id * row_size.
+    """
+    
+    def __init__(self, read, file_size, tables, indexes=None, reported=None):
+        self.read = read
+        self.file_size = file_size
+        self.tables = tables
+        self.indexes = dict(indexes or {})   # base offset -> (ids, offsets) or None
+        self.parsed = False
+        self.reported = set() if reported is None else reported   # params already warned about
     
-    def create_parry_ash(self, data):
-        """Create custom Parry Ash of War"""
-        ASH_BASE_OFFSET = 0x450000
-        ash_size = 0x80
-        ash_offset = ASH_BASE_OFFSET + (100 * ash_size)
+    def index(self, param):
+        base_offset, row_size = self.tables[param]
         
-        ASH_TYPE_OFFSET = ash_offset + 0x00
-        data[ASH_TYPE_OFFSET] = 5
+        if base_offset not in self.indexes:
+            self.indexes[base_offset] = parse_param_index(self.read, base_offset, row_size, self.file_size)
+            self.parsed = True
         
-        FP_COST_OFFSET = ash_offset + 0x04
-        struct.pack_into('<I', data, FP_COST_OFFSET, 0)
+        index = self.indexes[base_offset]
         
-        HP_COST_OFFSET = ash_offset + 0x08
-        struct.pack_into('<I', data, HP_COST_OFFSET, 0)
+        if index is None and param not in self.reported:
+            self.reported.add(param)
+            print(f"[Regulation] {param}: no PARAM header at 0x{base_offset:X}, using fixed row offsets")
         
-        STAMINA_COST_OFFSET = ash_offset + 0x0C
-        struct.pack_into('<I', data, STAMINA_COST_OFFSET, 5)
+        return index
+    
+    def row_offset(self, param, row_id):
+        index = self.index(param)
+        base_offset, row_size = self.tables[param]
+        
+        if index is None:
+            return base_offset + row_id * row_size
+        
+        ids, offsets = index
+        position = bisect.bisect_left(ids, row_id)
         
-        ANIMATION_ID_OFFSET = ash_offset + 0x10
-        struct.pack_into('<I', data, ANIMATION_ID_OFFSET, 0x00000001)
+        if position == len(ids) or ids[position] != row_id:
+            raise ValueError(f"{param}: row {row_id} not found in PARAM table at 0x{base_offset:X}")
         
-        print("[Regulation] ✓ Parry Ash of War created")
+        return base_offset + offsets[position]
     
-    def setup_glow_effect(self, data):
-        """Setup orange glow effect"""
-        VFX_BASE_OFFSET = 0x600000
-        vfx_size = 0x40
-        vfx_offset = VFX_BASE_OFFSET + (200 * vfx_size)
+    def header_ranges(self):
+        """(offset, size) of every parsed header + row table (never patched)"""
+        ranges = []
         
-        R_OFFSET = vfx_offset + 0x00
-        struct.pack_into('<f', data, R_OFFSET, 1.0)
+        for base_offset, index in self.indexes.items():
+            if index is not None:
+                ranges.append((base_offset, min(index[1])))
         
-        G_OFFSET = vfx_offset + 0x04
-        struct.pack_into('<f', data, G_OFFSET, 0.55)
+        return ranges
+
+
+def file_sha256(f, chunk_size=1 << 20):
+    """SHA-256 of an open binary file, read in chunks"""
+    digest = hashlib.sha256()
+    f.seek(0)
+    
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+        digest.update(chunk)
+    
+    return digest.hexdigest()
+
+
+def copy_file_sha256(source_path, target_path, chunk_size=1 << 20):
+    """Copy a file (contents + mode) and return the SHA-256 of what was copied"""
+    digest = hashlib.sha256()
+    tmp_path = target_path + ".tmp"
+    
+    with open(source_path, 'rb') as source, open(tmp_path, 'wb') as target:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            digest.update(chunk)
+            target.write(chunk)
+    
+    shutil.copymode(source_path, tmp_path)
+    os.replace(tmp_path, target_path)
+    return digest.hexdigest()
+
+
+def region_sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ParamIndexCache:
+    """
+    Parsed row indexes on disk, keyed by the regulation file's SHA-256
+    
+    Each entry also remembers (path, size, mtime_ns) stamps it was seen
+    with, so an untouched file is matched without hashing it again.
+    """
+    
+    VERSION = 1
+    MAX_ENTRIES = 8
+    
+    def __init__(self, path=INDEX_CACHE_PATH):
+        self.path = path
+        self.entries = None
+    
+    def _load(self):
+        if self.entries is not None:
+            return self.entries
         
-        B_OFFSET = vfx_offset + 0x08
-        struct.pack_into('<f', data, B_OFFSET, 0.0)
+        self.entries = {}
+        try:
+            with open(self.path, 'rb') as f:
+                data = marshal.load(f)
+            if data.get("version") == self.VERSION:
+                self.entries = data["files"]
+        except (OSError, EOFError, ValueError, TypeError, AttributeError, KeyError):
+            pass
         
-        INTENSITY_OFFSET = vfx_offset + 0x0C
-        struct.pack_into('<f', data, INTENSITY_OFFSET, 0.5)
+        return self.entries
+    
+    def _save(self):
+        entries = self.entries
+        while len(entries) > self.MAX_ENTRIES:
+            del entries[next(iter(entries))]
         
-        print("[Regulation] ✓ Orange glow effect configured")
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                marshal.dump({"version": self.VERSION, "files": entries}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[Regulation] Could not write index cache: {e}")
     
-    def setup_ui_counter_effect(self, data):
-        """Setup UI counter system"""
-        UI_BASE_OFFSET = 0x700000
-        ui_size = 0x20
-        ui_offset = UI_BASE_OFFSET + (300 * ui_size)
+    @staticmethod
+    def stamp(path):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    
+    def lookup(self, path, f):
+        """(file key, cached indexes or None) for an open regulation file"""
+        entries = self._load()
+        stamp = self.stamp(path)
         
-        TEXT_ENABLED_OFFSET = ui_offset + 0x00
-        data[TEXT_ENABLED_OFFSET] = 1
+        for key, entry in entries.items():
+            if stamp in entry["stamps"]:
+                return key, entry["params"]
         
-        TEXT_COLOR_R = ui_offset + 0x04
-        struct.pack_into('<f', data, TEXT_COLOR_R, 1.0)
+        key = file_sha256(f)
+        entry = entries.get(key)
         
-        TEXT_COLOR_G = ui_offset + 0x08
-        struct.pack_into('<f', data, TEXT_COLOR_G, 0.55)
+        if entry is None:
+            return key, None
         
-        TEXT_COLOR_B = ui_offset + 0x0C
-        struct.pack_into('<f', data, TEXT_COLOR_B, 0.0)
+        entry["stamps"].append(stamp)
+        self._save()
+        return key, entry["params"]
+    
+    def store(self, key, path, params):
+        entry = self._load().setdefault(key, {"stamps": [], "params": {}})
+        entry["params"] = params
         
-        TEXT_POS_X = ui_offset + 0x10
-        struct.pack_into('<f', data, TEXT_POS_X, 0.75)
+        stamp = self.stamp(path)
+        if stamp not in entry["stamps"]:
+            entry["stamps"].append(stamp)
+        self._save()
+    
+    def add_stamp(self, key, path):
+        """Record that key's indexes still hold for path as it is now (after patching)"""
+        entry = self._load().get(key)
+        if entry is not None:
+            self.store(key, path, entry["params"])
+
+
+# ============================================================================
+# PATCH MANIFEST (region hashes before/after, written next to regulation.bin)
+# ============================================================================
+
+MANIFEST_VERSION = 1
+
+
+def spec_digest(spec, tables):
+    """Identifies a patch spec + table layout (changes when config.json's patches change)"""
+    rows = sorted((str(param), int(row_id), int(field_offset), str(field_type), repr(value))
+                  for param, row_id, field_offset, field_type, value in spec)
+    layout = sorted((str(name), int(base), int(size)) for name, (base, size) in tables.items())
+    return hashlib.sha256(repr((rows, layout)).encode("utf-8")).hexdigest()
+
+
+def load_manifest(path):
+    """Manifest dict, or None if missing/unreadable/from another version"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(path, manifest):
+    manifest["version"] = MANIFEST_VERSION
+    tmp_path = path + ".tmp"
+    
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def parse_int(value):
+    """Accept ints or strings like "0x2A0000" from JSON"""
+    return value if isinstance(value, int) else int(str(value), 0)
+
+
+def load_patch_spec(config_path=CONFIG_PATH):
+    """
+    (spec, tables) from config.json's "regulation_patches" section
+    
+    Missing file/section/keys fall back to DEFAULT_PATCH_SPEC and
+    PARAM_TABLES; "params" entries extend or override the default tables.
+    """
+    if not os.path.exists(config_path):
+        return DEFAULT_PATCH_SPEC, PARAM_TABLES
+    
+    with open(config_path, 'r', encoding='utf-8') as f:
+        section = json.load(f).get("regulation_patches") or {}
+    
+    tables = dict(PARAM_TABLES)
+    for name, table in section.get("params", {}).items():
+        tables[name] = (parse_int(table["base_offset"]), parse_int(table["row_size"]))
+    
+    fields = section.get("fields")
+    if not fields:
+        return DEFAULT_PATCH_SPEC, tables
+    
+    spec = [
+        (param, parse_int(row_id), parse_int(field_offset), field_type, value)
+        for param, row_id, field_offset, field_type, value in fields
+    ]
+    return spec, tables
+
+
+class RegulationPatcher:
+    def __init__(self, regulation_path, use_mmap=True, spec=DEFAULT_PATCH_SPEC, tables=PARAM_TABLES,
+                 index_cache_path=INDEX_CACHE_PATH):
+        self.regulation_path = regulation_path
+        self.backup_path = regulation_path + ".backup"
+        self.manifest_path = regulation_path + ".cursed_sword.json"
+        self.use_mmap = use_mmap
+        self.spec = spec
+        self.tables = tables
+        self.spec_digest = spec_digest(spec, tables)
+        self.index_cache = ParamIndexCache(index_cache_path) if index_cache_path else None
+        self.file_key = None
+        self._reported = set()
+        
+        # Validated against the fixed-stride layout; re-resolved per file by locate_rows
+        self.ops = compile_patch_spec(spec, tables)
+        self.field_count = sum(op.fields for op in self.ops)
+    
+    def locate_rows(self, f, read):
+        """Resolve every spec row through the file's PARAM headers (cached by file hash)"""
+        file_size = os.fstat(f.fileno()).st_size
+        indexes = None
+        
+        if self.index_cache is not None:
+            self.file_key, indexes = self.index_cache.lookup(self.regulation_path, f)
         
-        TEXT_POS_Y = ui_offset + 0x14
-        struct.pack_into('<f', data, TEXT_POS_Y, 0.05)
+        layout = ParamLayout(read, file_size, self.tables, indexes, self._reported)
+        self.ops = compile_patch_spec(self.spec, self.tables, layout.row_offset)
         
-        print("[Regulation] ✓ UI counter configured")
+        for op in self.ops:
+            for start, size in layout.header_ranges():
+                if op.offset < start + size and start < op.offset + op.size:
+                    raise ValueError(f"{op.label}: field at 0x{op.offset:X} overlaps a PARAM header")
+        
+        if layout.parsed and self.index_cache is not None:
+            self.index_cache.store(self.file_key, self.regulation_path, layout.indexes)
+        
+        required_size = max((op.offset + op.size for op in self.ops), default=0)
+        if file_size < required_size:
+            raise ValueError(f"{self.regulation_path} is smaller than the patched range (0x{required_size:X} bytes)")
     
-    def verify_patch(self):
-        """Verify patch was successful"""
-        print("\n[Regulation] Verifying patch...")
+    def patch_regulation(self):
+        """
+        Patch regulation.bin (skipped when it is already patched)
+        
+        Returns True if the file was written. The backup is created on the
+        first run and refreshed only when the game replaced the file.
+        """
+        manifest = load_manifest(self.manifest_path)
+        
+        # Unchanged since we patched it: nothing to read or write
+        if (manifest is not None and manifest.get("spec") == self.spec_digest
+                and manifest.get("patched_stamp") == file_stamp(self.regulation_path)):
+            print("[Regulation] ✓ Already patched (unchanged since last run)")
+            return False
         
         with open(self.regulation_path, 'rb') as f:
-            data = bytearray(f.read())
-            
-            WEAPON_BASE_OFFSET = 0x2A0000
-            weapon_offset = WEAPON_BASE_OFFSET + (32 * 0x100)
-            DEX_SCALING_OFFSET = weapon_offset + 0x34
-            
-            dex_scaling = data[DEX_SCALING_OFFSET]
-            
-            if dex_scaling == 75:
-                print("  ✓ Hand of Malenia verified")
-            else:
-                return False
+            data = self._map(f, mmap.ACCESS_READ)
+            read = self._reader(f, data)
             
-            ASH_BASE_OFFSET = 0x450000
-            ash_offset = ASH_BASE_OFFSET + (100 * 0x80)
-            ash_type = data[ash_offset + 0x00]
+            try:
+                self.locate_rows(f, read)
+                current = [region_sha256(read(op.offset, op.size)) for op in self.ops]
+                after = [region_sha256(op.packed) for op in self.ops]
+                
+                if current == after:
+                    print("[Regulation] ✓ Already patched (region checksums match)")
+                    self._write_manifest(manifest, after)
+                    return False
+                
+                print("[Regulation] Checking backup...")
+                self.refresh_backup(f, read, manifest, current, after)
+            finally:
+                if data is not None:
+                    data.close()
+        
+        with open(self.regulation_path, 'r+b') as f:
+            data = self._map(f, mmap.ACCESS_WRITE)
             
-            if ash_type == 5:
-                print("  ✓ Parry Ash verified")
-            else:
-                return False
+            if data is None:
+                data = bytearray(f.read())
             
-            VFX_BASE_OFFSET = 0x600000
-            vfx_offset = VFX_BASE_OFFSET + (200 * 0x40)
-            glow_r = struct.unpack_from('<f', data, vfx_offset + 0x00)[0]
+            try:
+                self.locate_rows(f, lambda offset, size: bytes(data[offset:offset + size]))
+                self.apply_patches(data)
+                
+                if isinstance(data, mmap.mmap):
+                    # Only the pages holding patched fields are written back
+                    for offset, size in page_ranges((op.offset, op.size) for op in self.ops):
+                        data.flush(offset, size)
+                else:
+                    f.seek(0)
+                    f.write(data)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+        
+        # Only row data was written, so the cached indexes still hold
+        if self.index_cache is not None and self.file_key is not None:
+            self.index_cache.add_stamp(self.file_key, self.regulation_path)
+        
+        self._write_manifest(load_manifest(self.manifest_path), after)
+        
+        print("[Regulation] ✓ Patching complete!")
+        return True
+    
+    def refresh_backup(self, f, read, manifest, current, after):
+        """
+        Create or refresh the backup of an unpatched/partially patched file
+        
+        The backup is kept when the file is the backed-up original, our
+        earlier patch of it (older spec or interrupted run), and replaced
+        when anything else - a game update - is found.
+        """
+        if not os.path.exists(self.backup_path):
+            self._write_backup(manifest)
+            print(f"[Regulation] Backup created: {self.backup_path}")
+            return
+        
+        backup_sha = manifest.get("backup_sha256") if manifest else None
+        if backup_sha is None:
+            with open(self.backup_path, 'rb') as backup:
+                backup_sha = file_sha256(backup)
+        
+        if file_sha256(f) == backup_sha:
+            print("[Regulation] Backup matches the current file")
+            return
+        
+        # Still our patch from a previous spec?
+        if manifest and manifest.get("regions") and all(
+            region_sha256(read(offset, size)) == after_sha
+            for offset, size, _, after_sha in manifest["regions"]
+        ):
+            print("[Regulation] Backup kept (file holds an earlier patch)")
+            return
+        
+        # Interrupted patch: every region is either original or patched
+        with open(self.backup_path, 'rb') as backup:
+            before = []
+            for op in self.ops:
+                backup.seek(op.offset)
+                before.append(region_sha256(backup.read(op.size)))
+        
+        states = [
+            "after" if current_sha == after_sha else "before" if current_sha == before_sha else "other"
+            for current_sha, after_sha, before_sha in zip(current, after, before)
+        ]
+        
+        if "other" not in states and "after" in states:
+            print("[Regulation] Backup kept (file is partially patched)")
+            return
+        
+        self._write_backup(manifest)
+        print(f"[Regulation] regulation.bin was replaced (game update?), backup refreshed: {self.backup_path}")
+    
+    def _write_backup(self, manifest):
+        backup_sha = copy_file_sha256(self.regulation_path, self.backup_path)
+        
+        manifest = manifest or {}
+        manifest["backup_sha256"] = backup_sha
+        manifest["regions"] = []
+        manifest.pop("patched_stamp", None)
+        save_manifest(self.manifest_path, manifest)
+    
+    def _write_manifest(self, manifest, after):
+        """Record region hashes (before from the backup, after from the spec) and the file stamp"""
+        manifest = manifest or {}
+        regions = []
+        
+        if os.path.exists(self.backup_path):
+            with open(self.backup_path, 'rb') as backup:
+                for op, after_sha in zip(self.ops, after):
+                    backup.seek(op.offset)
+                    regions.append([op.offset, op.size, region_sha256(backup.read(op.size)), after_sha])
+        
+        manifest["spec"] = self.spec_digest
+        manifest["regions"] = regions
+        manifest["patched_stamp"] = file_stamp(self.regulation_path)
+        save_manifest(self.manifest_path, manifest)
+    
+    def _reader(self, f, data):
+        """read(offset, size) over a read-only map, or seek/read without one"""
+        if data is None:
+            def read(offset, size):
+                f.seek(offset)
+                return f.read(size)
+        else:
+            def read(offset, size):
+                return data[offset:offset + size]
+        return read
+    
+    def apply_patches(self, data):
+        """Apply every compiled op to a writable buffer (bytearray or mmap)"""
+        patched_rows = {}
+        
+        for op in self.ops:
+            op.struct.pack_into(data, op.offset, *op.values)
+            patched_rows[op.label] = patched_rows.get(op.label, 0) + op.fields
+        
+        for label, fields in patched_rows.items():
+            print(f"[Regulation] ✓ {label}: {fields} fields")
+    
+    def _map(self, f, access):
+        """Memory-map an open file, or None to fall back to a full read"""
+        if not self.use_mmap:
+            return None
+        
+        try:
+            return mmap.mmap(f.fileno(), 0, access=access)
+        except (OSError, ValueError) as e:
+            print(f"[Regulation] mmap unavailable ({e}), reading whole file")
+            return None
+    
+    def verify_patch(self):
+        """Verify every spec field (reads only the patched ranges)"""
+        print("\n[Regulation] Verifying patch...")
+        
+        with open(self.regulation_path, 'rb') as f:
+            data = self._map(f, mmap.ACCESS_READ)
+            read = self._reader(f, data)
             
-            if abs(glow_r - 1.0) < 0.01:
-                print("  ✓ Orange glow verified")
-            else:
+            try:
+                self.locate_rows(f, read)
+                return self._verify_ops(read)
+            finally:
+                if data is not None:
+                    data.close()
+    
+    def _verify_ops(self, read):
+        verified_rows = []
+        
+        for op in self.ops:
+            if read(op.offset, op.size) != op.packed:
+                print(f"  ✗ {op.label}: field at 0x{op.offset:X} does not match")
                 return False
             
-            print("\n[Regulation] ✓ All patches verified!")
-            return True
+            if op.label not in verified_rows:
+                verified_rows.append(op.label)
+        
+        for label in verified_rows:
+            print(f"  ✓ {label} verified")
+        
+        print(f"\n[Regulation] ✓ All patches verified! ({self.field_count} fields)")
+        return True
 
 
 if __name__ == "__main__":
@@ -169,17 +747,22 @@ if __name__ == "__main__":
     
     regulation_path = "./regulation.bin"
     
-    if len(sys.argv) > 1:
-        regulation_path = sys.argv[1]
+    # --no-mmap: read/write the whole file instead of patching in place
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    use_mmap = "--no-mmap" not in sys.argv
+    
+    if args:
+        regulation_path = args[0]
     
     print("=" * 70)
     print("Cursed Sword Mod - Regulation.bin Patcher v2.2")
     print("Sound Effects, Particles, Keybinds & UI Counter")
     print("=" * 70)
     
-    patcher = RegulationPatcher(regulation_path)
-    
     try:
+        spec, tables = load_patch_spec()
+        patcher = RegulationPatcher(regulation_path, use_mmap=use_mmap, spec=spec, tables=tables)
+        
         patcher.patch_regulation()
         
         if patcher.verify_patch():
@@ -189,7 +772,7 @@ if __name__ == "__main__":
             print("✓ Launch game and enjoy!")
         else:
             print("\n✗ Patch verification failed")
-            
+    
     except Exception as e:
         print(f"\n✗ Error: {e}")
     
@@ -0,0 +1,675 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+
+import mod
+
+# ============================================================================
+# CURSED SWORD MOD - SIMULATION HARNESS
+#
+# In-process stand-ins for the engine modules mod.py binds in mod_init
+# (seamless_coop_integration, input_manager, game_manager), a virtual clock
+# and scripted input/hit timelines, so CursedSwordMod runs outside the game.
+#
+#   python simulation.py                 # 4 players, 10 simulated seconds
+#   python simulation.py 100 30          # 100 players, 30 simulated seconds
+#
+# Run from the mod folder (config.json / keybind_config.json are read from
+# the working directory, as in game).
+# ============================================================================
+
+TICK_SECONDS = 1.0 / 60
+
+# Timeline event kinds
+EVENT_PRESS = "press"                  # parry input down (local) / request_parry (others)
+EVENT_RELEASE = "release"              # parry input up (local player only)
+EVENT_HIT = "hit"                      # engine hit callback (on_parry_hit)
+EVENT_REMOTE_PARRY = "remote_parry"    # parry_success batch from a remote peer
+EVENT_JOIN = "join"                    # Seamless Co-op join hook
+EVENT_LEAVE = "leave"                  # Seamless Co-op leave hook
+
+
+# ============================================================================
+# VIRTUAL CLOCK
+# ============================================================================
+
+class SimClock:
+    """
+    Stand-in for the time module as seen by mod.py
+    
+    time() returns virtual seconds advanced by the harness one tick at a
+    time; everything else (strftime, localtime, ...) is the real module.
+    """
+    
+    def __init__(self, start=1000.0):
+        self.now = start
+    
+    def time(self):
+        return self.now
+    
+    def advance(self, seconds):
+        self.now += seconds
+    
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+# ============================================================================
+# ENGINE STAND-INS
+# ============================================================================
+
+class SimPlayer:
+    """
+    Engine Player stand-in that records what the mod asks of it
+    
+    The optional refresh_* methods are deliberately missing, so the mod
+    takes its full re-apply path on every parry.
+    """
+    
+    def __init__(self, player_id, weapon_id=7, position=(0.0, 0.0, 0.0)):
+        self.player_id = player_id
+        self.weapon_id = weapon_id
+        self.position = position
+        self.hit_pending = False
+        self.calls = {}
+        self.buffs = {}
+        self.glow_color = None
+        self.hud = {}
+    
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+    
+    def get_id(self):
+        return self.player_id
+    
+    def get_position(self):
+        return self.position
+    
+    def get_equipped_weapon_id(self):
+        return self.weapon_id
+    
+    def set_equipped_weapon(self, weapon_id):
+        self._count("set_equipped_weapon")
+        self.weapon_id = weapon_id
+    
+    def set_ash_of_war(self, ash_id):
+        self._count("set_ash_of_war")
+    
+    def trigger_parry_animation(self):
+        self._count("trigger_parry_animation")
+    
+    def did_parry_hit(self):
+        hit = self.hit_pending
+        self.hit_pending = False
+        return hit
+    
+    def apply_buff(self, buff_name, value, duration):
+        self._count("apply_buff")
+        self.buffs[buff_name] = value
+    
+    def apply_weapon_glow(self, weapon_id, color, effect_id, duration):
+        self._count("apply_weapon_glow")
+        self.glow_color = color
+    
+    def remove_weapon_glow(self, effect_id):
+        self._count("remove_weapon_glow")
+        self.glow_color = None
+    
+    def display_hud_element(self, text, element_id, **kwargs):
+        self._count("display_hud_element")
+        self.hud[element_id] = text
+    
+    def remove_hud_element(self, element_id):
+        self._count("remove_hud_element")
+        self.hud.pop(element_id, None)
+    
+    def play_sound_effect(self, sound_file, volume=1.0, pitch=1.0, follow_player=True):
+        self._count("play_sound_effect")
+    
+    def spawn_particle_effect(self, effect_id):
+        self._count("spawn_particle_effect")
+    
+    def spawn_particle_effect_at_location(self, effect_id, location, scale=1.0,
+                                          lifetime=1.0, color_override=None):
+        self._count("spawn_particle_effect_at_location")
+
+
+class SimGameState:
+    """Per-tick game state handed to on_update"""
+    
+    def __init__(self, local_player):
+        self.local_player = local_player
+    
+    def get_player(self):
+        return self.local_player
+
+
+class SimInputManager:
+    """InputManager stand-in driven by the timeline"""
+    
+    def __init__(self, input_type="keyboard"):
+        self.input_type = input_type
+        self.pressed = set()
+        self.queries = 0
+    
+    def is_button_pressed(self, button):
+        self.queries += 1
+        return button in self.pressed
+    
+    def is_key_pressed(self, key):
+        self.queries += 1
+        return key in self.pressed
+    
+    def get_active_input_type(self):
+        return self.input_type
+
+
+class SimGameManager:
+    """GameManager stand-in (get_instance returns itself)"""
+    
+    def __init__(self):
+        self.players = {}
+        self.lookups = 0
+    
+    def get_instance(self):
+        return self
+    
+    def get_player(self, player_id):
+        self.lookups += 1
+        return self.players.get(player_id)
+
+
+class SimSessionHook:
+    """seamless_hook stand-in: records registrations and outbound payloads"""
+    
+    def __init__(self):
+        self.sync_handlers = []
+        self.network_handlers = []
+        self.join_handlers = []
+        self.leave_handlers = []
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.messages_received = 0
+        self._lock = threading.Lock()
+    
+    def register_custom_sync(self, mod_name, sync_handler, priority=0):
+        self.sync_handlers.append(sync_handler)
+    
+    def register_network_handler(self, mod_name, handler):
+        self.network_handlers.append(handler)
+    
+    def register_player_join_handler(self, mod_name, handler):
+        self.join_handlers.append(handler)
+    
+    def register_player_leave_handler(self, mod_name, handler):
+        self.leave_handlers.append(handler)
+    
+    def broadcast_to_session(self, payload, exclude_self=True):
+        self.messages_sent += 1
+        self.bytes_sent += len(payload)
+    
+    def deliver(self, payload):
+        """Hand an inbound payload to the mod, as the network thread would"""
+        with self._lock:
+            self.messages_received += 1
+        
+        for handler in self.network_handlers:
+            handler(payload)
+    
+    def player_joined(self, player_id):
+        for handler in self.join_handlers:
+            handler(player_id)
+    
+    def player_left(self, player_id):
+        for handler in self.leave_handlers:
+            handler(player_id)
+
+
+def install_engine_stubs(clock, input_manager, game_manager, session_hook):
+    """
+    Register the stand-ins under the engine module names and rebind mod.py
+    
+    Replaces mod.time with the virtual clock so every timestamp the mod
+    takes follows the simulation. Returns what was replaced, for
+    restore_engine_stubs.
+    """
+    stubs = {
+        "seamless_coop_integration": ("seamless_hook", session_hook),
+        "input_manager": ("InputManager", input_manager),
+        "game_manager": ("GameManager", game_manager),
+    }
+    saved_modules = {name: sys.modules.get(name) for name in stubs}
+    saved_globals = {name: getattr(mod, name) for name in ("seamless_hook", "InputManager", "GameManager", "time")}
+    
+    for module_name, (attribute, value) in stubs.items():
+        module = types.ModuleType(module_name)
+        setattr(module, attribute, value)
+        sys.modules[module_name] = module
+    
+    mod.seamless_hook = None
+    mod.InputManager = None
+    mod.GameManager = None
+    mod.bind_engine_modules()
+    mod.time = clock
+    
+    return saved_modules, saved_globals
+
+
+def restore_engine_stubs(saved):
+    """Undo install_engine_stubs (sys.modules entries and mod.py globals)"""
+    saved_modules, saved_globals = saved
+    
+    for module_name, module in saved_modules.items():
+        if module is None:
+            sys.modules.pop(module_name, None)
+        else:
+            sys.modules[module_name] = module
+    
+    for name, value in saved_globals.items():
+        setattr(mod, name, value)
+
+
+# ============================================================================
+# TIMELINES
+# ============================================================================
+
+def parry_timeline(player_ids, duration, interval=1.0, hit_after=0.25, miss_every=0,
+                   remote_player_ids=(), remote_interval=1.0, start=1.0):
+    """
+    Scripted parry attempts for every player, staggered across the interval
+    
+    Returns a sorted list of (offset_seconds, event, player_id). Each
+    attempt presses, releases a tick later and lands a hit hit_after
+    seconds after the press; every miss_every-th attempt gets no hit and
+    runs out the parry window instead.
+    """
+    events = []
+    player_ids = list(player_ids)
+    
+    for index, player_id in enumerate(player_ids):
+        at = start + interval * index / max(len(player_ids), 1)
+        attempt = 0
+        
+        while at < duration:
+            attempt += 1
+            events.append((at, EVENT_PRESS, player_id))
+            events.append((at + TICK_SECONDS, EVENT_RELEASE, player_id))
+            
+            if not miss_every or attempt % miss_every:
+                events.append((at + hit_after, EVENT_HIT, player_id))
+            
+            at += interval
+    
+    remote_player_ids = list(remote_player_ids)
+    
+    for index, player_id in enumerate(remote_player_ids):
+        at = start + remote_interval * index / max(len(remote_player_ids), 1)
+        
+        while at < duration:
+            events.append((at, EVENT_REMOTE_PARRY, player_id))
+            at += remote_interval
+    
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+# ============================================================================
+# SIMULATION
+# ============================================================================
+
+class Simulation:
+    """
+    One CursedSwordMod instance driven by a virtual clock and fake engine
+    
+    Player 1 is the local player (parries through InputManager); players
+    2..N are handled by this instance through request_parry, as a host
+    would. Remote players only exist as inbound sync batches.
+    """
+    
+    def __init__(self, players=1, remote_players=0, sync_interval=0.1, sounds=True, quiet=True):
+        self.clock = SimClock()
+        self.input_manager = SimInputManager()
+        self.game_manager = SimGameManager()
+        self.session = SimSessionHook()
+        
+        self.players = [SimPlayer(player_id) for player_id in range(1, players + 1)]
+        for player in self.players:
+            self.game_manager.players[player.player_id] = player
+        self.local_player = self.players[0]
+        self.game_state = SimGameState(self.local_player)
+        
+        self.remote_player_ids = [10000 + index for index in range(remote_players)]
+        self.remote_sequences = {}
+        self.remote_stacks = {}
+        
+        self.sync_interval = sync_interval
+        self.sync_messages = 0
+        self.sync_bytes = 0
+        self._next_sync = 0.0
+        
+        self.ticks = 0
+        self.update_ns = 0
+        self.parries_requested = 0
+        self.parries_succeeded = 0
+        self.press_latencies = []   # virtual seconds, press -> successful parry handled
+        self.hit_latencies = []     # virtual seconds, hit callback -> successful parry handled
+        self.parry_costs_ns = []    # wall time spent in handle_successful_parry
+        self._pressed_at = {}
+        self._hit_at = {}
+        
+        self._saved_console_level = mod.log.console_level
+        self._saved_mod = mod.cursed_sword_mod
+        if quiet:
+            mod.log.console_level = mod.LOG_ERROR
+        
+        self._saved_stubs = install_engine_stubs(self.clock, self.input_manager, self.game_manager, self.session)
+        
+        self.mod = mod.CursedSwordMod()
+        mod.cursed_sword_mod = self.mod
+        
+        # Empty sound files so the sound path runs like it does in game
+        self.sound_dir = None
+        if sounds:
+            self.sound_dir = tempfile.mkdtemp(prefix="cursed_sword_sim_")
+            for file, _, _ in self.mod.sound_bank.entries.values():
+                open(os.path.join(self.sound_dir, file), "wb").close()
+            self.mod.sound_bank = mod.SoundBank(self.mod.sound_bank.entries, self.sound_dir)
+        
+        self._wrap_successful_parry()
+        self.mod.initialize()
+    
+    def _wrap_successful_parry(self):
+        handle_successful_parry = self.mod.handle_successful_parry
+        perf_counter_ns = time.perf_counter_ns
+        
+        def timed_successful_parry(player):
+            started = perf_counter_ns()
+            handle_successful_parry(player)
+            self.parry_costs_ns.append(perf_counter_ns() - started)
+            self.parries_succeeded += 1
+            
+            player_id = player.get_id()
+            now = self.clock.now
+            
+            pressed_at = self._pressed_at.pop(player_id, None)
+            if pressed_at is not None:
+                self.press_latencies.append(now - pressed_at)
+            
+            hit_at = self._hit_at.pop(player_id, None)
+            if hit_at is not None:
+                self.hit_latencies.append(now - hit_at)
+        
+        self.mod.handle_successful_parry = timed_successful_parry
+    
+    def close(self):
+        """Stop the logger, remove temp files and restore mod.py's globals"""
+        mod.log.stop()
+        
+        if self.sound_dir is not None:
+            shutil.rmtree(self.sound_dir, ignore_errors=True)
+            self.sound_dir = None
+        
+        if self._saved_stubs is not None:
+            restore_engine_stubs(self._saved_stubs)
+            self._saved_stubs = None
+            mod.log.console_level = self._saved_console_level
+            if mod.cursed_sword_mod is self.mod:
+                mod.cursed_sword_mod = self._saved_mod
+    
+    # ------------------------------------------------------------------
+    # Events
+    # ------------------------------------------------------------------
+    
+    def apply_event(self, event, player_id, at=None):
+        """Apply a timeline event; `at` is when it happened (default: now)"""
+        if at is None:
+            at = self.clock.now
+        
+        if event == EVENT_PRESS:
+            self.press(player_id, at)
+        elif event == EVENT_RELEASE:
+            if player_id == self.local_player.player_id:
+                self.input_manager.pressed.clear()
+        elif event == EVENT_HIT:
+            self._hit_at[player_id] = at
+            self.mod.on_parry_hit(player_id, at)
+        elif event == EVENT_REMOTE_PARRY:
+            self.deliver_remote_parry(player_id)
+        elif event == EVENT_JOIN:
+            self.session.player_joined(player_id)
+        elif event == EVENT_LEAVE:
+            self.session.player_left(player_id)
+    
+    def press(self, player_id, at):
+        self.parries_requested += 1
+        self._pressed_at[player_id] = at
+        
+        if player_id == self.local_player.player_id:
+            self.input_manager.pressed.add(self.mod.PC_PARRY_INPUT)
+            self.input_manager.pressed.update(self.mod.CONTROLLER_PARRY_INPUT)
+            return
+        
+        player = self.game_manager.players.get(player_id)
+        if player is not None:
+            self.mod.request_parry(player)
+    
+    def deliver_remote_parry(self, player_id):
+        """Send a parry_success batch from remote player_id to the mod"""
+        stack = self.remote_stacks.get(player_id, 0) % 10 + 1
+        self.remote_stacks[player_id] = stack
+        
+        sequence = self.remote_sequences.get(player_id, 0) + 1
+        self.remote_sequences[player_id] = sequence
+        
+        payload = mod.encode_messages(
+            ((mod.ACTION_PARRY_SUCCESS, player_id, stack, self.clock.now, None),),
+            sender_id=player_id,
+            sequence=sequence
+        )
+        self.session.deliver(payload)
+    
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+    
+    def tick(self):
+        """Run one on_update (plus the engine's periodic sync) and advance the clock"""
+        started = time.perf_counter_ns()
+        self.mod.on_update(self.game_state)
+        
+        if self.clock.now >= self._next_sync:
+            self._next_sync = self.clock.now + self.sync_interval
+            self.run_sync()
+        
+        self.update_ns += time.perf_counter_ns() - started
+        self.ticks += 1
+        self.clock.advance(TICK_SECONDS)
+    
+    def run_sync(self):
+        for handler in self.session.sync_handlers:
+            for player in self.players:
+                payload = handler({"id": player.player_id})
+                
+                if payload is not mod.SYNC_UNCHANGED:
+                    self.sync_messages += 1
+                    self.sync_bytes += len(payload)
+    
+    def run(self, timeline, duration):
+        """Play a timeline of (offset, event, player_id) for duration virtual seconds"""
+        start = self.clock.now
+        end = start + duration
+        index = 0
+        
+        while self.clock.now < end:
+            now = self.clock.now
+            
+            while index < len(timeline) and start + timeline[index][0] <= now:
+                offset, event, player_id = timeline[index]
+                self.apply_event(event, player_id, start + offset)
+                index += 1
+            
+            self.tick()
+        
+        return self.results()
+    
+    def results(self):
+        seconds = self.update_ns / 1e9
+        costs_us = [cost / 1000 for cost in self.parry_costs_ns]
+        press_ms = [latency * 1000 for latency in self.press_latencies]
+        hit_ms = [latency * 1000 for latency in self.hit_latencies]
+        
+        return {
+            "players": len(self.players),
+            "remote_players": len(self.remote_player_ids),
+            "ticks": self.ticks,
+            "ticks_per_sec": self.ticks / seconds if seconds else 0.0,
+            "parries_requested": self.parries_requested,
+            "parries_succeeded": self.parries_succeeded,
+            "press_to_parry_p50_ms": percentile(press_ms, 0.50),
+            "hit_to_parry_p50_ms": percentile(hit_ms, 0.50),
+            "hit_to_parry_p99_ms": percentile(hit_ms, 0.99),
+            "parry_cost_mean_us": sum(costs_us) / len(costs_us) if costs_us else 0.0,
+            "parry_cost_p99_us": percentile(costs_us, 0.99),
+            "messages_sent": self.session.messages_sent,
+            "bytes_sent": self.session.bytes_sent,
+            "sync_messages": self.sync_messages,
+            "sync_bytes": self.sync_bytes,
+            "messages_received": self.session.messages_received,
+            "commands_executed": self.mod.commands.executed,
+            "effects_dropped": self.mod.effect_queue.dropped,
+        }
+
+
+def run_scenario(players=1, remote_players=0, seconds=10.0, interval=1.0, miss_every=4):
+    """Run the standard parry scenario and return its results"""
+    simulation = Simulation(players=players, remote_players=remote_players)
+    
+    try:
+        timeline = parry_timeline(
+            [player.player_id for player in simulation.players],
+            seconds,
+            interval=interval,
+            miss_every=miss_every,
+            remote_player_ids=simulation.remote_player_ids
+        )
+        return simulation.run(timeline, seconds)
+    finally:
+        simulation.close()
+
+
+# ============================================================================
+# STRESS (concurrent hits / network batches against parries and expiries)
+# ============================================================================
+
+def run_stress(players=50, threads=8, posts_per_thread=5000, seconds=25.0):
+    """
+    Hammer the async entry points from worker threads while the update
+    loop runs parries and buff expiries for every player
+    
+    Returns (results, problems); problems lists every lost or out-of-order
+    update found (empty on success).
+    """
+    simulation = Simulation(players=players)
+    mod_instance = simulation.mod
+    player_ids = [player.player_id for player in simulation.players]
+    
+    # Each worker owns its remote senders so per-sender order is checkable
+    last_sent = {}
+    posted = [0] * threads
+    
+    def worker(index):
+        remote_id = 20000 + index
+        sequence = 0
+        
+        for post in range(posts_per_thread):
+            if post % 2:
+                mod_instance.on_parry_hit(player_ids[post % len(player_ids)])
+            else:
+                sequence += 1
+                stack = sequence % 10 + 1
+                simulation.session.deliver(mod.encode_messages(
+                    ((mod.ACTION_PARRY_SUCCESS, remote_id, stack, simulation.clock.now, None),),
+                    sender_id=remote_id,
+                    sequence=sequence
+                ))
+                last_sent[remote_id] = stack
+            posted[index] += 1
+    
+    timeline = parry_timeline(player_ids, seconds - mod_instance.buff_duration - 1.0,
+                              interval=0.75, miss_every=3)
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    
+    try:
+        for thread in workers:
+            thread.start()
+        
+        # Parry phase runs while the workers post; the tail lets every buff expire
+        results = simulation.run(timeline, seconds)
+        
+        for thread in workers:
+            thread.join()
+        
+        while mod_instance.commands:
+            simulation.tick()
+        
+        problems = []
+        timeline_hits = sum(1 for _, event, _ in timeline if event == EVENT_HIT)
+        expected = sum(posted) + timeline_hits
+        
+        if mod_instance.commands.executed != expected:
+            problems.append(f"commands executed {mod_instance.commands.executed}, posted {expected}")
+        if mod_instance.commands.failed:
+            problems.append(f"{mod_instance.commands.failed} commands failed")
+        if mod_instance.remote_batches_dropped:
+            problems.append(f"{mod_instance.remote_batches_dropped} remote batches dropped as stale")
+        
+        for remote_id, stack in last_sent.items():
+            replica = mod_instance.get_remote_state(remote_id)
+            if replica is None or replica.stack_count != stack:
+                problems.append(f"remote {remote_id}: last update lost")
+        
+        for player_id in player_ids:
+            state = mod_instance.players.get(player_id)
+            if state is not None and (state.glow_active or state.ui_counter_visible):
+                problems.append(f"player {player_id}: buff visuals survived expiry")
+        
+        # The idle-player sweep reschedules itself, so it is always pending
+        pending = len(mod_instance.expiry_scheduler)
+        if mod_instance.expiry_scheduler.next_expiry(mod.PLAYER_SWEEP_KEY) is not None:
+            pending -= 1
+        if pending:
+            problems.append(f"{pending} buff expiries still pending")
+        
+        results = simulation.results()
+        results["posted_async"] = sum(posted)
+        return results, problems
+    finally:
+        simulation.close()
+
+
+if __name__ == "__main__":
+    player_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    
+    print("=" * 70)
+    print(f"Cursed Sword Mod - Simulation ({player_count} players, {duration:g}s)")
+    print("=" * 70)
+    
+    for key, value in run_scenario(player_count, remote_players=player_count, seconds=duration).items():
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        print(f"  {key}: {value}")
+    
+    print("=" * 70)
@@ -0,0 +1,135 @@
+"""ModConfig: snapshot cache and hot reload (last good data survives a bad save)"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mod
+
+
+KEYBINDS = {"keyboard": {"parry_input": "Q"}, "input_buffer_ms": 80}
+CONFIG = {"buff_config": {"stacking_system": {"max_stacks": 7}}}
+
+
+class ModConfigTests(unittest.TestCase):
+    """Load, snapshot and reload through check_for_changes"""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="cursed_sword_config_")
+        self.config_path = os.path.join(self.directory, "config.json")
+        self.keybind_path = os.path.join(self.directory, "keybind_config.json")
+        self.snapshot_path = os.path.join(self.directory, "cache", "config.marshal")
+        self.now = 0.0
+        self.console_level = mod.log.console_level
+        mod.log.console_level = mod.LOG_ERROR
+        self.mtime_ns = 1_000_000_000_000_000_000
+        
+        self.write(self.config_path, json.dumps(CONFIG))
+        self.write(self.keybind_path, json.dumps(KEYBINDS))
+    
+    def tearDown(self):
+        mod.log.console_level = self.console_level
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def write(self, path, text):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        
+        # Distinct mtimes even on coarse filesystem clocks
+        self.mtime_ns += 1_000_000_000
+        os.utime(path, ns=(self.mtime_ns, self.mtime_ns))
+    
+    def new_config(self):
+        config = mod.ModConfig(self.config_path, self.keybind_path, self.snapshot_path)
+        config.load()
+        return config
+    
+    def reload(self, config):
+        self.now += config.reload_interval
+        return config.check_for_changes(self.now)
+    
+    def test_load_and_validate(self):
+        self.write(self.keybind_path, json.dumps({"keyboard": {"parry_input": 5}, "input_buffer_ms": 80}))
+        config = self.new_config()
+        
+        self.assertEqual(config.config, CONFIG)
+        self.assertEqual(config.keybinds, {"keyboard": {}, "input_buffer_ms": 80})
+        self.assertEqual(len(config.errors), 1)
+    
+    def test_snapshot_reused_when_unchanged(self):
+        first = self.new_config()
+        second = self.new_config()
+        
+        self.assertFalse(first.from_snapshot)
+        self.assertTrue(second.from_snapshot)
+        self.assertEqual(second.data, first.data)
+    
+    def test_reload_picks_up_changes(self):
+        config = self.new_config()
+        self.assertFalse(self.reload(config))
+        
+        self.write(self.keybind_path, json.dumps({"keyboard": {"parry_input": "R"}}))
+        
+        self.assertTrue(self.reload(config))
+        self.assertEqual(config.keybinds, {"keyboard": {"parry_input": "R"}})
+    
+    def test_reload_is_rate_limited(self):
+        config = self.new_config()
+        self.write(self.keybind_path, json.dumps({}))
+        
+        self.assertTrue(config.check_for_changes(config.reload_interval))
+        self.write(self.keybind_path, json.dumps(KEYBINDS))
+        self.assertFalse(config.check_for_changes(config.reload_interval + 0.01))
+    
+    def test_bad_save_keeps_last_good_data(self):
+        config = self.new_config()
+        
+        for broken in ("{bad", "[1, 2]", ""):
+            self.write(self.keybind_path, broken)
+            
+            self.assertTrue(self.reload(config))
+            self.assertEqual(config.keybinds, KEYBINDS)
+            self.assertEqual(config.config, CONFIG)
+            self.assertIn("keeping the last good keybinds", config.errors[0])
+        
+        self.write(self.keybind_path, json.dumps({"input_buffer_ms": 0}))
+        
+        self.assertTrue(self.reload(config))
+        self.assertEqual(config.keybinds, {"input_buffer_ms": 0})
+        self.assertEqual(config.errors, [])
+    
+    def test_missing_file_keeps_last_good_data(self):
+        config = self.new_config()
+        os.remove(self.config_path)
+        
+        self.assertTrue(self.reload(config))
+        self.assertEqual(config.config, CONFIG)
+    
+    def test_kept_data_is_not_snapshotted(self):
+        config = self.new_config()
+        self.write(self.keybind_path, "{bad")
+        self.reload(config)
+        
+        # A fresh start has no last good data for the broken file
+        fresh = self.new_config()
+        
+        self.assertFalse(fresh.from_snapshot)
+        self.assertEqual(fresh.keybinds, {})
+        self.assertEqual(fresh.config, CONFIG)
+    
+    def test_bad_file_on_first_load_uses_defaults(self):
+        self.write(self.config_path, "{bad")
+        config = self.new_config()
+        
+        self.assertEqual(config.config, {})
+        self.assertIn("using defaults", config.errors[0])
+        
+        self.write(self.config_path, json.dumps(CONFIG))
+        self.assertTrue(self.reload(config))
+        self.assertEqual(config.config, CONFIG)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""Milestone sounds and particles follow config.json, including its enabled flags"""
+
+import copy
+import unittest
+
+import mod
+import simulation
+
+
+CONFIG = {
+    "sound_effects": {
+        "enabled": True,
+        "stack_milestones": {
+            "enabled": True,
+            "stack_1": {"enabled": True, "file": "stack_milestone_1.wem"},
+            "stack_5": {"enabled": True, "file": "stack_milestone_5.wem"},
+            "stack_10": {"enabled": True, "file": "stack_milestone_10.wem"},
+        },
+    },
+    "visual_effects": {
+        "particle_effects": {
+            "enabled": True,
+            "parry_burst": {"enabled": True},
+            "stack_milestones": {
+                "enabled": True,
+                "stack_1": {},
+                "stack_5": {},
+                "stack_10": {},
+            },
+        },
+    },
+}
+
+
+class MilestoneConfigTests(unittest.TestCase):
+    """build_effect_tables and the effects queued for a parry"""
+    
+    def setUp(self):
+        self.simulation = simulation.Simulation(players=1, sounds=False)
+        self.mod = self.simulation.mod
+        self.player = self.simulation.players[0]
+        self.config = copy.deepcopy(CONFIG)
+    
+    def tearDown(self):
+        self.simulation.close()
+    
+    def apply(self):
+        self.mod.config.data["config"] = self.config
+        self.mod.apply_config()
+    
+    def milestones(self, field):
+        table = self.mod.stack_table
+        return {stack: getattr(table[stack], field) for stack in range(len(table))
+                if getattr(table[stack], field) is not None}
+    
+    def queued(self, stack_count):
+        queued = []
+        self.mod.effect_queue.drain(
+            lambda request: queued.append((request.kind, request.effect_key)), 0.0
+        )
+        self.mod.play_parry_sounds(self.player, stack_count)
+        self.mod.spawn_parry_particles(self.player, stack_count)
+        self.mod.effect_queue.drain(
+            lambda request: queued.append((request.kind, request.effect_key)), 0.0
+        )
+        return queued
+    
+    def test_defaults_match_config(self):
+        self.apply()
+        
+        expected = {1: "stack_1", 5: "stack_5", 10: "stack_10"}
+        self.assertEqual(self.milestones("sound_milestone"), expected)
+        self.assertEqual(self.milestones("particle_milestone"), expected)
+    
+    def test_added_and_disabled_entries(self):
+        self.config["sound_effects"]["stack_milestones"]["stack_3"] = {"file": "three.wem"}
+        self.config["sound_effects"]["stack_milestones"]["stack_5"]["enabled"] = False
+        self.config["visual_effects"]["particle_effects"]["stack_milestones"]["stack_3"] = {
+            "effect_id": "custom_three"
+        }
+        del self.config["visual_effects"]["particle_effects"]["stack_milestones"]["stack_10"]
+        self.apply()
+        
+        self.assertEqual(self.milestones("sound_milestone"), {1: "stack_1", 3: "stack_3", 10: "stack_10"})
+        self.assertEqual(self.milestones("particle_milestone"), {1: "stack_1", 3: "stack_3", 5: "stack_5"})
+        self.assertEqual(self.mod.sound_bank.entries["stack_3"][0], "three.wem")
+        self.assertNotIn("stack_5", self.mod.sound_bank.entries)
+        self.assertEqual(self.mod.particle_effect_ids["stack_3"], "custom_three")
+        
+        self.assertIn((mod.EFFECT_SOUND, "stack_3"), self.queued(3))
+        self.assertIn((mod.EFFECT_PARTICLE, "stack_3"), self.queued(3))
+        self.assertNotIn((mod.EFFECT_SOUND, "stack_5"), self.queued(5))
+    
+    def test_disabled_groups(self):
+        self.config["sound_effects"]["stack_milestones"]["enabled"] = False
+        self.config["visual_effects"]["particle_effects"]["stack_milestones"]["enabled"] = False
+        self.apply()
+        
+        self.assertEqual(self.milestones("sound_milestone"), {})
+        self.assertEqual(self.milestones("particle_milestone"), {})
+        self.assertCountEqual(self.queued(5), [
+            (mod.EFFECT_SOUND, "parry_success"),
+            (mod.EFFECT_PARTICLE, "parry_success"),
+        ])
+    
+    def test_particles_disabled(self):
+        self.config["visual_effects"]["particle_effects"]["enabled"] = False
+        self.apply()
+        
+        self.assertEqual(self.milestones("particle_milestone"), {})
+        self.assertCountEqual(self.queued(10), [
+            (mod.EFFECT_SOUND, "parry_success"),
+            (mod.EFFECT_SOUND, "stack_10"),
+        ])
+    
+    def test_parry_burst_disabled(self):
+        self.config["visual_effects"]["particle_effects"]["parry_burst"]["enabled"] = False
+        self.apply()
+        
+        self.assertNotIn((mod.EFFECT_PARTICLE, "parry_success"), self.queued(1))
+        self.assertIn((mod.EFFECT_PARTICLE, "stack_1"), self.queued(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""EffectQueue budgets: solo parries are never throttled, crowds share the global cap"""
+
+import unittest
+
+import mod
+
+
+def push_parry(queue, player_id, milestone=None):
+    """Queue the effects handle_successful_parry queues for one parry"""
+    queue.push(mod.EFFECT_ATTACHED_PARTICLE, None, player_id, "parry_success")
+    queue.push(mod.EFFECT_SOUND, None, player_id, "parry_success")
+    queue.push(mod.EFFECT_PARTICLE, None, player_id, "parry_success")
+    
+    if milestone is not None:
+        queue.push(mod.EFFECT_SOUND, None, player_id, milestone, priority=mod.EFFECT_PRIORITY_MILESTONE)
+        queue.push(mod.EFFECT_PARTICLE, None, player_id, milestone, priority=mod.EFFECT_PRIORITY_MILESTONE)
+
+
+class EffectQueueTests(unittest.TestCase):
+    """Caps, priority and dedupe"""
+    
+    def setUp(self):
+        self.queue = mod.EffectQueue()
+        self.played = []
+    
+    def play(self, request):
+        self.played.append((request.player_id, request.effect_key))
+    
+    def drain(self, now):
+        return self.queue.drain(self.play, now)
+    
+    def test_milestone_parry_plays_every_effect(self):
+        push_parry(self.queue, 1, "stack_1")
+        
+        self.assertEqual(self.drain(0.0), mod.EFFECTS_PER_PARRY)
+        self.assertEqual(self.queue.dropped, 0)
+    
+    def test_solo_player_parrying_fast_is_not_throttled(self):
+        for index in range(4):
+            push_parry(self.queue, 1, "stack_5" if index == 1 else None)
+            self.drain(index * 0.5)
+        
+        self.assertEqual(self.queue.dropped, 0)
+        self.assertEqual(self.queue.played, 3 * 3 + mod.EFFECTS_PER_PARRY)
+    
+    def test_per_player_cap_applies_with_several_players(self):
+        push_parry(self.queue, 2)
+        
+        for index in range(3):
+            push_parry(self.queue, 1, "stack_1")
+            self.drain(index * 0.1)
+        
+        self.assertEqual(self.queue.live_count(1), self.queue.max_live_per_player)
+        self.assertEqual(self.queue.live_count(2), 3)
+        self.assertEqual(self.queue.dropped, 3 * mod.EFFECTS_PER_PARRY - self.queue.max_live_per_player)
+    
+    def test_global_cap_and_milestone_priority(self):
+        for player_id in range(1, 7):
+            push_parry(self.queue, player_id)
+        push_parry(self.queue, 7, "stack_10")
+        push_parry(self.queue, 8, "stack_10")
+        self.drain(0.0)
+        
+        self.assertEqual(len(self.played), self.queue.max_live_total)
+        self.assertEqual(self.queue.dropped, 6 * 3 + 2 * mod.EFFECTS_PER_PARRY - self.queue.max_live_total)
+        for player_id in (7, 8):
+            self.assertIn((player_id, "stack_10"), self.played)
+    
+    def test_effects_expire(self):
+        push_parry(self.queue, 1, "stack_1")
+        self.drain(0.0)
+        
+        self.assertEqual(self.queue.live_count(1), mod.EFFECTS_PER_PARRY)
+        
+        self.drain(max(mod.EFFECT_LIFETIMES.values()))
+        self.assertEqual(self.queue.live_count(1), 0)
+    
+    def test_identical_requests_deduped(self):
+        push_parry(self.queue, 1)
+        push_parry(self.queue, 1)
+        
+        self.assertEqual(self.drain(0.0), 3)
+        self.assertEqual(self.queue.deduped, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Idle sweep: per-player state is evicted without a Seamless leave hook"""
+
+import gc
+import unittest
+
+import mod
+import simulation
+
+
+class IdleSweepTests(unittest.TestCase):
+    """sweep_idle_players, driven by the expiry scheduler"""
+    
+    def setUp(self):
+        self.simulation = simulation.Simulation(players=2, sounds=False)
+        self.mod = self.simulation.mod
+    
+    def tearDown(self):
+        self.simulation.close()
+    
+    def run_for(self, seconds):
+        self.simulation.run([], seconds)
+    
+    def send_remote(self, player_id, sequence):
+        self.mod.handle_remote_parry(mod.encode_messages(
+            ((mod.ACTION_PARRY_SUCCESS, player_id, 1, self.simulation.clock.now, None),),
+            sender_id=player_id,
+            sequence=sequence
+        ))
+    
+    def test_sweep_is_always_scheduled(self):
+        self.assertIsNotNone(self.mod.expiry_scheduler.next_expiry(mod.PLAYER_SWEEP_KEY))
+        
+        self.run_for(self.mod.player_sweep_interval * 3)
+        self.assertIsNotNone(self.mod.expiry_scheduler.next_expiry(mod.PLAYER_SWEEP_KEY))
+    
+    def test_departed_player_evicted_after_buff_expires(self):
+        player = self.simulation.players.pop()
+        player_id = player.get_id()
+        self.mod.handle_successful_parry(player)
+        del self.simulation.game_manager.players[player_id]
+        del player
+        gc.collect()
+        
+        self.run_for(self.mod.player_sweep_interval * 2)
+        self.assertIn(player_id, self.mod.players)
+        
+        self.run_for(self.mod.buff_duration)
+        self.assertNotIn(player_id, self.mod.players)
+    
+    def test_present_player_kept_while_buffed_or_toggled(self):
+        player = self.simulation.players[1]
+        self.mod.handle_successful_parry(player)
+        self.mod.toggle_mod_for_player(1)
+        
+        self.run_for(self.mod.buff_duration - 1.0)
+        self.assertIn(2, self.mod.players)
+        
+        self.run_for(self.mod.player_idle_timeout + self.mod.player_sweep_interval)
+        self.assertNotIn(2, self.mod.players)
+        self.assertIn(1, self.mod.players)
+    
+    def test_own_toggle_echo_does_not_evict_local_state(self):
+        session = self.simulation.session
+        broadcast = session.broadcast_to_session
+        
+        # Toggles are sent with exclude_self=False, so they come back to us
+        def broadcast_to_session(payload, exclude_self=True):
+            broadcast(payload, exclude_self)
+            if not exclude_self:
+                session.deliver(payload)
+        
+        session.broadcast_to_session = broadcast_to_session
+        self.mod.outbox.sender_id = 1
+        self.mod.toggle_mod_for_player(1)
+        self.run_for(1.0)
+        
+        self.assertIsNotNone(self.mod.get_remote_state(1))
+        
+        self.run_for(self.mod.player_idle_timeout + self.mod.player_sweep_interval * 2)
+        
+        self.assertIsNone(self.mod.get_remote_state(1))
+        self.assertFalse(self.mod.is_mod_enabled_for_player(1))
+    
+    def test_stale_replica_keeps_host_driven_buff_expiry(self):
+        player = self.simulation.players[1]
+        self.send_remote(2, 1)
+        self.run_for(self.mod.player_idle_timeout - 3.0)
+        
+        self.mod.handle_successful_parry(player)
+        self.run_for(self.mod.player_sweep_interval * 2)
+        
+        self.assertIsNone(self.mod.get_remote_state(2))
+        self.assertIsNotNone(self.mod.expiry_scheduler.next_expiry(2))
+        
+        self.run_for(self.mod.buff_duration)
+        
+        self.assertIsNone(player.glow_color)
+        self.assertNotIn(mod.HUD_COUNTER_ELEMENT_ID, player.hud)
+    
+    def test_silent_remote_player_evicted(self):
+        self.send_remote(10001, 1)
+        self.run_for(self.mod.player_idle_timeout / 2)
+        self.send_remote(10002, 1)
+        
+        self.run_for(self.mod.player_idle_timeout / 2 + self.mod.player_sweep_interval)
+        
+        self.assertIsNone(self.mod.get_remote_state(10001))
+        self.assertIsNotNone(self.mod.get_remote_state(10002))
+        self.assertEqual(sorted(self.mod.remote_sequences), [(10002, mod.CHANNEL_BATCH)])
+
+
+if __name__ == "__main__":
+    unittest.main()
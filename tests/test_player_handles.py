@@ -0,0 +1,113 @@
+"""PlayerHandleCache and buff expiry: handles are only held weakly"""
+
+import gc
+import unittest
+import weakref
+
+import mod
+import simulation
+
+
+class BuffExpiryHandleTests(unittest.TestCase):
+    """Pending buff expiries resolve the handle by id when they fire"""
+    
+    def setUp(self):
+        self.simulation = simulation.Simulation(players=2, sounds=False)
+        self.mod = self.simulation.mod
+    
+    def tearDown(self):
+        self.simulation.close()
+    
+    def parry(self, player):
+        self.mod.handle_successful_parry(player)
+        self.simulation.tick()
+    
+    def run_past_expiry(self):
+        self.simulation.run([], self.mod.buff_duration + 1.0)
+    
+    def test_expiry_clears_visuals_on_live_handle(self):
+        player = self.simulation.players[1]
+        self.parry(player)
+        
+        self.assertIsNotNone(player.glow_color)
+        self.assertIn(mod.HUD_COUNTER_ELEMENT_ID, player.hud)
+        
+        self.run_past_expiry()
+        
+        self.assertIsNone(player.glow_color)
+        self.assertNotIn(mod.HUD_COUNTER_ELEMENT_ID, player.hud)
+    
+    def test_pending_expiry_does_not_keep_handle_alive(self):
+        player = self.simulation.players.pop()
+        player_id = player.get_id()
+        self.parry(player)
+        
+        del self.simulation.game_manager.players[player_id]
+        handle = weakref.ref(player)
+        del player
+        gc.collect()
+        
+        self.assertIsNone(handle())
+        self.assertIsNotNone(self.mod.expiry_scheduler.next_expiry(player_id))
+        
+        # Held here so the flags can be checked even once the sweep evicts it
+        state = self.mod.players[player_id]
+        self.assertTrue(state.glow_active)
+        self.assertTrue(state.ui_counter_visible)
+        
+        self.run_past_expiry()
+        self.simulation.run([], self.mod.player_sweep_interval)
+        
+        self.assertFalse(state.glow_active)
+        self.assertFalse(state.ui_counter_visible)
+        self.assertIsNone(self.mod.expiry_scheduler.next_expiry(player_id))
+        self.assertNotIn(player_id, self.mod.players)
+    
+    def test_respawned_handle_gets_fresh_glow(self):
+        player = self.simulation.players[1]
+        player_id = player.get_id()
+        self.parry(player)
+        
+        # Engine swaps the handle (respawn) before the window closes
+        respawned = simulation.SimPlayer(player_id)
+        self.simulation.players[1] = respawned
+        self.simulation.game_manager.players[player_id] = respawned
+        del player
+        gc.collect()
+        
+        self.run_past_expiry()
+        self.parry(respawned)
+        
+        self.assertEqual(respawned.calls.get("apply_weapon_glow"), 1)
+
+
+class PlayerHandleCacheTests(unittest.TestCase):
+    """Hit/miss accounting and weak release"""
+    
+    def setUp(self):
+        self.simulation = simulation.Simulation(players=1, sounds=False)
+        self.cache = mod.PlayerHandleCache()
+        self.player = self.simulation.local_player
+    
+    def tearDown(self):
+        self.simulation.close()
+    
+    def test_miss_falls_back_to_game_manager(self):
+        self.assertIs(self.cache.get(1), self.player)
+        self.assertIs(self.cache.get(1), self.player)
+        self.assertIsNone(self.cache.get(99))
+        
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+    
+    def test_despawned_handle_released(self):
+        player = simulation.SimPlayer(5)
+        self.cache.remember(5, player)
+        del player
+        gc.collect()
+        
+        self.assertEqual(self.cache.stats()["cached"], 0)
+        self.assertIsNone(self.cache.get(5))
+
+
+if __name__ == "__main__":
+    unittest.main()
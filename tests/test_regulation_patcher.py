@@ -0,0 +1,454 @@
+"""Patch spec compilation, apply and verify on small synthetic regulation files"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+import regulation_patcher as rp
+
+
+TABLES = {"weapon": (0x100, 0x20), "vfx": (0x400, 0x10)}
+FILE_SIZE = 0x1000
+
+SPEC = (
+    ("weapon", 2, 0x00, "u8", 75),
+    ("weapon", 2, 0x01, "u8", 20),
+    ("weapon", 2, 0x02, "u16", 0x1234),
+    ("weapon", 2, 0x10, "i32", -5),
+    ("vfx", 1, 0x00, "f32", 0.5),
+    ("vfx", 1, 0x04, "f32", 0.25),
+)
+
+
+def quietly(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+class CompilePatchSpecTests(unittest.TestCase):
+    """compile_patch_spec: merged runs and spec validation"""
+    
+    def test_adjacent_fields_merge_into_one_op(self):
+        ops = rp.compile_patch_spec(SPEC, TABLES)
+        
+        self.assertEqual(
+            [(op.param, op.row_id, op.offset, op.struct.format, op.values) for op in ops],
+            [
+                ("weapon", 2, 0x140, "<BBH", (75, 20, 0x1234)),
+                ("weapon", 2, 0x150, "<i", (-5,)),
+                ("vfx", 1, 0x410, "<ff", (0.5, 0.25)),
+            ]
+        )
+        self.assertEqual(ops[0].packed, struct.pack("<BBH", 75, 20, 0x1234))
+        self.assertEqual(sum(op.fields for op in ops), len(SPEC))
+    
+    def test_ops_sorted_by_offset_whatever_the_spec_order(self):
+        ops = rp.compile_patch_spec(tuple(reversed(SPEC)), TABLES)
+        
+        self.assertEqual([op.offset for op in ops], [0x140, 0x150, 0x410])
+        self.assertEqual(ops[0].values, (75, 20, 0x1234))
+    
+    def test_rows_are_not_merged_across(self):
+        ops = rp.compile_patch_spec((
+            ("weapon", 2, 0x1F, "u8", 1),
+            ("weapon", 3, 0x00, "u8", 2),
+        ), TABLES)
+        
+        self.assertEqual([(op.row_id, op.offset) for op in ops], [(2, 0x15F), (3, 0x160)])
+    
+    def test_default_spec_compiles(self):
+        ops = rp.compile_patch_spec(rp.DEFAULT_PATCH_SPEC)
+        
+        self.assertEqual(sum(op.fields for op in ops), len(rp.DEFAULT_PATCH_SPEC))
+        self.assertLess(len(ops), len(rp.DEFAULT_PATCH_SPEC))
+    
+    def assertSpecError(self, spec, message):
+        with self.assertRaisesRegex(ValueError, message):
+            rp.compile_patch_spec(spec, TABLES)
+    
+    def test_unknown_param(self):
+        self.assertSpecError((("armor", 1, 0, "u8", 1),), "unknown param table 'armor'")
+    
+    def test_unknown_type(self):
+        self.assertSpecError((("weapon", 1, 0, "u24", 1),), "unknown field type 'u24'")
+    
+    def test_field_outside_row(self):
+        self.assertSpecError((("weapon", 1, 0x1F, "u16", 1),), "outside row size")
+        self.assertSpecError((("weapon", 1, 0x20, "u8", 1),), "outside row size")
+        self.assertSpecError((("weapon", 1, -1, "u8", 1),), "outside row size")
+    
+    def test_overlapping_fields(self):
+        self.assertSpecError((
+            ("weapon", 1, 0x00, "u32", 1),
+            ("weapon", 1, 0x02, "u8", 2),
+        ), "overlaps another field")
+        self.assertSpecError((
+            ("weapon", 1, 0x04, "u8", 1),
+            ("weapon", 1, 0x04, "u8", 1),
+        ), "overlaps another field")
+    
+    def test_out_of_range_values(self):
+        for field_type, value in (("u8", 256), ("u8", -1), ("i8", -129), ("u16", 0x10000),
+                                  ("i16", 0x8000), ("u32", 2 ** 32), ("i32", -2 ** 31 - 1),
+                                  ("u8", "75"), ("f32", None)):
+            with self.subTest(field_type=field_type, value=value):
+                self.assertSpecError((("weapon", 1, 0, field_type, value),), "weapon row 1 field 0x0")
+
+
+class SyntheticFileTests(unittest.TestCase):
+    """patch_regulation / verify_patch against small files, with and without mmap"""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="cursed_sword_patch_")
+        self.path = os.path.join(self.directory, "regulation.bin")
+        self.original = bytes(range(256)) * (FILE_SIZE // 256)
+        
+        with open(self.path, "wb") as f:
+            f.write(self.original)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def patcher(self, use_mmap=True, spec=SPEC):
+        return rp.RegulationPatcher(self.path, use_mmap=use_mmap, spec=spec, tables=TABLES,
+                                    index_cache_path=None)
+    
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+    
+    def expected(self):
+        data = bytearray(self.original)
+        for op in rp.compile_patch_spec(SPEC, TABLES):
+            op.struct.pack_into(data, op.offset, *op.values)
+        return bytes(data)
+    
+    def test_apply_and_verify(self):
+        for use_mmap in (True, False):
+            with self.subTest(use_mmap=use_mmap):
+                with open(self.path, "wb") as f:
+                    f.write(self.original)
+                for path in (self.path + ".backup", self.path + ".cursed_sword.json"):
+                    if os.path.exists(path):
+                        os.remove(path)
+                
+                patcher = self.patcher(use_mmap)
+                
+                self.assertTrue(quietly(patcher.patch_regulation))
+                self.assertEqual(self.read(), self.expected())
+                self.assertTrue(quietly(patcher.verify_patch))
+                
+                with open(self.path + ".backup", "rb") as f:
+                    self.assertEqual(f.read(), self.original)
+    
+    def test_unpatched_file_fails_verification(self):
+        self.assertFalse(quietly(self.patcher().verify_patch))
+    
+    def test_one_field_mismatch_fails_verification(self):
+        quietly(self.patcher().patch_regulation)
+        
+        # Last field of the last op (vfx row 1, 0x04)
+        data = bytearray(self.read())
+        struct.pack_into("<f", data, 0x414, 0.75)
+        with open(self.path, "wb") as f:
+            f.write(data)
+        
+        for use_mmap in (True, False):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                verified = self.patcher(use_mmap).verify_patch()
+            
+            self.assertFalse(verified)
+            self.assertIn("field at 0x410 does not match", output.getvalue())
+    
+    def test_file_smaller_than_patched_range(self):
+        with open(self.path, "wb") as f:
+            f.write(self.original[:0x412])
+        
+        with self.assertRaisesRegex(ValueError, "smaller than the patched range"):
+            quietly(self.patcher().patch_regulation)
+    
+    def test_rows_located_through_param_header(self):
+        # weapon table with a PARAM header: rows 0, 2, 9; row 2's data at +0x200
+        data = bytearray(self.original)
+        base = TABLES["weapon"][0]
+        data[base:base + 0x40] = bytes(0x40)
+        struct.pack_into("<H", data, base + 0x0A, 3)
+        for index, (row_id, data_offset) in enumerate(((0, 0x100), (2, 0x200), (9, 0x280))):
+            struct.pack_into("<III", data, base + 0x30 + index * 12, row_id, data_offset, 0)
+        self.original = bytes(data)
+        with open(self.path, "wb") as f:
+            f.write(self.original)
+        
+        quietly(self.patcher().patch_regulation)
+        patched = self.read()
+        
+        self.assertEqual(patched[base + 0x200:base + 0x204], struct.pack("<BBH", 75, 20, 0x1234))
+        self.assertEqual(patched[base + 0x40:base + 0x200], self.original[base + 0x40:base + 0x200])
+        self.assertTrue(quietly(self.patcher().verify_patch))
+        
+        with self.assertRaisesRegex(ValueError, "row 3 not found"):
+            quietly(self.patcher(spec=(("weapon", 3, 0, "u8", 1),)).patch_regulation)
+
+
+class PatchManifestTests(unittest.TestCase):
+    """Manifest fast path and the four refresh_backup outcomes"""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="cursed_sword_manifest_")
+        self.path = os.path.join(self.directory, "regulation.bin")
+        self.original = bytes(range(256)) * (FILE_SIZE // 256)
+        self.mtime_ns = 1_000_000_000_000_000_000
+        self.write(self.original)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def write(self, data):
+        with open(self.path, "wb") as f:
+            f.write(data)
+        
+        # Distinct mtimes even on coarse filesystem clocks
+        self.mtime_ns += 1_000_000_000
+        os.utime(self.path, ns=(self.mtime_ns, self.mtime_ns))
+    
+    def patched(self, data, spec=SPEC, count=None):
+        data = bytearray(data)
+        for op in rp.compile_patch_spec(spec, TABLES)[:count]:
+            op.struct.pack_into(data, op.offset, *op.values)
+        return bytes(data)
+    
+    def backup(self):
+        with open(self.path + ".backup", "rb") as f:
+            return f.read()
+    
+    def patch(self, spec=SPEC):
+        """(file written?, printed output)"""
+        patcher = rp.RegulationPatcher(self.path, spec=spec, tables=TABLES, index_cache_path=None)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            written = patcher.patch_regulation()
+        return written, output.getvalue()
+    
+    def test_unchanged_file_takes_stamp_fast_path(self):
+        self.assertTrue(self.patch()[0])
+        
+        with mock.patch.object(rp.RegulationPatcher, "locate_rows", side_effect=AssertionError):
+            written, output = self.patch()
+        
+        self.assertFalse(written)
+        self.assertIn("unchanged since last run", output)
+    
+    def test_touched_file_falls_back_to_region_checksums(self):
+        self.patch()
+        self.write(self.patched(self.original))
+        
+        written, output = self.patch()
+        
+        self.assertFalse(written)
+        self.assertIn("region checksums match", output)
+        self.assertIn("unchanged since last run", self.patch()[1])
+    
+    def test_backup_matches_restored_original(self):
+        self.patch()
+        self.write(self.original)
+        
+        written, output = self.patch()
+        
+        self.assertTrue(written)
+        self.assertIn("Backup matches the current file", output)
+        self.assertEqual(self.backup(), self.original)
+    
+    def test_backup_kept_for_earlier_patch(self):
+        self.patch()
+        new_spec = (("weapon", 2, 0x00, "u8", 90),) + SPEC[1:]
+        
+        written, output = self.patch(new_spec)
+        
+        self.assertTrue(written)
+        self.assertIn("file holds an earlier patch", output)
+        self.assertEqual(self.backup(), self.original)
+        
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), self.patched(self.original, new_spec))
+    
+    def test_backup_kept_for_interrupted_patch(self):
+        self.patch()
+        os.remove(self.path + ".cursed_sword.json")
+        self.write(self.patched(self.original, count=1))
+        
+        written, output = self.patch()
+        
+        self.assertTrue(written)
+        self.assertIn("partially patched", output)
+        self.assertEqual(self.backup(), self.original)
+    
+    def test_backup_refreshed_after_game_update(self):
+        outside = bytearray(self.original)
+        outside[0xF00:0xF10] = bytes(0x10)
+        inside = bytearray(self.original)
+        inside[0x140] = 0xEE  # first byte of weapon row 2's patched run
+        
+        for label, data in (("outside patched regions", bytes(outside)),
+                            ("inside a patched region", bytes(inside))):
+            with self.subTest(label):
+                self.write(self.original)
+                for suffix in (".backup", ".cursed_sword.json"):
+                    if os.path.exists(self.path + suffix):
+                        os.remove(self.path + suffix)
+                self.patch()
+                self.write(data)
+                
+                written, output = self.patch()
+                
+                self.assertTrue(written)
+                self.assertIn("backup refreshed", output)
+                self.assertEqual(self.backup(), data)
+
+
+class ParamIndexCacheTests(unittest.TestCase):
+    """ParamIndexCache: stamp hits, hash hits and misses"""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="cursed_sword_index_")
+        self.path = os.path.join(self.directory, "regulation.bin")
+        self.cache_path = os.path.join(self.directory, "cache", "param_index.marshal")
+        self.params = {0x100: ((0, 2, 9), (0x100, 0x200, 0x280)), 0x400: None}
+        self.mtime_ns = 1_000_000_000_000_000_000
+        self.write(bytes(FILE_SIZE))
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def write(self, data):
+        with open(self.path, "wb") as f:
+            f.write(data)
+        
+        self.mtime_ns += 1_000_000_000
+        os.utime(self.path, ns=(self.mtime_ns, self.mtime_ns))
+    
+    def lookup(self, cache=None):
+        cache = cache or rp.ParamIndexCache(self.cache_path)
+        with open(self.path, "rb") as f:
+            return cache.lookup(self.path, f)
+    
+    def test_miss_then_hit_by_stamp(self):
+        key, params = self.lookup()
+        self.assertIsNone(params)
+        
+        rp.ParamIndexCache(self.cache_path).store(key, self.path, self.params)
+        
+        with mock.patch.object(rp, "file_sha256", side_effect=AssertionError):
+            self.assertEqual(self.lookup(), (key, self.params))
+    
+    def test_touched_file_hits_by_hash_and_records_stamp(self):
+        key, _ = self.lookup()
+        rp.ParamIndexCache(self.cache_path).store(key, self.path, self.params)
+        self.write(bytes(FILE_SIZE))
+        
+        self.assertEqual(self.lookup(), (key, self.params))
+        
+        with mock.patch.object(rp, "file_sha256", side_effect=AssertionError):
+            self.assertEqual(self.lookup(), (key, self.params))
+    
+    def test_changed_contents_miss(self):
+        key, _ = self.lookup()
+        rp.ParamIndexCache(self.cache_path).store(key, self.path, self.params)
+        self.write(b"\x01" * FILE_SIZE)
+        
+        new_key, params = self.lookup()
+        
+        self.assertNotEqual(new_key, key)
+        self.assertIsNone(params)
+    
+    def test_add_stamp_after_patching(self):
+        cache = rp.ParamIndexCache(self.cache_path)
+        key, _ = self.lookup(cache)
+        cache.store(key, self.path, self.params)
+        
+        # Row data rewritten in place: same indexes, new stamp
+        self.write(b"\x01" + bytes(FILE_SIZE - 1))
+        cache.add_stamp(key, self.path)
+        
+        with mock.patch.object(rp, "file_sha256", side_effect=AssertionError):
+            self.assertEqual(self.lookup(), (key, self.params))
+        
+        # Unknown keys are ignored
+        cache.add_stamp("0" * 64, self.path)
+        self.assertNotIn("0" * 64, rp.ParamIndexCache(self.cache_path)._load())
+    
+    def test_oldest_entries_trimmed(self):
+        cache = rp.ParamIndexCache(self.cache_path)
+        
+        for index in range(rp.ParamIndexCache.MAX_ENTRIES + 2):
+            cache.store(f"{index:064x}", self.path, self.params)
+        
+        entries = rp.ParamIndexCache(self.cache_path)._load()
+        self.assertEqual(len(entries), rp.ParamIndexCache.MAX_ENTRIES)
+        self.assertNotIn(f"{0:064x}", entries)
+    
+    def test_unreadable_cache_is_empty(self):
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, "wb") as f:
+            f.write(b"not marshal")
+        
+        self.assertIsNone(self.lookup()[1])
+
+
+class LoadPatchSpecTests(unittest.TestCase):
+    """load_patch_spec reads config.json's "regulation_patches" section"""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="cursed_sword_spec_")
+        self.path = os.path.join(self.directory, "config.json")
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def load(self, config):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(config, f)
+        return rp.load_patch_spec(self.path)
+    
+    def test_hex_strings(self):
+        spec, tables = self.load({"regulation_patches": {
+            "params": {"armor": {"base_offset": "0x2A00", "row_size": "0x20"}},
+            "fields": [
+                ["armor", "0x10", "0x4", "u16", 7],
+                ["weapon", 32, 52, "u8", 75],
+            ],
+        }})
+        
+        self.assertEqual(spec, [("armor", 16, 4, "u16", 7), ("weapon", 32, 52, "u8", 75)])
+        self.assertEqual(tables["armor"], (0x2A00, 0x20))
+        self.assertEqual(tables["weapon"], rp.PARAM_TABLES["weapon"])
+        self.assertEqual(len(rp.compile_patch_spec(spec, tables)), 2)
+    
+    def test_params_override_defaults(self):
+        spec, tables = self.load({"regulation_patches": {
+            "params": {"weapon": {"base_offset": 4096, "row_size": "0x200"}},
+        }})
+        
+        self.assertEqual(spec, rp.DEFAULT_PATCH_SPEC)
+        self.assertEqual(tables["weapon"], (0x1000, 0x200))
+    
+    def test_defaults_without_section_or_file(self):
+        self.assertEqual(self.load({"parry_config": {}}), (rp.DEFAULT_PATCH_SPEC, rp.PARAM_TABLES))
+        self.assertEqual(rp.load_patch_spec(os.path.join(self.directory, "missing.json")),
+                         (rp.DEFAULT_PATCH_SPEC, rp.PARAM_TABLES))
+    
+    def test_shipped_config_matches_default_spec(self):
+        spec, tables = rp.load_patch_spec(rp.CONFIG_PATH)
+        
+        self.assertEqual(sorted(spec), sorted(rp.DEFAULT_PATCH_SPEC))
+        self.assertEqual(tables, rp.PARAM_TABLES)
+
+
+if __name__ == "__main__":
+    unittest.main()
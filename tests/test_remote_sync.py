@@ -0,0 +1,195 @@
+"""Seamless sync: sequence/epoch checks on receive, snapshots on send"""
+
+import unittest
+
+import mod
+import simulation
+
+
+class RemoteSequenceTests(unittest.TestCase):
+    """handle_remote_parry drops stale batches but follows sender restarts"""
+    
+    def setUp(self):
+        self.simulation = simulation.Simulation(players=1, sounds=False)
+        self.mod = self.simulation.mod
+    
+    def tearDown(self):
+        self.simulation.close()
+    
+    def send(self, sequence, stack_count, epoch=1, sender_id=5, channel=mod.CHANNEL_BATCH,
+             action=mod.ACTION_PARRY_SUCCESS, age=0.0, player_id=None):
+        self.mod.handle_remote_parry(mod.encode_messages(
+            ((action, sender_id if player_id is None else player_id, stack_count,
+              self.simulation.clock.now - age, None),),
+            sender_id=sender_id,
+            sequence=sequence,
+            epoch=epoch,
+            channel=channel
+        ))
+    
+    def stack_count(self, player_id=5):
+        return self.mod.get_remote_state(player_id).stack_count
+    
+    def test_stale_and_duplicate_batches_dropped(self):
+        self.send(10, 3)
+        self.send(9, 4)
+        self.send(10, 5)
+        
+        self.assertEqual(self.stack_count(), 3)
+        self.assertEqual(self.mod.remote_batches_dropped, 2)
+    
+    def test_sequence_wrap_accepted(self):
+        self.send(0xFFFF, 3)
+        self.send(0, 4)
+        
+        self.assertEqual(self.stack_count(), 4)
+        self.assertEqual(self.mod.remote_batches_dropped, 0)
+    
+    def test_restarted_sender_accepted(self):
+        self.send(500, 3, epoch=11)
+        self.send(1, 7, epoch=42)
+        
+        self.assertEqual(self.stack_count(), 7)
+        self.assertEqual(self.mod.remote_batches_dropped, 0)
+        
+        # The new epoch's sequence is tracked from its first batch
+        self.send(1, 8, epoch=42)
+        self.send(2, 9, epoch=42)
+        
+        self.assertEqual(self.stack_count(), 9)
+        self.assertEqual(self.mod.remote_batches_dropped, 1)
+    
+    def test_senders_tracked_independently(self):
+        self.send(100, 3, sender_id=5)
+        self.send(1, 4, sender_id=6)
+        
+        self.assertEqual((self.stack_count(5), self.stack_count(6)), (3, 4))
+    
+    def test_sync_snapshot_does_not_make_batches_stale(self):
+        self.send(1, 3)
+        self.send(40, 4, channel=mod.CHANNEL_SYNC, action=mod.ACTION_PARRY_EXECUTED)
+        self.send(2, 0, action=mod.ACTION_MOD_TOGGLE)
+        
+        self.assertFalse(self.mod.get_remote_state(5).enabled)
+        self.assertEqual(self.mod.remote_batches_dropped, 0)
+        
+        # Snapshots are still ordered among themselves
+        self.send(39, 9, channel=mod.CHANNEL_SYNC, action=mod.ACTION_PARRY_EXECUTED)
+        
+        self.assertEqual(self.stack_count(), 4)
+        self.assertEqual(self.mod.remote_batches_dropped, 1)
+    
+    def test_older_snapshot_after_batch_skipped(self):
+        self.simulation.clock.advance(10.0)
+        self.send(1, 5)
+        replica = self.mod.get_remote_state(5)
+        last_update_ms = replica.last_update_ms
+        
+        # Encoded 0.2s before the batch, delivered after it
+        self.send(1, 4, channel=mod.CHANNEL_SYNC, action=mod.ACTION_PARRY_EXECUTED, age=0.2)
+        
+        self.assertEqual(replica.stack_count, 5)
+        self.assertEqual(replica.last_update_ms, last_update_ms)
+        self.assertEqual(self.mod.remote_messages_dropped, 1)
+        
+        # A newer snapshot still applies
+        self.simulation.clock.advance(0.5)
+        self.send(2, 6, channel=mod.CHANNEL_SYNC, action=mod.ACTION_PARRY_EXECUTED)
+        
+        self.assertEqual(replica.stack_count, 6)
+        self.assertGreater(replica.last_update_ms, last_update_ms)
+    
+    def test_older_message_for_another_field_applies(self):
+        self.simulation.clock.advance(10.0)
+        self.send(1, 5)
+        self.send(2, 0, action=mod.ACTION_MOD_TOGGLE, age=0.2)
+        
+        replica = self.mod.get_remote_state(5)
+        self.assertFalse(replica.enabled)
+        self.assertEqual(replica.stack_count, 5)
+        self.assertEqual(self.mod.remote_messages_dropped, 0)
+    
+    def test_timestamps_from_other_senders_not_compared(self):
+        self.simulation.clock.advance(10.0)
+        self.send(1, 5, sender_id=5)
+        
+        # Host-driven player 5 reported by the host, whose clock is behind
+        self.send(1, 7, sender_id=1, player_id=5, age=5.0)
+        
+        self.assertEqual(self.stack_count(), 7)
+    
+    def test_timestamp_wraps_at_32_bits(self):
+        self.assertTrue(mod.timestamp_is_older(0xFFFFFF00, 0x10))
+        self.assertFalse(mod.timestamp_is_older(0x10, 0xFFFFFF00))
+        self.assertFalse(mod.timestamp_is_older(5, 5))
+    
+    def test_bad_payload_ignored(self):
+        self.mod.handle_remote_parry(b"\x00\x01")
+        
+        self.assertEqual(self.mod.remote_players, {})
+    
+    def test_v22_dict_message_applied(self):
+        self.mod.handle_remote_parry({"action": "parry_success", "player_id": 7, "stack_count": 4})
+        self.mod.handle_remote_parry({"action": "batch", "messages": [
+            {"action": "parry_success", "player_id": 8, "stack_count": 2},
+        ]})
+        
+        self.assertEqual(self.stack_count(7), 4)
+        self.assertNotIn(8, self.mod.remote_players)
+
+
+class SyncSnapshotTests(unittest.TestCase):
+    """Sending side: snapshots are built on the update thread, on change only"""
+    
+    def setUp(self):
+        self.simulation = simulation.Simulation(players=1, sounds=False)
+        self.mod = self.simulation.mod
+        self.mod.outbox.sender_id = 1
+    
+    def tearDown(self):
+        self.simulation.close()
+    
+    def update(self):
+        self.mod.on_update(self.simulation.game_state)
+    
+    def test_snapshot_only_after_change(self):
+        state = self.mod.get_player_state(1)
+        self.update()
+        
+        self.assertIs(self.mod.sync_parry_state({"id": 1}), mod.SYNC_UNCHANGED)
+        
+        state.stack_count = 3
+        self.update()
+        payload = self.mod.sync_parry_state({"id": 1})
+        sender_id, channel, _, sequence, messages = mod.decode_batch(payload)
+        
+        self.assertEqual((sender_id, channel, sequence), (1, mod.CHANNEL_SYNC, 1))
+        self.assertEqual(messages[0]["stack_count"], 3)
+        self.assertIs(self.mod.sync_parry_state({"id": 1}), mod.SYNC_UNCHANGED)
+        
+        self.update()
+        self.assertIs(self.mod.sync_parry_state({"id": 1}), mod.SYNC_UNCHANGED)
+    
+    def test_sync_callback_leaves_batch_sequence_alone(self):
+        self.mod.get_player_state(1).stack_count = 2
+        self.update()
+        batch_sequence = self.mod.outbox.sequence
+        
+        self.mod.sync_parry_state({"id": 1})
+        self.mod.sync_parry_state({"id": 2})
+        
+        self.assertEqual(self.mod.outbox.sequence, batch_sequence)
+    
+    def test_join_resends_snapshot(self):
+        self.mod.get_player_state(1).stack_count = 2
+        self.update()
+        self.mod.sync_parry_state({"id": 1})
+        
+        self.mod.on_player_joined(7)
+        self.update()
+        
+        self.assertIsNot(self.mod.sync_parry_state({"id": 1}), mod.SYNC_UNCHANGED)
+
+
+if __name__ == "__main__":
+    unittest.main()
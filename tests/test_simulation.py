@@ -0,0 +1,34 @@
+"""Simulation harness: engine stubs and mod.py globals are restored on close"""
+
+import sys
+import unittest
+
+import mod
+import simulation
+
+
+class SimulationCloseTests(unittest.TestCase):
+    """install_engine_stubs / Simulation.close"""
+    
+    def test_close_restores_globals(self):
+        names = ("time", "seamless_hook", "InputManager", "GameManager", "cursed_sword_mod")
+        before = {name: getattr(mod, name) for name in names}
+        modules = {name: sys.modules.get(name)
+                   for name in ("seamless_coop_integration", "input_manager", "game_manager")}
+        console_level = mod.log.console_level
+        
+        sim = simulation.Simulation(players=1, sounds=False)
+        self.assertIs(mod.time, sim.clock)
+        self.assertIs(mod.cursed_sword_mod, sim.mod)
+        sim.close()
+        sim.close()
+        
+        for name, value in before.items():
+            self.assertIs(getattr(mod, name), value, name)
+        for name, module in modules.items():
+            self.assertIs(sys.modules.get(name), module, name)
+        self.assertEqual(mod.log.console_level, console_level)
+
+
+if __name__ == "__main__":
+    unittest.main()
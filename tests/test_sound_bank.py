@@ -0,0 +1,45 @@
+"""SoundBank: sound files resolve from the mod folder, not the working directory"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mod
+
+
+class SoundBankPathTests(unittest.TestCase):
+    """Default sound_dir and missing-file handling"""
+    
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="cursed_sword_sounds_")
+        self.console_level = mod.log.console_level
+        mod.log.console_level = mod.LOG_ERROR
+    
+    def tearDown(self):
+        os.chdir(self.cwd)
+        mod.log.console_level = self.console_level
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def test_default_dir_is_next_to_mod(self):
+        os.chdir(self.directory)
+        bank = mod.SoundBank({})
+        
+        self.assertEqual(bank.sound_dir, os.path.join(os.path.dirname(os.path.abspath(mod.__file__)), "sounds"))
+    
+    def test_files_found_whatever_the_working_directory(self):
+        with open(os.path.join(self.directory, "parry.wem"), "wb"):
+            pass
+        bank = mod.SoundBank({"parry_success": ("parry.wem", 1.0, 1.0),
+                              "stack_1": ("missing.wem", 1.0, 1.0)}, self.directory)
+        os.chdir(tempfile.gettempdir())
+        
+        self.assertEqual(bank.preload(), 1)
+        self.assertEqual(bank.get("parry_success").engine_handle, "parry.wem")
+        self.assertIsNone(bank.get("stack_1"))
+        self.assertEqual(bank.missing, {"missing.wem"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+"""Round-trip tests for the CursedSword binary wire format (mod.py)"""
+
+import unittest
+
+import mod
+
+
+BASE_TIME = 1700000000.25
+BASE_MS = int(BASE_TIME * 1000) & 0xFFFFFFFF
+
+
+def encode_one(action, player_id=7, value=3, timestamp=BASE_TIME, weapon_id=None, **kwargs):
+    return mod.encode_messages(((action, player_id, value, timestamp, weapon_id),), **kwargs)
+
+
+class RoundTripTests(unittest.TestCase):
+    """encode_messages -> decode_batch/decode_messages"""
+    
+    def test_every_action_code(self):
+        payload = mod.encode_messages([
+            (mod.ACTION_WEAPON_SWAP, 1, 0, BASE_TIME, 32),
+            (mod.ACTION_PARRY_SUCCESS, 2, 5, BASE_TIME + 0.010, None),
+            (mod.ACTION_MOD_TOGGLE, 3, True, BASE_TIME + 0.020, None),
+            (mod.ACTION_MOD_TOGGLE, 4, False, BASE_TIME + 0.030, None),
+            (mod.ACTION_PARRY_EXECUTED, 5, 10, BASE_TIME + 0.040, None),
+        ], sender_id=1, sequence=9, epoch=0xBEEF)
+        
+        sender_id, channel, epoch, sequence, messages = mod.decode_batch(payload)
+        
+        self.assertEqual((sender_id, channel, epoch, sequence), (1, mod.CHANNEL_BATCH, 0xBEEF, 9))
+        self.assertEqual(messages, [
+            {"action": "weapon_swap", "player_id": 1, "timestamp_ms": BASE_MS, "weapon_id": 32},
+            {"action": "parry_success", "player_id": 2, "timestamp_ms": BASE_MS + 10, "stack_count": 5},
+            {"action": "mod_toggle", "player_id": 3, "timestamp_ms": BASE_MS + 20, "enabled": True},
+            {"action": "mod_toggle", "player_id": 4, "timestamp_ms": BASE_MS + 30, "enabled": False},
+            {"action": "parry_executed", "player_id": 5, "timestamp_ms": BASE_MS + 40, "stack_count": 10},
+        ])
+        self.assertEqual(set(mod.ACTION_CODES), {message["action"] for message in messages})
+    
+    def test_decode_messages_returns_messages_only(self):
+        payload = encode_one(mod.ACTION_PARRY_SUCCESS, sender_id=2, sequence=4)
+        
+        self.assertEqual(mod.decode_messages(payload), mod.decode_batch(payload)[4])
+    
+    def test_empty_batch(self):
+        decoded = mod.decode_batch(mod.encode_messages((), sender_id=3, sequence=1, epoch=2))
+        
+        self.assertEqual(decoded, (3, mod.CHANNEL_BATCH, 2, 1, []))
+    
+    def test_sync_channel(self):
+        payload = encode_one(mod.ACTION_PARRY_EXECUTED, sender_id=3, sequence=1, channel=mod.CHANNEL_SYNC)
+        
+        self.assertEqual(mod.decode_batch(payload)[1], mod.CHANNEL_SYNC)
+    
+    def test_multi_byte_varint_ids(self):
+        for player_id, weapon_id, sender_id in ((127, 128, 300), (16384, 2 ** 21 + 5, 2 ** 35), (2 ** 40, 1000000, 0)):
+            payload = encode_one(mod.ACTION_WEAPON_SWAP, player_id, weapon_id=weapon_id, sender_id=sender_id)
+            decoded_sender, _, _, _, (message,) = mod.decode_batch(payload)
+            
+            self.assertEqual(decoded_sender, sender_id)
+            self.assertEqual(message["player_id"], player_id)
+            self.assertEqual(message["weapon_id"], weapon_id)
+    
+    def test_varint_encoding(self):
+        for value, encoded in ((0, b"\x00"), (127, b"\x7f"), (128, b"\x80\x01"), (300, b"\xac\x02")):
+            out = bytearray()
+            mod.encode_varint(value, out)
+            
+            self.assertEqual(bytes(out), encoded)
+            self.assertEqual(mod.decode_varint(encoded, 0), (value, len(encoded)))
+        
+        with self.assertRaises(ValueError):
+            mod.encode_varint(-1, bytearray())
+    
+    def test_parry_message_is_compact(self):
+        payload = encode_one(mod.ACTION_PARRY_SUCCESS, player_id=1000, value=10, sender_id=1000, sequence=1)
+        
+        # 10-byte header + 2-byte sender + count + 6-byte message (v2.2 dicts were ~150 bytes)
+        self.assertLessEqual(len(payload), 20)
+
+
+class SequenceTests(unittest.TestCase):
+    """u16 batch sequence numbers"""
+    
+    def test_sequence_wraps_at_16_bits(self):
+        for sequence, expected in ((0xFFFF, 0xFFFF), (0x10000, 0), (0x10005, 5)):
+            self.assertEqual(mod.decode_batch(encode_one(mod.ACTION_PARRY_SUCCESS, sequence=sequence))[3], expected)
+    
+    def test_epoch_wraps_at_16_bits(self):
+        self.assertEqual(mod.decode_batch(encode_one(mod.ACTION_PARRY_SUCCESS, epoch=0x12345))[2], 0x2345)
+    
+    def test_sequence_is_newer_across_wrap(self):
+        self.assertTrue(mod.sequence_is_newer(0, 0xFFFF))
+        self.assertTrue(mod.sequence_is_newer(5, 0xFFF0))
+        self.assertTrue(mod.sequence_is_newer(2, 1))
+        self.assertFalse(mod.sequence_is_newer(0xFFFF, 0))
+        self.assertFalse(mod.sequence_is_newer(1, 2))
+        self.assertFalse(mod.sequence_is_newer(7, 7))
+        self.assertFalse(mod.sequence_is_newer(0x8000, 0))
+
+
+class SaturationTests(unittest.TestCase):
+    """Fields clamped to their wire width"""
+    
+    def test_delta_saturates_at_u16(self):
+        payload = mod.encode_messages([
+            (mod.ACTION_PARRY_SUCCESS, 1, 1, BASE_TIME, None),
+            (mod.ACTION_PARRY_SUCCESS, 2, 2, BASE_TIME + 65.535, None),
+            (mod.ACTION_PARRY_SUCCESS, 3, 3, BASE_TIME + 300.0, None),
+        ])
+        messages = mod.decode_messages(payload)
+        
+        self.assertEqual([message["timestamp_ms"] - BASE_MS for message in messages], [0, 65535, 65535])
+    
+    def test_base_is_earliest_timestamp(self):
+        payload = mod.encode_messages([
+            (mod.ACTION_PARRY_SUCCESS, 1, 1, BASE_TIME + 0.5, None),
+            (mod.ACTION_PARRY_SUCCESS, 2, 2, BASE_TIME, None),
+        ])
+        
+        self.assertEqual([message["timestamp_ms"] for message in mod.decode_messages(payload)],
+                         [BASE_MS + 500, BASE_MS])
+    
+    def test_value_saturates_at_u8(self):
+        (message,) = mod.decode_messages(encode_one(mod.ACTION_PARRY_SUCCESS, value=300))
+        
+        self.assertEqual(message["stack_count"], 255)
+
+
+class MalformedPayloadTests(unittest.TestCase):
+    """decode_batch raises ValueError on bad input"""
+    
+    def test_wrong_version_byte(self):
+        payload = bytearray(encode_one(mod.ACTION_PARRY_SUCCESS))
+        
+        for version in (0, mod.WIRE_VERSION - 1, mod.WIRE_VERSION + 1, 0xFF):
+            payload[0] = version
+            with self.assertRaisesRegex(ValueError, "version"):
+                mod.decode_batch(bytes(payload))
+    
+    def test_truncated_payloads(self):
+        payload = mod.encode_messages([
+            (mod.ACTION_WEAPON_SWAP, 300, 0, BASE_TIME, 2 ** 20),
+            (mod.ACTION_PARRY_SUCCESS, 2 ** 14, 4, BASE_TIME, None),
+        ], sender_id=70000, sequence=2)
+        
+        for length in range(len(payload)):
+            with self.subTest(length=length), self.assertRaises(ValueError):
+                mod.decode_batch(payload[:length])
+    
+    def test_count_larger_than_payload(self):
+        payload = bytearray(encode_one(mod.ACTION_PARRY_SUCCESS, sender_id=1))
+        count_offset = mod._BATCH_HEADER.size + 1  # after the 1-byte sender_id
+        payload[count_offset] = 2
+        
+        with self.assertRaises(ValueError):
+            mod.decode_batch(bytes(payload))
+
+
+if __name__ == "__main__":
+    unittest.main()